@@ -0,0 +1,213 @@
+'''
+end to end crawl benchmark against the local riot stand-in in riot_stub.py
+
+    PYTHONPATH=crawler/:<common>/common/ python benchmarks/crawl.py --games 200 --workers 4
+
+drives controller.crawl_summoner (or the async engine) and reports matches/s, api calls and
+db round trips per match and the peak rss. by default rows go to an in-memory database that
+only counts statements, --postgres uses the database configured for the common package.
+'''
+import argparse
+import resource
+import time
+
+import riot_stub
+
+import async_client
+import async_controller
+import client
+import controller
+import database
+
+
+class CountingCursor:
+
+    def __init__(
+        self,
+        cursor,
+        stats: dict,
+    ):
+        self._cursor = cursor
+        self._stats = stats
+
+    def execute(self, *args, **kwargs):
+        self._stats['round_trips'] += 1
+        return self._cursor.execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        self._stats['round_trips'] += 1
+        return self._cursor.executemany(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+
+class CountingConnection:
+
+    def __init__(
+        self,
+        conn,
+        stats: dict,
+    ):
+        self._conn = conn
+        self._stats = stats
+
+    def cursor(self, *args, **kwargs):
+        return CountingCursor(self._conn.cursor(*args, **kwargs), self._stats)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def _literal(
+    value,
+) -> str:
+    if value is None:
+        return 'NULL'
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, float)):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+class MemoryCursor:
+    '''
+    accepts every statement, renders parameters like psycopg2 and answers every query with no rows,
+    except that INSERT ... RETURNING (e.g. match claims) always succeeds
+    '''
+
+    def __init__(self):
+        self.rowcount = 0
+        self._returning = False
+
+    def mogrify(
+        self,
+        sql: str,
+        params=None,
+    ) -> bytes:
+        if params is None:
+            return sql.encode()
+        if isinstance(params, dict):
+            return (sql % {k: _literal(v) for k, v in params.items()}).encode()
+        return (sql % tuple(_literal(v) for v in params)).encode()
+
+    def execute(self, sql, params=None):
+        self._returning = 'RETURNING' in (sql.decode() if isinstance(sql, bytes) else sql)
+
+    def executemany(self, sql, params_seq):
+        pass
+
+    def fetchone(self):
+        return (1,) if self._returning else None
+
+    def fetchall(self):
+        return []
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+class MemoryConnection:
+
+    def cursor(self, *args, **kwargs):
+        return MemoryCursor()
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--games', type=int, default=100, help='length of the stubbed matchlist')
+    arg_parser.add_argument('--accounts', type=int, default=5000, help='distinct participants across games')
+    arg_parser.add_argument('--workers', type=int, default=4)
+    arg_parser.add_argument('--engine', choices=('threaded', 'async'), default='threaded')
+    arg_parser.add_argument('--depth', choices=controller.DEPTHS, default=controller.DEPTH_TIMELINE)
+    arg_parser.add_argument('--app-limit', default='500:10,30000:600', help='simulated riot app rate limit')
+    arg_parser.add_argument('--latency', type=float, default=0.0, help='added per response, in seconds')
+    arg_parser.add_argument('--fixtures', help='directory with recorded summoner/match/timeline json')
+    arg_parser.add_argument('--postgres', action='store_true', help='write to the configured database')
+    args = arg_parser.parse_args()
+
+    stats = {'round_trips': 0}
+    connect = database.get_connection if args.postgres else MemoryConnection
+    database.get_connection = lambda: CountingConnection(connect(), stats)
+
+    stub = riot_stub.RiotStub(
+        fixtures=riot_stub.load_fixtures(args.fixtures),
+        games=args.games,
+        accounts=args.accounts,
+        app_limit=args.app_limit,
+        latency=args.latency,
+    )
+    endpoint = stub.start()
+    config = client.ClientConfig(token='RGAPI-benchmark', pool_size=max(10, args.workers * 2))
+    routes = client.ClientRoutes(endpoint=endpoint)
+
+    first = []
+
+    def progress(processed, total):
+        if not first:
+            first.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    if args.engine == 'async':
+        async_controller.run_crawl_summoner(
+            aclient=async_client.AsyncClient(config=config, routes=routes),
+            summoner_name='bench',
+            progress=progress,
+            full=True,
+            depth=args.depth,
+        )
+    else:
+        controller.crawl_summoner(
+            rclient=client.Client(config=config, routes=routes),
+            summoner_name='bench',
+            workers=args.workers,
+            progress=progress,
+            full=True,
+            depth=args.depth,
+        )
+    elapsed = time.perf_counter() - start
+    stub.stop()
+
+    matches = stub.calls['get_match_by_matchid'] or 1
+    print(f'engine              {args.engine} ({args.workers} workers), depth {args.depth}')
+    print(f'matches             {stub.calls["get_match_by_matchid"]} in {elapsed:.2f}s')
+    print(f'first match after   {first[0] if first else elapsed:.2f}s')
+    print(f'matches/s           {stub.calls["get_match_by_matchid"] / elapsed:.2f}')
+    print(f'api calls/match     {sum(stub.calls.values()) / matches:.2f}')
+    for route, calls in sorted(stub.calls.items()):
+        print(f'  {route:<32} {calls}')
+    print(f'429s                {stub.throttled}')
+    print(f'db round trips/match {stats["round_trips"] / matches:.2f}')
+    print(f'peak rss            {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+'''
+compares the available json backends on recorded riot payloads
+
+    PYTHONPATH=crawler/:<common>/common/ python benchmarks/json_backends.py match.json timeline.json
+
+every file is parsed with each backend in crawler/jsonlib.py, once as plain json
+and once including the decoding into dtos that the client does.
+'''
+import argparse
+import statistics
+import time
+
+import client
+import jsonlib
+
+
+def _decoder(
+    payload: dict,
+):
+    if 'frames' in payload:
+        return lambda res: client.decode_match_timeline(res=res)
+    if 'participants' in payload:
+        return lambda res: client.decode_match(res=res, match_id=0)
+    if 'matches' in payload:
+        return lambda res: client.decode_matchlist(res=res)
+    return lambda res: client.decode_summoner(res=res)
+
+
+def _measure(
+    func,
+    repeat: int,
+) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('payloads', nargs='+', help='recorded raw riot responses')
+    arg_parser.add_argument('--repeat', type=int, default=50)
+    args = arg_parser.parse_args()
+
+    print(f'{"payload":<40} {"backend":<8} {"size kB":>8} {"loads ms":>9} {"decode ms":>10}')
+    for path in args.payloads:
+        with open(path, 'rb') as f:
+            data = f.read()
+        decode = _decoder(jsonlib.BACKENDS['json'](data))
+        for name, loads in jsonlib.BACKENDS.items():
+            parse = _measure(lambda: loads(data), args.repeat)
+            full = _measure(lambda: decode(loads(data)), args.repeat)
+            print(f'{path[-40:]:<40} {name:<8} {len(data) / 1024:>8.1f} {parse * 1000:>9.2f} {full * 1000:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
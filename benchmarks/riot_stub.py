@@ -0,0 +1,294 @@
+'''
+local stand-in for the riot api routes in client.ClientRoutes
+
+serves recorded payloads (summoner.json, match.json, timeline.json in a fixture directory) or
+synthetic ones of realistic size, and simulates riot's rate limit headers and 429s.
+'''
+import collections
+import http.server
+import json
+import os
+import random
+import re
+import threading
+import time
+
+
+def _synthetic_summoner() -> dict:
+    return {
+        'accountId': 'account-0',
+        'id': 'summoner-0',
+        'puuid': 'puuid-0',
+        'name': 'bench',
+        'profileIconId': 1,
+        'revisionDate': int(time.time() * 1000),
+        'summonerLevel': 100,
+    }
+
+
+def _synthetic_match() -> dict:
+    stats_keys = (
+        'kills', 'deaths', 'assists', 'goldEarned', 'goldSpent', 'totalDamageDealt', 'totalDamageTaken',
+        'visionScore', 'wardsPlaced', 'wardsKilled', 'totalMinionsKilled', 'champLevel', 'perk0', 'perk1',
+        'perk2', 'perk3', 'perk4', 'perk5', 'item0', 'item1', 'item2', 'item3', 'item4', 'item5', 'item6',
+    )
+    return {
+        'gameId': 0,
+        'platformId': 'EUW1',
+        'gameCreation': int(time.time() * 1000) - 86400000,
+        'gameDuration': 1800,
+        'queueId': 420,
+        'mapId': 11,
+        'seasonId': 13,
+        'gameVersion': '10.25.348.1797',
+        'gameMode': 'CLASSIC',
+        'gameType': 'MATCHED_GAME',
+        'teams': [{
+            'teamId': team_id, 'win': 'Win' if team_id == 100 else 'Fail', 'firstBlood': True,
+            'firstTower': True, 'firstInhibitor': True, 'firstBaron': True, 'firstDragon': True,
+            'firstRiftHerald': True, 'towerKills': 7, 'inhibitorKills': 1, 'baronKills': 1,
+            'dragonKills': 3, 'vilemawKills': 0, 'riftHeraldKills': 1, 'dominionVictoryScore': 0,
+            'bans': [{'championId': 10 + n, 'pickTurn': n} for n in range(1, 6)],
+        } for team_id in (100, 200)],
+        'participants': [{
+            'participantId': p,
+            'teamId': 100 if p <= 5 else 200,
+            'championId': p,
+            'spell1Id': 4,
+            'spell2Id': 14,
+            'stats': dict({k: p * 10 for k in stats_keys}, participantId=p, win=p <= 5),
+            'timeline': {
+                'participantId': p, 'role': 'SOLO', 'lane': 'TOP',
+                'creepsPerMinDeltas': {'0-10': 7.1, '10-20': 8.2},
+                'xpPerMinDeltas': {'0-10': 400.0, '10-20': 550.0},
+                'goldPerMinDeltas': {'0-10': 300.0, '10-20': 420.0},
+            },
+        } for p in range(1, 11)],
+        'participantIdentities': [{
+            'participantId': p,
+            'player': {
+                'platformId': 'EUW1', 'accountId': f'account-{p}', 'summonerName': f'player {p}',
+                'summonerId': f'summoner-{p}', 'currentPlatformId': 'EUW1',
+                'currentAccountId': f'account-{p}', 'matchHistoryUri': '/v1/stats/player_history/EUW1/1',
+                'profileIcon': 1,
+            },
+        } for p in range(1, 11)],
+    }
+
+
+def _synthetic_timeline(
+    minutes: int = 30,
+) -> dict:
+    event_types = ('ITEM_PURCHASED', 'SKILL_LEVEL_UP', 'WARD_PLACED', 'CHAMPION_KILL', 'ITEM_DESTROYED')
+    frames = []
+    for minute in range(minutes + 1):
+        events = []
+        for n in range(35):
+            event = {
+                'type': event_types[n % len(event_types)],
+                'timestamp': minute * 60000 + n * 1000,
+                'participantId': n % 10 + 1,
+            }
+            if event['type'] == 'CHAMPION_KILL':
+                event.update(killerId=n % 10 + 1, victimId=(n + 5) % 10 + 1, assistingParticipantIds=[2, 3],
+                             position={'x': 1000 + n, 'y': 2000 + n})
+            elif event['type'] == 'ITEM_PURCHASED':
+                event['itemId'] = 1055
+            elif event['type'] == 'SKILL_LEVEL_UP':
+                event.update(skillSlot=1, levelUpType='NORMAL')
+            elif event['type'] == 'WARD_PLACED':
+                event.update(wardType='YELLOW_TRINKET', creatorId=n % 10 + 1)
+            events.append(event)
+        frames.append({
+            'timestamp': minute * 60000,
+            'participantFrames': {str(p): {
+                'participantId': p, 'position': {'x': 500 * p, 'y': 400 * p}, 'currentGold': 500,
+                'totalGold': 500 + 400 * minute, 'level': min(18, 1 + minute // 2), 'xp': 450 * minute,
+                'minionsKilled': 7 * minute, 'jungleMinionsKilled': 0, 'dominionScore': 0, 'teamScore': 0,
+            } for p in range(1, 11)},
+            'events': events,
+        })
+    return {'frameInterval': 60000, 'frames': frames}
+
+
+def load_fixtures(
+    path: str = None,
+) -> dict:
+    fixtures = {
+        'summoner': _synthetic_summoner(),
+        'match': _synthetic_match(),
+        'timeline': _synthetic_timeline(),
+    }
+    if path:
+        for name in fixtures:
+            file = os.path.join(path, f'{name}.json')
+            if os.path.exists(file):
+                with open(file) as f:
+                    fixtures[name] = json.load(f)
+    return fixtures
+
+
+class Limits:
+    '''
+    riot style app rate limit, "20:1,100:120" means 20 requests per second and 100 per 120 seconds
+    '''
+
+    def __init__(
+        self,
+        spec: str,
+    ):
+        self.spec = spec
+        self.windows = []
+        for part in spec.split(',') if spec else ():
+            count, seconds = part.split(':')
+            self.windows.append((int(count), int(seconds), collections.deque()))
+        self.lock = threading.Lock()
+
+    def hit(self):
+        # returns (headers, retry_after or None)
+        with self.lock:
+            now = time.monotonic()
+            retry_after = None
+            for count, seconds, hits in self.windows:
+                while hits and hits[0] <= now - seconds:
+                    hits.popleft()
+                if len(hits) >= count:
+                    retry_after = max(retry_after or 0, hits[0] + seconds - now)
+            if retry_after is None:
+                for _, _, hits in self.windows:
+                    hits.append(now)
+            counts = ','.join(f'{len(hits)}:{seconds}' for _, seconds, hits in self.windows)
+        headers = {}
+        if self.windows:
+            headers = {'X-App-Rate-Limit': self.spec, 'X-App-Rate-Limit-Count': counts}
+        return headers, retry_after
+
+
+class RiotStub:
+
+    ROUTES = (
+        ('get_summoner_by_summonername', re.compile(r'^/lol/summoner/v4/summoners/by-name/(?P<key>[^/?]+)')),
+        ('get_summoner_by_account_id', re.compile(r'^/lol/summoner/v4/summoners/by-account/(?P<key>[^/?]+)')),
+        ('get_matchlist_by_accountid', re.compile(r'^/lol/match/v4/matchlists/by-account/(?P<key>[^/?]+)')),
+        ('get_match_by_matchid', re.compile(r'^/lol/match/v4/matches/(?P<key>\d+)')),
+        ('get_match_timeline_by_matchid', re.compile(r'^/lol/match/v4/timelines/by-match/(?P<key>\d+)')),
+        ('get_summoner_by_summoner_id', re.compile(r'^/lol/summoner/v4/summoners/(?P<key>[^/?]+)')),
+    )
+
+    def __init__(
+        self,
+        fixtures: dict,
+        games: int,
+        accounts: int,
+        app_limit: str = None,
+        latency: float = 0.0,
+    ):
+        self.fixtures = fixtures
+        self.games = games
+        self.accounts = accounts
+        self.limits = Limits(app_limit)
+        self.latency = latency
+        self.calls = collections.Counter()
+        self.throttled = 0
+        self._timeline = json.dumps(fixtures['timeline']).encode()
+        self._server = None
+
+    def _match(
+        self,
+        game_id: int,
+    ) -> bytes:
+        payload = dict(self.fixtures['match'], gameId=game_id)
+        rnd = random.Random(game_id)
+        identities = []
+        for identity in payload['participantIdentities']:
+            account_id = f'account-{rnd.randrange(self.accounts)}'
+            identities.append(dict(identity, player=dict(
+                identity['player'], accountId=account_id, currentAccountId=account_id,
+            )))
+        payload['participantIdentities'] = identities
+        return json.dumps(payload).encode()
+
+    def _matchlist(
+        self,
+        query: dict,
+    ) -> bytes:
+        begin = int(query.get('beginIndex', 0))
+        end = min(int(query.get('endIndex', begin + 100)), self.games)
+        now = int(time.time() * 1000)
+        matches = [{
+            'gameId': 4000000000 + n,
+            'platformId': 'EUW1',
+            'champion': 1,
+            'queue': 420,
+            'season': 13,
+            'timestamp': now - n * 3600000,
+            'role': 'SOLO',
+            'lane': 'TOP',
+        } for n in range(begin, end)]
+        return json.dumps({
+            'matches': matches, 'startIndex': begin, 'endIndex': end, 'totalGames': self.games,
+        }).encode()
+
+    def respond(
+        self,
+        path: str,
+        query: dict,
+    ):
+        # returns (status, headers, body)
+        headers, retry_after = self.limits.hit()
+        if retry_after is not None:
+            self.throttled += 1
+            headers.update({'Retry-After': str(max(1, round(retry_after))), 'X-Rate-Limit-Type': 'application'})
+            return 429, headers, b'{"status": {"status_code": 429}}'
+
+        for route, pattern in self.ROUTES:
+            m = pattern.match(path)
+            if m is None:
+                continue
+            self.calls[route] += 1
+            key = m.group('key')
+            if route in ('get_summoner_by_summonername', 'get_summoner_by_account_id', 'get_summoner_by_summoner_id'):
+                body = json.dumps(dict(
+                    self.fixtures['summoner'], accountId=key, name=f'player {key}', revisionDate=int(time.time() * 1000),
+                )).encode()
+            elif route == 'get_matchlist_by_accountid':
+                body = self._matchlist(query)
+            elif route == 'get_match_by_matchid':
+                body = self._match(int(key))
+            else:
+                body = self._timeline
+            return 200, headers, body
+        return 404, headers, b'{"status": {"status_code": 404}}'
+
+    def start(self) -> str:
+        stub = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                path, _, qs = self.path.partition('?')
+                query = dict(p.split('=', 1) for p in qs.split('&') if '=' in p)
+                if stub.latency:
+                    time.sleep(stub.latency)
+                status, headers, body = stub.respond(path, query)
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f'http://127.0.0.1:{self._server.server_address[1]}/'
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
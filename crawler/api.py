@@ -1,14 +1,21 @@
 import json
-import threading
+import os
 import urllib3
 
 import falcon
 import psutil
 
+import async_client
+import async_controller
 import client
 import controller
+import db
+import dbpool
+import jobs
+import metrics
+import shard
+import spider
 try:
-    import database
     import util
 except ModuleNotFoundError:
     print('common package not in python path')
@@ -32,27 +39,173 @@ class Summoner:
 
     def on_post(self, req, resp):
         body = json.loads(req.stream.read())
-        logger.info(f'crawling "{body["summonerName"]}"')
+        logger.info(f'queueing crawl of "{body["summonerName"]}"')
 
-        # we dont check tls certificates so surpress the warning
-        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-        config = client.ClientConfig(
-            token=req.headers['X-RIOT-TOKEN'],
-        )
-        routes = client.ClientRoutes(
-            endpoint=req.headers['ENDPOINT'],
-        )
-        riot_client = client.Client(
+        options = {k: body[k] for k in ('engine', 'workers', 'full', 'spider', 'depth') if k in body}
+        if 'workers' in options and (
+            type(options['workers']) is not int or not 1 <= options['workers'] <= controller.max_workers()
+        ):
+            resp.text = json.dumps({'error': f'workers must be an integer from 1 to {controller.max_workers()}'})
+            resp.status = falcon.HTTP_BAD_REQUEST
+            return
+        if 'depth' in options and options['depth'] not in controller.DEPTHS:
+            resp.text = json.dumps({'error': f'depth must be one of {", ".join(controller.DEPTHS)}'})
+            resp.status = falcon.HTTP_BAD_REQUEST
+            return
+        if 'spider' in options:
+            try:
+                spider.SpiderConfig.from_options(options['spider'])
+            except (TypeError, ValueError) as e:
+                resp.text = json.dumps({'error': str(e)})
+                resp.status = falcon.HTTP_BAD_REQUEST
+                return
+        try:
+            with dbpool.connection() as conn:
+                job_id = jobs.enqueue(
+                    conn=conn,
+                    summoner_name=body['summonerName'],
+                    endpoint=req.headers['ENDPOINT'],
+                    token=req.headers['X-RIOT-TOKEN'],
+                    options=options,
+                )
+        except jobs.TokenNotConfigured as e:
+            resp.text = json.dumps({'error': str(e)})
+            resp.status = falcon.HTTP_FORBIDDEN
+            return
+        except jobs.JobConflict as e:
+            resp.text = json.dumps({'error': str(e), 'jobId': e.job_id})
+            resp.status = falcon.HTTP_CONFLICT
+            return
+        worker_pool.notify()
+
+        resp.text = json.dumps({'jobId': job_id})
+        resp.status = falcon.HTTP_201
+
+
+class Job:
+
+    def on_get(self, req, resp, job_id):
+        with dbpool.connection() as conn:
+            job = jobs.select_job(
+                conn=conn,
+                job_id=job_id,
+            )
+        if job is None:
+            resp.status = falcon.HTTP_NOT_FOUND
+            return
+        resp.text = json.dumps(job)
+        resp.status = falcon.HTTP_OK
+
+
+def run_crawl(
+    summoner_name: str,
+    endpoint: str,
+    token: str,
+    options: dict,
+    progress,
+    checkpoint=None,
+):
+    # we dont check tls certificates so surpress the warning
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    config = client.ClientConfig(
+        token=token,
+        pool_size=int(os.getenv('CRAWLER_POOL_SIZE', 10)),
+        archive_dir=os.getenv('CRAWLER_ARCHIVE_DIR'),
+    )
+    # with several keys in CRAWLER_RIOT_TOKENS, crawls are spread over them and matches are fetched
+    # from the endpoints in CRAWLER_PLATFORM_ENDPOINTS. the key of a job is always one of them.
+    tokens = shard.parse_tokens(os.getenv('CRAWLER_RIOT_TOKENS'))
+    sharded = len(tokens) > 1
+    platform_endpoints = shard.parse_endpoints(os.getenv('CRAWLER_PLATFORM_ENDPOINTS'))
+
+    def crawl(summoner_name, progress=None, discover=None, checkpoint=None):
+        # only keys of the request's application, see shard.same_application
+        pool = shard.same_application(
             config=config,
-            routes=routes,
-        )
+            tokens=tokens,
+            home_token=token,
+            endpoint=endpoint,
+            summoner_name=summoner_name,
+        ) if sharded else []
+        if options.get('engine') == 'async':
+            if sharded:
+                aclient = shard.AsyncShardedClient(
+                    config=config,
+                    tokens=pool,
+                    home_endpoint=endpoint,
+                    platform_endpoints=platform_endpoints,
+                )
+            else:
+                aclient = async_client.AsyncClient(
+                    config=config,
+                    routes=client.ClientRoutes(endpoint=endpoint),
+                )
+            async_controller.run_crawl_summoner(
+                aclient=aclient,
+                summoner_name=summoner_name,
+                progress=progress,
+                full=bool(options.get('full', False)),
+                discover=discover,
+                checkpoint=checkpoint,
+                depth=options.get('depth', controller.DEPTH_TIMELINE),
+            )
+        else:
+            if sharded:
+                rclient = shard.ShardedClient(
+                    config=config,
+                    tokens=pool,
+                    home_endpoint=endpoint,
+                    platform_endpoints=platform_endpoints,
+                )
+            else:
+                rclient = client.Client(
+                    config=config,
+                    routes=client.ClientRoutes(endpoint=endpoint),
+                )
+            controller.crawl_summoner(
+                rclient=rclient,
+                summoner_name=summoner_name,
+                workers=int(options.get('workers', 1)),
+                progress=progress,
+                full=bool(options.get('full', False)),
+                discover=discover,
+                checkpoint=checkpoint,
+                depth=options.get('depth', controller.DEPTH_TIMELINE),
+            )
 
-        t = threading.Thread(
-            target=controller.crawl_summoner,
-            args=(riot_client, body['summonerName']),
+    if 'spider' in options:
+        # job progress counts matches against the max_matches budget, the frontier is not checkpointed
+        spider.Spider(
+            config=spider.SpiderConfig.from_options(options['spider']),
+            crawl=crawl,
+        ).run(
+            seed_name=summoner_name,
+            progress=progress,
         )
-        t.start()
-        resp.status_code = falcon.HTTP_201
+    else:
+        crawl(
+            summoner_name=summoner_name,
+            progress=progress,
+            checkpoint=checkpoint,
+        )
+
+
+def crawl_retryable(
+    error: Exception,
+) -> bool:
+    # a missing summoner or a request riot refuses fails the same way on the next attempt
+    if isinstance(error, controller.SummonerNotFound):
+        return False
+    if isinstance(error, client.RiotAPINotOkayException):
+        return controller.revisit_later(error)
+    return True
+
+
+worker_pool = jobs.WorkerPool(
+    size=jobs.pool_size(),
+    run=run_crawl,
+    retryable=crawl_retryable,
+)
 
 
 class Status:
@@ -64,16 +217,49 @@ class Status:
         resp.status = falcon.HTTP_OK
 
 
+class Metrics:
+
+    def on_get(self, req, resp):
+        # summed over all gunicorn workers, whichever of them answers the scrape
+        resp.content_type = metrics.CONTENT_TYPE
+        resp.data = metrics.render()
+        resp.status = falcon.HTTP_OK
+
+
+@metrics.on_refresh
+def refresh_metrics():
+    metrics.active_crawls.set(worker_pool.active)
+    # read by the refresh thread, not by the scrape, and it gives up quickly when the pool is busy
+    with dbpool.connection(timeout=1.0) as conn:
+        metrics.queue_depth.set(jobs.count_jobs(
+            conn=conn,
+            status='queued',
+        ))
+
+
 def create():
+    # every running crawl holds a connection for its writes, its lookups, claims and checkpoints and the
+    # api handlers need more on top, so a pool no larger than the crawls would stall them all
+    if dbpool.pool_size() <= jobs.pool_size():
+        raise ValueError(
+            f'CRAWLER_DB_POOL_SIZE ({dbpool.pool_size()}) must be larger than CRAWLER_WORKERS ({jobs.pool_size()})'
+        )
+
     api = falcon.App()
     api.add_route('/', Summoner())
     api.add_route('/status', Status())
+    api.add_route('/metrics', Metrics())
+    api.add_route('/jobs/{job_id:int}', Job())
     logger.info('falcon initialized')
 
-    conn = database.get_connection()
-    database.kill_connection(conn)
+    with dbpool.connection() as conn:
+        jobs.create_table(conn=conn)
+        db.create_tables(conn=conn)
     logger.info('database is ready')
 
+    worker_pool.start()
+    metrics.start_refresh()
+
     return api
 
 
@@ -0,0 +1,101 @@
+import gzip
+import os
+import tempfile
+
+try:
+    import util
+except ModuleNotFoundError:
+    print('common package not in python path')
+
+
+logger = util.Logger(__name__)
+
+MATCH = 'match'
+TIMELINE = 'timeline'
+SUMMONER = 'summoner'
+
+_SUFFIX = '.json.gz'
+
+
+class Archive:
+    '''
+    gzip compressed raw riot responses on disk, laid out as <path>/<kind>/<shard>/<key>.json.gz
+    '''
+
+    def __init__(
+        self,
+        path: str,
+        compresslevel: int = 6,
+    ):
+        self.path = path
+        self.compresslevel = compresslevel
+
+    def _dir(
+        self,
+        kind: str,
+        key: str,
+    ) -> str:
+        # spread the files, a flat directory with millions of games gets slow
+        return os.path.join(self.path, kind, str(key)[-3:])
+
+    def _file(
+        self,
+        kind: str,
+        key,
+    ) -> str:
+        return os.path.join(self._dir(kind, key), f'{key}{_SUFFIX}')
+
+    def put(
+        self,
+        kind: str,
+        key,
+        data: bytes,
+    ):
+        directory = self._dir(kind, key)
+        os.makedirs(directory, exist_ok=True)
+        # write and rename so readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(gzip.compress(data, compresslevel=self.compresslevel))
+            os.replace(tmp, self._file(kind, key))
+        except OSError as e:
+            logger.warn(f'archiving {kind} {key} failed: {e}')
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def has(
+        self,
+        kind: str,
+        key,
+    ) -> bool:
+        return os.path.exists(self._file(kind, key))
+
+    def get(
+        self,
+        kind: str,
+        key,
+    ):
+        try:
+            with open(self._file(kind, key), 'rb') as f:
+                return gzip.decompress(f.read())
+        except FileNotFoundError:
+            return None
+
+    def keys(
+        self,
+        kind: str,
+    ):
+        root = os.path.join(self.path, kind)
+        if not os.path.isdir(root):
+            return
+        for shard in sorted(os.listdir(root)):
+            for name in sorted(os.listdir(os.path.join(root, shard))):
+                if name.endswith(_SUFFIX):
+                    yield name[:-len(_SUFFIX)]
+
+
+def from_path(
+    path: str,
+):
+    return Archive(path=path) if path else None
@@ -0,0 +1,222 @@
+import asyncio
+import time
+
+import aiohttp
+
+import archive
+import client
+import jsonlib
+import metrics
+import ratelimit
+import retry
+
+try:
+    from dtos import match
+    import util
+except ModuleNotFoundError:
+    print('common package not in python path')
+
+
+logger = util.Logger(__name__)
+
+
+class AsyncClient:
+    '''
+    asyncio counterpart of client.Client, shares routes, decoders and the per-token rate limiter
+    '''
+
+    def __init__(
+        self,
+        config: client.ClientConfig,
+        routes: client.ClientRoutes,
+    ):
+        self.config = config
+        self.routes = routes
+        self.archive = archive.from_path(config.archive_dir)
+        self._session = None
+
+    # see client.Client
+    @property
+    def limiter(self) -> ratelimit.RateLimiter:
+        return ratelimit.get_limiter(self.config.token, self.routes.endpoint)
+
+    @property
+    def breaker(self) -> retry.CircuitBreaker:
+        return client.get_breaker(config=self.config, routes=self.routes)
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # aiohttp sessions are bound to the running loop, so they are created on first use
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.config.pool_size,
+                    ssl=False,
+                ),
+                headers={'X-Riot-Token': self.config.token},
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def shard(
+        self,
+        platform_id: str = None,
+        token: str = None,
+    ) -> 'AsyncClient':
+        return self
+
+    async def _request(
+        self,
+        method: str,
+        route: str,
+        url: str,
+        params: dict = None,
+        archive_as: tuple = None,
+        missing_ok: bool = False,
+    ):
+        # same error handling as client.Client._request
+        attempt = 0
+        rate_limited = 0
+        while True:
+            try:
+                self.breaker.check()
+            except retry.CircuitOpen:
+                metrics.riot_failures.labels(route=route, reason='circuit_open').inc()
+                raise
+            waited = await self.limiter.acquire_async(route)
+            start = time.perf_counter()
+            try:
+                async with self._get_session().request(
+                    method=method,
+                    url=url,
+                    params=params,
+                ) as res:
+                    if res.status < 400:
+                        data = await res.read()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self.breaker.failure()
+                attempt += 1
+                delay = client.retry_delay(self.config, route, attempt, f'failed: {e!r}')
+                if delay is None:
+                    raise client.RiotAPINotOkayException(res=None, msg=f'{route} failed: {e!r}') from e
+                await asyncio.sleep(delay)
+                continue
+            metrics.observe_riot_response(
+                route=route,
+                status=res.status,
+                seconds=time.perf_counter() - start,
+                waited=waited,
+                rate_limit_type=res.headers.get('X-Rate-Limit-Type'),
+            )
+            self.limiter.update(route, res.headers, res.status)
+            if res.status < 400:
+                self.breaker.success()
+                if archive_as is not None and self.archive is not None:
+                    # compressing and writing would block the event loop
+                    await asyncio.get_running_loop().run_in_executor(None, self.archive.put, *archive_as, data)
+                return res.status, jsonlib.loads(data)
+
+            kind = retry.classify(res.status)
+            if kind == retry.RATE_LIMITED:
+                rate_limited += 1
+                if not client.retry_rate_limited(self.config, self.breaker, route, res.headers, rate_limited):
+                    raise client.RiotAPINotOkayException(res=res, msg=f'{route} returned {res.status}')
+                continue
+            if kind == retry.PERMANENT:
+                self.breaker.success()
+                if res.status == 404 and missing_ok:
+                    return res.status, None
+                metrics.riot_failures.labels(route=route, reason='permanent').inc()
+                raise client.RiotAPINotOkayException(res=res, msg=f'{route} returned {res.status}')
+            self.breaker.failure()
+            attempt += 1
+            delay = client.retry_delay(self.config, route, attempt, f'returned {res.status}')
+            if delay is None:
+                raise client.RiotAPINotOkayException(res=res, msg=f'{route} returned {res.status}')
+            await asyncio.sleep(delay)
+
+    async def get_summoner_by_summonername(
+        self,
+        summoner_name: str,
+    ):
+        status, res = await self._request(
+            method='GET',
+            route='get_summoner_by_summonername',
+            url=self.routes.get_summoner_by_summonername(summoner_name=summoner_name),
+            missing_ok=True,
+        )
+        if status == 404:
+            return None
+        return client.decode_summoner(res=res)
+
+    async def get_summoner_by_account_id(
+        self,
+        account_id: str,
+    ):
+        _, res = await self._request(
+            method='GET',
+            route='get_summoner_by_account_id',
+            url=self.routes.get_summoner_by_account_id(account_id=account_id),
+            archive_as=(archive.SUMMONER, account_id),
+        )
+        return client.decode_summoner(res=res)
+
+    async def get_summoner_by_summoner_id(
+        self,
+        summoner_id: str,
+    ):
+        _, res = await self._request(
+            method='GET',
+            route='get_summoner_by_summoner_id',
+            url=self.routes.get_summoner_by_summoner_id(summoner_id=summoner_id),
+        )
+        return client.decode_summoner(res=res)
+
+    async def get_match_by_matchid(
+        self,
+        match_id: int,
+    ) -> match.MatchDto:
+        _, res = await self._request(
+            method='GET',
+            route='get_match_by_matchid',
+            url=self.routes.get_match_by_matchid(match_id=match_id),
+            archive_as=(archive.MATCH, match_id),
+        )
+        return client.decode_match(res=res, match_id=match_id)
+
+    async def get_matchlist_by_accountid(
+        self,
+        account_id: str,
+        begin_index=0,
+        end_index=100,
+    ):
+        _, res = await self._request(
+            method='GET',
+            route='get_matchlist_by_accountid',
+            url=self.routes.get_matchlist_by_accountid(account_id=account_id),
+            params={
+                'beginIndex': begin_index,
+                'endIndex': end_index,
+            },
+        )
+        return client.decode_matchlist(res=res)
+
+    async def get_match_timeline_by_matchid(
+        self,
+        match_id: str,
+    ):
+        _, res = await self._request(
+            method='GET',
+            route='get_match_timeline_by_matchid',
+            url=self.routes.get_match_timeline_by_matchid(match_id=match_id),
+            archive_as=(archive.TIMELINE, match_id),
+        )
+        return client.decode_match_timeline(res=res)
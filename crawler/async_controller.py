@@ -0,0 +1,299 @@
+import asyncio
+import concurrent.futures
+
+import async_client
+import cache
+import client
+import controller
+import db
+import dbpool
+import metrics
+
+try:
+    import util
+except ModuleNotFoundError:
+    print('common package not in python path')
+
+
+logger = util.Logger(__name__)
+
+# matches held in memory at once, requests in flight are bounded by the rate limiter anyway
+DEFAULT_MAX_IN_FLIGHT = 20
+
+
+async def fetch_match(
+    aclient: async_client.AsyncClient,
+    run_db,
+    conn,
+    game_id: int,
+    platform_id: str = None,
+    depth: str = controller.DEPTH_TIMELINE,
+) -> controller.MatchData:
+    # same key routing and depths as controller.fetch_match_data
+    mclient = aclient.shard(platform_id=platform_id)
+    match = await mclient.get_match_by_matchid(
+        game_id,
+    )
+    level = controller.depth_level(depth)
+    if level < controller.depth_level(controller.DEPTH_PARTICIPANTS):
+        return controller.MatchData(
+            match=match,
+            summoners=[],
+            timeline=None,
+            depth=depth,
+        )
+    account_ids = [identity.player.current_account_id for identity in match.participant_identities]
+    platform_ids = {
+        identity.player.current_account_id: identity.player.current_platform_id
+        for identity in match.participant_identities
+    }
+    summoners = await run_db(
+        controller.known_summoners,
+        conn=conn,
+        account_ids=account_ids,
+        max_age=controller.summoner_max_age(),
+    )
+    await asyncio.get_running_loop().run_in_executor(None, lambda: controller.archive_summoners(
+        raw_archive=mclient.archive,
+        summoners=list(summoners.values()),
+    ))
+    missing = [account_id for account_id in account_ids if account_id not in summoners]
+    with_timeline = level >= controller.depth_level(controller.DEPTH_TIMELINE)
+    fetched = await asyncio.gather(
+        *([aclient.shard(platform_id=match.platform_id).get_match_timeline_by_matchid(
+            match_id=str(match.game_id),
+        )] if with_timeline else []),
+        *[
+            aclient.shard(
+                platform_id=platform_ids[account_id],
+                token=mclient.config.token,
+            ).get_summoner_by_account_id(account_id)
+            for account_id in missing
+        ],
+    )
+    timeline = fetched.pop(0) if with_timeline else None
+    for account_id, summoner in zip(missing, fetched):
+        cache.summoners.put(summoner)
+        summoners[account_id] = summoner
+    return controller.MatchData(
+        match=match,
+        summoners=[summoners[account_id] for account_id in account_ids],
+        timeline=timeline,
+        depth=depth,
+        fetched=set(missing),
+    )
+
+
+async def stream_matchlist(
+    aclient: async_client.AsyncClient,
+    account_id: str,
+    watermark,
+    begin_index: int = 0,
+):
+    # same paging as controller.stream_matchlist, the next page is requested while the current one is crawled
+    def fetch(i):
+        return asyncio.ensure_future(aclient.get_matchlist_by_accountid(
+            account_id=account_id,
+            begin_index=i,
+            end_index=i+controller.MATCHLIST_PAGE,
+        ))
+
+    future = fetch(begin_index)
+    try:
+        while begin_index is not None:
+            refs, next_index = controller.matchlist_page((await future).matches, watermark, begin_index)
+            if next_index is not None:
+                future = fetch(next_index)
+            yield refs, next_index
+            begin_index = next_index
+    finally:
+        future.cancel()
+
+
+async def crawl_summoner(
+    aclient: async_client.AsyncClient,
+    summoner_name: str,
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    progress=None,
+    full: bool = False,
+    discover=None,
+    checkpoint=None,
+    depth: str = controller.DEPTH_TIMELINE,
+):
+    loop = asyncio.get_event_loop()
+    # psycopg2 connections must not be used concurrently, all db work goes through one thread
+    db_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    pool = dbpool.get_pool()
+    conn = await loop.run_in_executor(db_executor, pool.getconn)
+
+    async def run_db(func, **kwargs):
+        return await loop.run_in_executor(db_executor, lambda: func(**kwargs))
+
+    owner = controller.claim_owner()
+    claimed = set()
+    # see controller.advance_watermark
+    unsettled = set()
+    pending = set()
+
+    try:
+        state = None if checkpoint is None else await loop.run_in_executor(None, checkpoint.load)
+        if state is not None:
+            account_id, resumed_refs, begin_index = controller.resume_state(state)
+            logger.info(f'"{summoner_name}" - resuming with {resumed_refs.__len__()} games from the checkpoint')
+        else:
+            summoner = await aclient.get_summoner_by_summonername(
+                summoner_name=summoner_name,
+            )
+            if summoner is None:
+                raise controller.SummonerNotFound(f'summoner "{summoner_name}" does not exist')
+            account_id, resumed_refs, begin_index = summoner.account_id, [], 0
+
+        watermark = None if full or begin_index is None else await run_db(
+            db.select_watermark,
+            conn=conn,
+            account_id=account_id,
+        )
+        match_ref_list = list(resumed_refs)
+
+        async def pages():
+            if resumed_refs:
+                yield resumed_refs
+            if begin_index is None:
+                return
+            async for refs, next_index in stream_matchlist(
+                aclient=aclient,
+                account_id=account_id,
+                watermark=watermark,
+                begin_index=begin_index,
+            ):
+                match_ref_list.extend(refs)
+                if checkpoint is not None:
+                    await loop.run_in_executor(
+                        None,
+                        checkpoint.save,
+                        controller.checkpoint_state(account_id, match_ref_list, next_index),
+                    )
+                yield refs
+
+        semaphore = asyncio.Semaphore(max_in_flight)
+        processed = 0
+
+        def report():
+            nonlocal processed
+            processed += 1
+            if progress is not None:
+                progress(processed, match_ref_list.__len__())
+
+        async def ingest(g, ref):
+            try:
+                if not await run_db(db.claim_match, conn=conn, game_id=ref.game_id, owner=owner):
+                    logger.info(f'"{summoner_name}" - game {g}/{match_ref_list.__len__()}: claimed elsewhere, skip')
+                    unsettled.add(ref.game_id)
+                    metrics.matches_skipped.inc()
+                    report()
+                    return
+                claimed.add(ref.game_id)
+                logger.info(f'"{summoner_name}" - game {g}/{match_ref_list.__len__()}')
+                try:
+                    match_data = await fetch_match(
+                        aclient=aclient,
+                        run_db=run_db,
+                        conn=conn,
+                        game_id=ref.game_id,
+                        platform_id=ref.platform_id,
+                        depth=depth,
+                    )
+                except client.RiotAPINotOkayException as e:
+                    # same as the threaded engine, one match riot fails to deliver does not end the crawl
+                    if not controller.skips_match(e):
+                        raise
+                    logger.warn(f'"{summoner_name}" - game {g}/{match_ref_list.__len__()}: {e}, skip')
+                    await run_db(db.release_match_claims, conn=conn, game_ids=[ref.game_id], owner=owner)
+                    claimed.discard(ref.game_id)
+                    if controller.revisit_later(e):
+                        unsettled.add(ref.game_id)
+                    report()
+                    return
+                await run_db(controller.store_match, conn=conn, match_data=match_data, owner=owner)
+                claimed.discard(ref.game_id)
+                if discover is not None:
+                    discover(match_data)
+                report()
+            finally:
+                semaphore.release()
+
+        def done(task):
+            pending.discard(task)
+            if not task.cancelled() and task.exception() is not None:
+                errors.append(task.exception())
+
+        # at most max_in_flight matches are started at a time, the rest of the matchlist is paged lazily
+        errors = []
+        g = 0
+        async for refs in pages():
+            missing = await run_db(
+                controller.missing_game_ids,
+                conn=conn,
+                game_ids=[ref.game_id for ref in refs],
+            )
+            for ref in refs:
+                if ref.game_id not in missing:
+                    logger.info(f'"{summoner_name}" - game {g}/{match_ref_list.__len__()}: skip')
+                    metrics.matches_skipped.inc()
+                    report()
+                else:
+                    await semaphore.acquire()
+                    if errors:
+                        semaphore.release()
+                        raise errors[0]
+                    task = asyncio.ensure_future(ingest(g, ref))
+                    pending.add(task)
+                    task.add_done_callback(done)
+                g += 1
+        while pending:
+            await asyncio.wait(list(pending))
+        if errors:
+            raise errors[0]
+
+        await run_db(
+            controller.advance_watermark,
+            conn=conn,
+            account_id=account_id,
+            refs=match_ref_list,
+            unsettled=unsettled,
+        )
+    finally:
+        for task in list(pending):
+            task.cancel()
+        if pending:
+            await asyncio.wait(list(pending))
+        await aclient.close()
+        try:
+            await run_db(db.release_match_claims, conn=conn, game_ids=claimed, owner=owner)
+        except Exception as e:
+            logger.warn(f'releasing {len(claimed)} match claims failed, they time out instead: {e}')
+        await loop.run_in_executor(db_executor, pool.putconn, conn)
+        db_executor.shutdown(wait=False)
+
+
+def run_crawl_summoner(
+    aclient: async_client.AsyncClient,
+    summoner_name: str,
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    progress=None,
+    full: bool = False,
+    discover=None,
+    checkpoint=None,
+    depth: str = controller.DEPTH_TIMELINE,
+):
+    # entrypoint for worker threads, runs the crawl on its own event loop
+    asyncio.run(crawl_summoner(
+        aclient=aclient,
+        summoner_name=summoner_name,
+        max_in_flight=max_in_flight,
+        progress=progress,
+        full=full,
+        discover=discover,
+        checkpoint=checkpoint,
+        depth=depth,
+    ))
@@ -0,0 +1,170 @@
+import re
+import time
+
+import metrics
+
+_INSERT_RE = re.compile(r'^\s*INSERT\s+INTO\s+("?[\w.]+"?)', re.IGNORECASE)
+_VALUES_RE = re.compile(r'\bVALUES\s*\(', re.IGNORECASE)
+
+
+def split_insert(
+    sql: str,
+):
+    '''
+    splits "INSERT INTO t (a, b) VALUES (%s, %s) ON CONFLICT ..." into
+    (table, "INSERT INTO t (a, b) VALUES ", "(%s, %s)", " ON CONFLICT ...")
+    returns None for anything that is not a single row insert
+    '''
+    insert = _INSERT_RE.match(sql)
+    values = _VALUES_RE.search(sql)
+    if insert is None or values is None:
+        return None
+
+    # find the parenthesis closing the values tuple, skipping quoted literals
+    start = values.end() - 1
+    depth = 0
+    quote = None
+    for pos in range(start, len(sql)):
+        char = sql[pos]
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in '\'"':
+            quote = char
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+            if depth == 0:
+                suffix = sql[pos + 1:]
+                if '%' in suffix or 'returning' in suffix.lower():
+                    # parameters or results outside the values tuple cannot be batched
+                    return None
+                return (
+                    insert.group(1).strip('"'),
+                    sql[:start],
+                    sql[start:pos + 1],
+                    suffix.rstrip().rstrip(';'),
+                )
+    return None
+
+
+class _BufferedCursor:
+
+    def __init__(
+        self,
+        batch: 'BatchConnection',
+    ):
+        self._batch = batch
+
+    def execute(
+        self,
+        sql: str,
+        params=None,
+    ):
+        self._batch.add(sql, params)
+
+    def executemany(
+        self,
+        sql: str,
+        params_seq,
+    ):
+        for params in params_seq:
+            self._batch.add(sql, params)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class BatchConnection:
+    '''
+    stands in for a psycopg2 connection while a whole match is written through the database.insert_* helpers.
+    rows are collected and written as one multi-row INSERT per statement shape (i.e. per table) on flush().
+    any other statement is run in its place, inserts after it are batched separately so nothing is reordered.
+    '''
+
+    def __init__(
+        self,
+        conn,
+    ):
+        self.conn = conn
+        # [table, statement shape, row parameters] in first-seen order, which respects foreign keys
+        self._statements = []
+        # statement shape -> its entry in _statements, for the inserts since the last standalone statement
+        self._open = {}
+        self.round_trips = 0
+
+    def cursor(self, *args, **kwargs):
+        return _BufferedCursor(batch=self)
+
+    def commit(self):
+        # the batch is committed as a whole in flush()
+        pass
+
+    def rollback(self):
+        self._statements.clear()
+        self._open.clear()
+
+    def add(
+        self,
+        sql: str,
+        params=None,
+    ):
+        parts = split_insert(sql)
+        if parts is None:
+            # anything unexpected runs as a standalone statement, later inserts must not move before it
+            self._statements.append([None, (sql, '', ''), [params]])
+            self._open.clear()
+            return
+        table, prefix, values, suffix = parts
+        key = (prefix, values, suffix)
+        if key not in self._open:
+            self._open[key] = [table, key, []]
+            self._statements.append(self._open[key])
+        self._open[key][2].append(params)
+
+    def rows(self) -> dict:
+        counts = {}
+        for table, key, params in self._statements:
+            counts[table] = counts.get(table, 0) + len(params)
+        return counts
+
+    def flush(self):
+        # everything goes into one transaction, a match is stored completely or not at all
+        autocommit = getattr(self.conn, 'autocommit', False) is True
+        cur = self.conn.cursor()
+        try:
+            if autocommit:
+                cur.execute('BEGIN')
+            for table, key, params_list in self._statements:
+                prefix, values, suffix = key
+                if not values:
+                    for params in params_list:
+                        cur.execute(prefix, params)
+                        self.round_trips += 1
+                    continue
+                rendered = b','.join(cur.mogrify(values, params) for params in params_list)
+                start = time.perf_counter()
+                cur.execute(prefix.encode() + rendered + suffix.encode())
+                metrics.db_insert_seconds.labels(table=table).observe(time.perf_counter() - start)
+                self.round_trips += 1
+            if autocommit:
+                cur.execute('COMMIT')
+            else:
+                self.conn.commit()
+        except Exception:
+            if autocommit:
+                cur.execute('ROLLBACK')
+            else:
+                self.conn.rollback()
+            raise
+        finally:
+            cur.close()
+            self._statements.clear()
+            self._open.clear()
@@ -0,0 +1,156 @@
+import collections
+import os
+import threading
+import time
+
+
+class KnownGameIds:
+    '''
+    game ids known to be in the database, shared by all crawls of a worker process.
+    the ids added longest ago are dropped first once there are more than `max_size`.
+    '''
+
+    def __init__(
+        self,
+        max_size: int,
+    ):
+        self.max_size = max_size
+        # used as an ordered set, oldest first
+        self._ids = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def unknown(
+        self,
+        game_ids,
+    ) -> list:
+        with self._lock:
+            return [game_id for game_id in game_ids if game_id not in self._ids]
+
+    def add(
+        self,
+        game_ids,
+    ):
+        if not self.max_size:
+            return
+        with self._lock:
+            for game_id in game_ids:
+                self._ids[game_id] = None
+                self._ids.move_to_end(game_id)
+            while len(self._ids) > self.max_size:
+                self._ids.popitem(last=False)
+
+
+class SummonerCache:
+    '''
+    LRU of summoners by account id whose entries expire after `ttl` seconds
+    '''
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(
+        self,
+        account_id: str,
+    ):
+        with self._lock:
+            entry = self._entries.get(account_id)
+            if entry is not None:
+                summoner, expires_at = entry
+                if expires_at < time.monotonic():
+                    del self._entries[account_id]
+                else:
+                    self._entries.move_to_end(account_id)
+                    self.hits += 1
+                    return summoner
+            self.misses += 1
+            return None
+
+    def put(
+        self,
+        summoner,
+    ):
+        if not self.max_size:
+            return
+        with self._lock:
+            current = self._entries.get(summoner.account_id)
+            if current is not None and current[0].revision_date > summoner.revision_date:
+                # never replace a newer revision with an older one
+                return
+            self._entries[summoner.account_id] = (summoner, time.monotonic() + self.ttl)
+            self._entries.move_to_end(summoner.account_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+class IdleMap:
+    '''
+    objects shared per key in a worker process, e.g. a rate limiter per api key, created on first use.
+    entries nobody asked for during `ttl` seconds are dropped and passed to `close`.
+    '''
+
+    def __init__(
+        self,
+        ttl: float,
+        close=None,
+    ):
+        self.ttl = ttl
+        self.close = close
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._swept_at = time.monotonic()
+
+    def get(
+        self,
+        key,
+        create,
+    ):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = [create(), now]
+                self._entries[key] = entry
+            entry[1] = now
+            value = entry[0]
+            idle = self._sweep(now)
+        for expired in idle:
+            self.close(expired)
+        return value
+
+    def _sweep(
+        self,
+        now: float,
+    ) -> list:
+        # at most once per ttl, lookups stay a plain dict access
+        if now - self._swept_at < self.ttl:
+            return []
+        self._swept_at = now
+        idle = [key for key, (_, used_at) in self._entries.items() if now - used_at >= self.ttl]
+        values = [self._entries.pop(key)[0] for key in idle]
+        return values if self.close is not None else []
+
+    def items(self) -> list:
+        with self._lock:
+            return [(key, value) for key, (value, _) in self._entries.items()]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+known_game_ids = KnownGameIds(
+    max_size=int(os.getenv('CRAWLER_GAME_ID_CACHE_SIZE', 200000)),
+)
+
+summoners = SummonerCache(
+    max_size=int(os.getenv('CRAWLER_SUMMONER_CACHE_SIZE', 50000)),
+    ttl=float(os.getenv('CRAWLER_SUMMONER_CACHE_TTL', 3600)),
+)
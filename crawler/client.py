@@ -1,11 +1,21 @@
 import dataclasses
-import requests
 import time
 
+import requests
+import requests.adapters
+import urllib3.util.retry
+
+import archive
+import cache
+import decoding
+import jsonlib
+import metrics
+import ratelimit
+import retry
+
 try:
     from dtos import match
     from dtos import matchlist
-    from dtos import match_timeline
     from dtos import summoner
     import model
     import util
@@ -82,6 +92,147 @@ class ClientRoutes:
 @dataclasses.dataclass()
 class ClientConfig:
     token: str
+    pool_size: int = 10
+    connection_retries: int = 3
+    archive_dir: str = None  # keep compressed raw match, timeline and summoner responses there
+    # 5xx and connection errors are retried this often, backing off up to backoff_cap seconds
+    max_retries: int = 5
+    # 429s in a row a request is sent again after, each time once the rate limiter lets it through
+    max_rate_limited: int = 10
+    backoff_base: float = 1.0
+    backoff_cap: float = 60.0
+    # requests to an endpoint fail fast for breaker_cooldown seconds after breaker_threshold failures in a row
+    breaker_threshold: int = 10
+    breaker_cooldown: float = 30.0
+
+
+# sessions of keys and endpoints no crawl used for this long are closed
+SESSION_IDLE_TTL = 900.0
+
+_sessions = cache.IdleMap(ttl=SESSION_IDLE_TTL, close=lambda session: session.close())
+
+
+def get_session(
+    config: ClientConfig,
+    routes: ClientRoutes,
+) -> requests.Session:
+    # keep-alive sessions are shared between all clients talking to the same endpoint with the same key
+    def create():
+        # only connection level failures are retried here, status codes are handled in Client._request
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=config.pool_size,
+            pool_maxsize=config.pool_size,
+            max_retries=urllib3.util.retry.Retry(
+                total=config.connection_retries,
+                connect=config.connection_retries,
+                read=config.connection_retries,
+                status=0,
+                backoff_factor=0.3,
+                raise_on_status=False,
+            ),
+        )
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.verify = False
+        return session
+
+    return _sessions.get((routes.endpoint, config.token), create)
+
+
+def decode_summoner(
+    res: dict,
+) -> summoner.SummonerDto:
+    return decoding.decode_summoner(res)
+
+
+def decode_match(
+    res: dict,
+    match_id: int,
+) -> match.MatchDto:
+    participant_identities = [
+        decoding.decode_participant_identity(
+            identity_raw,
+            player=decoding.decode_player(identity_raw['player']),
+        )
+        for identity_raw in res['participantIdentities']
+    ]
+
+    teams = [
+        decoding.decode_team_stats(
+            team_raw,
+            bans=[decoding.decode_team_bans(ban_raw) for ban_raw in team_raw['bans']],
+        )
+        for team_raw in res['teams']
+    ]
+
+    participants = []
+    for participant_raw in res['participants']:
+        # legacy rune and mastery information, not included for matches played with Runes Reforged
+        runes = [decoding.decode_rune(rune_raw) for rune_raw in participant_raw.get('runes', ())]
+        masteries = [decoding.decode_mastery(mastery_raw) for mastery_raw in participant_raw.get('masteries', ())]
+        participants.append(decoding.decode_participant(
+            participant_raw,
+            runes=runes,
+            stats=decoding.decode_participant_stats(participant_raw['stats']),
+            timeline=decoding.decode_participant_timeline(participant_raw['timeline']),
+            masteries=masteries,
+        ))
+
+    return decoding.decode_match(
+        res,
+        game_id=match_id,
+        participant_identities=participant_identities,
+        teams=teams,
+        participants=participants,
+    )
+
+
+def decode_matchlist(
+    res: dict,
+) -> matchlist.MatchlistDto:
+    return decoding.decode_matchlist(
+        res,
+        matches=[decoding.decode_match_reference(ref_raw) for ref_raw in res['matches']],
+    )
+
+
+def _decode_position(
+    raw: dict,
+):
+    position = raw.get('position')
+    return decoding.decode_position(position) if position is not None else None
+
+
+def decode_match_timeline(
+    res: dict,
+) -> decoding.MatchTimelineDto:
+    frames = []
+    for frame_raw in res['frames']:
+        participant_frames = {
+            key: decoding.decode_participant_frame(
+                participant_frame_raw,
+                position=_decode_position(participant_frame_raw),
+            )
+            for key, participant_frame_raw in frame_raw['participantFrames'].items()
+        }
+        events = [
+            decoding.decode_event(
+                event_raw,
+                position=_decode_position(event_raw),
+            )
+            for event_raw in frame_raw['events']
+        ]
+        frames.append(decoding.decode_frame(
+            frame_raw,
+            participant_frames=participant_frames,
+            events=events,
+        ))
+
+    return decoding.decode_match_timeline(
+        res,
+        frames=frames,
+    )
 
 
 class RiotAPINotOkayException(Exception):
@@ -93,12 +244,71 @@ class RiotAPINotOkayException(Exception):
         **kwargs,
     ):
         super().__init__(
+            msg,
             *args,
             **kwargs,
         )
         self.res = res
         self.msg = msg
 
+    @property
+    def status_code(self) -> int:
+        # None when riot could not be reached at all, requests and aiohttp responses name it differently
+        if self.res is None:
+            return None
+        return getattr(self.res, 'status_code', None) or getattr(self.res, 'status', None)
+
+
+def get_breaker(
+    config: ClientConfig,
+    routes: ClientRoutes,
+) -> retry.CircuitBreaker:
+    return retry.get_breaker(
+        endpoint=routes.endpoint,
+        threshold=config.breaker_threshold,
+        cooldown=config.breaker_cooldown,
+    )
+
+
+def retry_rate_limited(
+    config: ClientConfig,
+    breaker: retry.CircuitBreaker,
+    route: str,
+    headers,
+    count: int,
+) -> bool:
+    '''
+    whether a request is sent again after its `count`th 429 in a row
+    '''
+    if headers.get('X-Rate-Limit-Type', 'service') == 'service':
+        # riot's service is overloaded rather than our key, like a 5xx this counts toward pausing the endpoint
+        breaker.failure()
+    if count > config.max_rate_limited:
+        metrics.riot_failures.labels(route=route, reason='rate_limited').inc()
+        logger.warn(f'{route} rate limited {count} times in a row, giving up')
+        return False
+    metrics.riot_retries.labels(route=route).inc()
+    return True
+
+
+def retry_delay(
+    config: ClientConfig,
+    route: str,
+    attempt: int,
+    reason: str,
+):
+    '''
+    seconds to wait before retry number `attempt`, None once the retries are used up
+    '''
+    if attempt > config.max_retries:
+        metrics.riot_failures.labels(route=route, reason='retries').inc()
+        logger.warn(f'{route} {reason}, giving up after {attempt} attempts')
+        return None
+    metrics.riot_retries.labels(route=route).inc()
+    delay = retry.backoff(attempt, config.backoff_base, config.backoff_cap)
+    logger.warn(f'{route} {reason}, retrying in {delay:.1f}s ...')
+    return delay
+
 
 class Client:
 
@@ -109,29 +319,94 @@ class Client:
     ):
         self.config = config
         self.routes = routes
+        self.archive = archive.from_path(config.archive_dir)
+
+    # looked up on every request, so the shared ones of idle keys can be dropped, see cache.IdleMap
+    @property
+    def limiter(self) -> ratelimit.RateLimiter:
+        return ratelimit.get_limiter(self.config.token, self.routes.endpoint)
+
+    @property
+    def breaker(self) -> retry.CircuitBreaker:
+        return get_breaker(config=self.config, routes=self.routes)
+
+    @property
+    def session(self) -> requests.Session:
+        return get_session(config=self.config, routes=self.routes)
+
+    def shard(
+        self,
+        platform_id: str = None,
+        token: str = None,
+    ) -> 'Client':
+        # a single key and endpoint serve everything, see shard.ShardedClient
+        return self
 
     def _request(
         self, method: str,
+        route: str,
         *args,
+        missing_ok: bool = False,
         **kwargs,
     ):
+        # a 404 is returned with missing_ok, every other permanent error raises right away
+        attempt = 0
+        rate_limited = 0
         while True:
-            res = requests.request(
-                method=method,
-                verify=False,
-                *args,
-                **kwargs,
+            try:
+                self.breaker.check()
+            except retry.CircuitOpen:
+                metrics.riot_failures.labels(route=route, reason='circuit_open').inc()
+                raise
+            waited = self.limiter.acquire(route)
+            start = time.perf_counter()
+            try:
+                res = self.session.request(
+                    method=method,
+                    *args,
+                    **kwargs,
+                )
+            except requests.RequestException as e:
+                # connection level retries already happened in the session adapter, see get_session
+                self.breaker.failure()
+                attempt += 1
+                delay = retry_delay(self.config, route, attempt, f'failed: {e}')
+                if delay is None:
+                    raise RiotAPINotOkayException(res=None, msg=f'{route} failed: {e}') from e
+                time.sleep(delay)
+                continue
+            metrics.observe_riot_response(
+                route=route,
+                status=res.status_code,
+                seconds=time.perf_counter() - start,
+                waited=waited,
+                rate_limit_type=res.headers.get('X-Rate-Limit-Type'),
             )
+            self.limiter.update(route, res.headers, res.status_code)
             if res.ok:
-                break
-            else:
-                if res.status_code != 429:
-                    logger.warn('Quota limit, waiting ...')
-                    
-                # triggered if quota limit is reached, add some delay to avoid firewall
-                time.sleep(5)
-
-        return res
+                self.breaker.success()
+                return res
+
+            kind = retry.classify(res.status_code)
+            if kind == retry.RATE_LIMITED:
+                # the limiter holds the next request back for as long as riot asked
+                rate_limited += 1
+                if not retry_rate_limited(self.config, self.breaker, route, res.headers, rate_limited):
+                    raise RiotAPINotOkayException(res=res, msg=f'{route} returned {res.status_code}')
+                continue
+            if kind == retry.PERMANENT:
+                # riot answered, the endpoint itself is fine
+                self.breaker.success()
+                if res.status_code == 404 and missing_ok:
+                    return res
+                metrics.riot_failures.labels(route=route, reason='permanent').inc()
+                raise RiotAPINotOkayException(res=res, msg=f'{route} returned {res.status_code}')
+            self.breaker.failure()
+            attempt += 1
+            delay = retry_delay(self.config, route, attempt, f'returned {res.status_code}')
+            if delay is None:
+                raise RiotAPINotOkayException(res=res, msg=f'{route} returned {res.status_code}')
+            time.sleep(delay)
 
     def get_summoner_by_summonername(
         self,
@@ -139,21 +414,14 @@ class Client:
     ):
         res = self._request(
             method='GET',
+            route='get_summoner_by_summonername',
             url=self.routes.get_summoner_by_summonername(summoner_name=summoner_name),
             headers={'X-Riot-Token': self.config.token},
+            missing_ok=True,
         )
         if res.status_code == 404:
             return None
-        res = res.json()
-        return summoner.SummonerDto(
-            account_id=res['accountId'],
-            id=res['id'],
-            puuid=res['puuid'],
-            name=res['name'],
-            profile_icon_id=res['profileIconId'],
-            revision_date=res['revisionDate'],
-            summoner_level=res['summonerLevel'],
-        )
+        return decode_summoner(res=jsonlib.loads(res.content))
 
     def get_summoner_by_account_id(
         self,
@@ -161,18 +429,13 @@ class Client:
     ):
         res = self._request(
             method='GET',
+            route='get_summoner_by_account_id',
             url=self.routes.get_summoner_by_account_id(account_id=account_id),
             headers={'X-Riot-Token': self.config.token},
-            ).json()
-        return summoner.SummonerDto(
-            account_id=res['accountId'],
-            id=res['id'],
-            puuid=res['puuid'],
-            name=res['name'],
-            profile_icon_id=res['profileIconId'],
-            revision_date=res['revisionDate'],
-            summoner_level=res['summonerLevel'],
         )
+        if self.archive is not None:
+            self.archive.put(archive.SUMMONER, account_id, res.content)
+        return decode_summoner(res=jsonlib.loads(res.content))
 
     def get_summoner_by_summoner_id(
         self,
@@ -180,251 +443,25 @@ class Client:
     ):
         res = self._request(
             method='GET',
+            route='get_summoner_by_summoner_id',
             url=self.routes.get_summoner_by_summoner_id(summoner_id=summoner_id),
             headers={'X-Riot-Token': self.config.token},
-        ).json()
-        return summoner.SummonerDto(
-            account_id=res['accountId'],
-            id=res['id'],
-            puuid=res['puuid'],
-            name=res['name'],
-            profile_icon_id=res['profileIconId'],
-            revision_date=res['revisionDate'],
-            summoner_level=res['summonerLevel'],
         )
+        return decode_summoner(res=jsonlib.loads(res.content))
 
     def get_match_by_matchid(
         self,
         match_id: int,
     ) -> match.MatchDto:
-
         res = self._request(
             method='GET',
+            route='get_match_by_matchid',
             url=self.routes.get_match_by_matchid(match_id=match_id),
             headers={'X-Riot-Token': self.config.token},
-        ).json()
-
-        participant_identities = []
-        for participant_identity_raw in res['participantIdentities']:
-            player = match.PlayerDto(
-                profile_icon=participant_identity_raw['player']['profileIcon'],
-                account_id=participant_identity_raw['player']['accountId'],
-                match_history_uri=participant_identity_raw['player']['matchHistoryUri'],
-                current_account_id=participant_identity_raw['player']['currentAccountId'],
-                current_platform_id=participant_identity_raw['player']['currentPlatformId'],
-                summoner_name=participant_identity_raw['player']['summonerName'],
-                summoner_id=participant_identity_raw['player']['summonerId'],
-                platform_id=participant_identity_raw['player']['platformId'],
-            )
-            participant_identities.append(match.ParticipantIdentityDto(
-                participant_id=participant_identity_raw['participantId'],
-                player=player,
-            ))
-
-        teams = []
-        for team_raw in res['teams']:
-            bans = []
-            for ban_dto in team_raw['bans']:
-                bans.append(match.TeamBansDto(
-                    champion_id=ban_dto['championId'],
-                    pick_turn=ban_dto['pickTurn'],
-                ))
-
-            teams.append(match.TeamStatsDto(
-                tower_kills=team_raw['towerKills'],
-                rift_herald_kills=team_raw['riftHeraldKills'],
-                first_blood=team_raw['firstBlood'],
-                inhibitor_kills=team_raw['inhibitorKills'],
-                bans=bans,
-                first_baron=team_raw['firstBaron'],
-                first_dragon=team_raw['firstDragon'],
-                dominion_victory_score=team_raw['dominionVictoryScore'],
-                dragon_kills=team_raw['dragonKills'],
-                baron_kills=team_raw['baronKills'],
-                first_inhibitor=team_raw['firstInhibitor'],
-                first_tower=team_raw['firstTower'],
-                vilemaw_kills=team_raw['vilemawKills'],
-                first_rift_herald=team_raw['firstRiftHerald'],
-                team_id=team_raw['teamId'],
-                win=team_raw['win'],
-            ))
-
-        participants = []
-        for participant_raw in res['participants']:
-            runes = []
-            try:
-                for rune_raw in participant_raw['runes']:
-                    runes.append(match.RuneDto(
-                        rune_id=rune_raw['runeId'],
-                        rank=rune_raw['rank'],
-                    ))
-            except KeyError:
-                # List of legacy Rune information. Not included for matches played with Runes Reforged.
-                pass
-            stats = match.ParticipantStatsDto(
-                item0=participant_raw['stats'].get('item0'),
-                item2=participant_raw['stats'].get('item2'),
-                total_units_healed=participant_raw['stats'].get('totalUnitsHealed'),
-                item1=participant_raw['stats'].get('item1'),
-                largest_multi_kill=participant_raw['stats'].get('largestMultiKill'),
-                gold_earned=participant_raw['stats'].get('goldEarned'),
-                first_inhibitor_kill=participant_raw['stats'].get('firstInhibitorKill'),
-                physical_damage_taken=participant_raw['stats'].get('physicalDamageTaken'),
-                node_neutralize_assist=participant_raw['stats'].get('nodeNeutralizeAssist'),
-                total_player_score=participant_raw['stats'].get('totalPlayerScore'),
-                champ_level=participant_raw['stats'].get('champLevel'),
-                damage_dealt_to_objectives=participant_raw['stats'].get('damageDealtToObjectives'),
-                total_damage_taken=participant_raw['stats'].get('totalDamageTaken'),
-                neutral_minions_killed=participant_raw['stats'].get('neutralMinionsKilled'),
-                deaths=participant_raw['stats'].get('deaths'),
-                triple_kills=participant_raw['stats'].get('tripleKills'),
-                magic_damage_dealt_to_champions=participant_raw['stats'].get('magicDamageDealtToChampions'),
-                wards_killed=participant_raw['stats'].get('wardsKilled'),
-                penta_kills=participant_raw['stats'].get('pentaKills'),
-                damage_self_mitigated=participant_raw['stats'].get('damageSelfMitigated'),
-                largest_critical_strike=participant_raw['stats'].get('largestCriticalStrike'),
-                node_neutralize=participant_raw['stats'].get('nodeNeutralize'),
-                total_time_crowd_control_dealt=participant_raw['stats'].get('totalTimeCrowdControlDealt'),
-                first_tower_kill=participant_raw['stats'].get('firstTowerKill'),
-                magic_damage_dealt=participant_raw['stats'].get('magicDamageDealt'),
-                total_score_rank=participant_raw['stats'].get('totalScoreRank'),
-                node_capture=participant_raw['stats'].get('nodeCapture'),
-                wards_placed=participant_raw['stats'].get('wardsPlaced'),
-                total_damage_dealt=participant_raw['stats'].get('totalDamageDealt'),
-                time_ccing_others=participant_raw['stats'].get('timeCCingOthers'),
-                magical_damage_taken=participant_raw['stats'].get('magicalDamageTaken'),
-                largest_killing_spree=participant_raw['stats'].get('largestKillingSpree'),
-                total_damage_dealt_to_champions=participant_raw['stats'].get('totalDamageDealtToChampions'),
-                physical_damage_dealt_to_champions=participant_raw['stats'].get('physicalDamageDealtToChampions'),
-                neutral_minions_killed_team_jungle=participant_raw['stats'].get('neutralMinionsKilledTeamJungle'),
-                total_minions_killed=participant_raw['stats'].get('totalMinionsKilled'),
-                first_inhibitor_assist=participant_raw['stats'].get('firstInhibitorAssist'),
-                vision_wards_bought_in_game=participant_raw['stats'].get('visionWardsBoughtInGame'),
-                objective_player_score=participant_raw['stats'].get('objectivePlayerScore'),
-                kills=participant_raw['stats'].get('kills'),
-                first_tower_assist=participant_raw['stats'].get('firstTowerAssist'),
-                combat_player_score=participant_raw['stats'].get('combatPlayerScore'),
-                inhibitor_kills=participant_raw['stats'].get('inhibitorKills'),
-                turret_kills=participant_raw['stats'].get('turretKills'),
-                participant_id=participant_raw['stats'].get('participantId'),
-                true_damage_taken=participant_raw['stats'].get('trueDamageTaken'),
-                first_blood_assist=participant_raw['stats'].get('firstBloodAssist'),
-                node_capture_assist=participant_raw['stats'].get('nodeCaptureAssist'),
-                assists=participant_raw['stats'].get('assists'),
-                team_objective=participant_raw['stats'].get('teamObjective'),
-                altars_neutralized=participant_raw['stats'].get('altarsNeutralized'),
-                gold_spent=participant_raw['stats'].get('goldSpent'),
-                damage_dealt_to_turrets=participant_raw['stats'].get('damageDealtToTurrets'),
-                altars_captured=participant_raw['stats'].get('altarsCaptured'),
-                win=participant_raw['stats'].get('win'),
-                total_heal=participant_raw['stats'].get('totalHeal'),
-                unreal_kills=participant_raw['stats'].get('unrealKills'),
-                vision_score=participant_raw['stats'].get('visionScore'),
-                physical_damage_dealt=participant_raw['stats'].get('physicalDamageDealt'),
-                first_blood_kill=participant_raw['stats'].get('firstBloodKill'),
-                longest_time_spent_living=participant_raw['stats'].get('longestTimeSpentLiving'),
-                killing_sprees=participant_raw['stats'].get('killingSprees'),
-                sight_wards_bought_in_game=participant_raw['stats'].get('sightWardsBoughtInGame'),
-                true_damage_dealt_to_champions=participant_raw['stats'].get('trueDamageDealtToChampions'),
-                neutral_minions_killed_enemy_jungle=participant_raw['stats'].get('neutralMinionsKilledEnemyJungle'),
-                double_kills=participant_raw['stats'].get('doubleKills'),
-                true_damage_dealt=participant_raw['stats'].get('trueDamageDealt'),
-                quadra_kills=participant_raw['stats'].get('quadraKills'),
-                item4=participant_raw['stats'].get('item4'),
-                item3=participant_raw['stats'].get('item3'),
-                item6=participant_raw['stats'].get('item6'),
-                item5=participant_raw['stats'].get('item5'),
-                player_score0=participant_raw['stats'].get('playerScore0'),
-                player_score1=participant_raw['stats'].get('playerScore1'),
-                player_score2=participant_raw['stats'].get('playerScore2'),
-                player_score3=participant_raw['stats'].get('playerScore3'),
-                player_score4=participant_raw['stats'].get('playerScore4'),
-                player_score5=participant_raw['stats'].get('playerScore5'),
-                player_score6=participant_raw['stats'].get('playerScore6'),
-                player_score7=participant_raw['stats'].get('playerScore7'),
-                player_score8=participant_raw['stats'].get('playerScore8'),
-                player_score9=participant_raw['stats'].get('playerScore9'),
-                perk0=participant_raw['stats'].get('perk0'),
-                perk0_var1=participant_raw['stats'].get('perk0Var1'),
-                perk0_var2=participant_raw['stats'].get('perk0Var2'),
-                perk0_var3=participant_raw['stats'].get('perk0Var3'),
-                perk1=participant_raw['stats'].get('perk1'),
-                perk1_var1=participant_raw['stats'].get('perk1Var1'),
-                perk1_var2=participant_raw['stats'].get('perk1Var2'),
-                perk1_var3=participant_raw['stats'].get('perk1Var3'),
-                perk2=participant_raw['stats'].get('perk2'),
-                perk2_var1=participant_raw['stats'].get('perk2Var1'),
-                perk2_var2=participant_raw['stats'].get('perk2Var2'),
-                perk2_var3=participant_raw['stats'].get('perk2Var3'),
-                perk3=participant_raw['stats'].get('perk3'),
-                perk3_var1=participant_raw['stats'].get('perk3Var1'),
-                perk3_var2=participant_raw['stats'].get('perk3Var2'),
-                perk3_var3=participant_raw['stats'].get('perk3Var3'),
-                perk4=participant_raw['stats']['perk4'],
-                perk4_var1=participant_raw['stats'].get('perk4Var1'),
-                perk4_var2=participant_raw['stats'].get('perk4Var2'),
-                perk4_var3=participant_raw['stats'].get('perk4Var3'),
-                perk5=participant_raw['stats'].get('perk5'),
-                perk5_var1=participant_raw['stats'].get('perk5Var1'),
-                perk5_var2=participant_raw['stats'].get('perk5Var2'),
-                perk5_var3=participant_raw['stats'].get('perk5Var3'),
-                perk_primary_style=participant_raw['stats'].get('perkPrimaryStyle'),
-                perk_sub_style=participant_raw['stats'].get('perkSubStyle'),
-                stat_perk0=participant_raw['stats'].get('statPerk0'),
-                stat_perk1=participant_raw['stats'].get('statPerk1'),
-                stat_perk2=participant_raw['stats'].get('statPerk2'),
-            )
-            # the following deltas seem optional, therefore the inline if's
-            timeline = match.ParticipantTimelineDto(
-                participant_id=participant_raw['timeline']['participantId'],
-                cs_diff_per_min_deltas=participant_raw['timeline']['csDiffPerMinDeltas'] if 'csDiffPerMinDeltas' in participant_raw['timeline'] else None,
-                damage_taken_per_min_deltas=participant_raw['timeline']['damageTakenPerMinDeltas'] if 'damageTakenPerMinDeltas' in participant_raw['timeline'] else None,
-                role=participant_raw['timeline']['role'],
-                damage_taken_diff_per_min_deltas=participant_raw['timeline']['damageTakenDiffPerMinDeltas'] if 'damageTakenDiffPerMinDeltas' in participant_raw['timeline'] else None,
-                xp_per_min_deltas=participant_raw['timeline']['xpPerMinDeltas'] if 'xpPerMinDeltas' in participant_raw['timeline'] else None,
-                xp_diff_per_min_deltas=participant_raw['timeline']['xpDiffPerMinDeltas'] if 'xpDiffPerMinDeltas' in participant_raw['timeline'] else None,
-                lane=participant_raw['timeline']['lane'],
-                creeps_per_min_deltas=participant_raw['timeline']['creepsPerMinDeltas'] if 'creepsPerMinDeltas' in participant_raw['timeline'] else None,
-                gold_per_min_deltas=participant_raw['timeline']['goldPerMinDeltas'] if 'goldPerMinDeltas' in participant_raw['timeline'] else None,
-            )
-            masteries = []
-            try:
-                for masteries_raw in participant_raw['masteries']:
-                    masteries.append(match.MasteryDto(
-                        rank=masteries_raw['rank'],
-                        master_id=masteries_raw['MasterId'],
-                    ))
-            except KeyError:
-                # List of legacy Mastery information. Not included for matches played with Runes Reforged.
-                pass
-            participants.append(match.ParticipantDto(
-                participant_id=participant_raw['participantId'],
-                champion_id=participant_raw['championId'],
-                runes=runes,
-                stats=stats,
-                team_id=participant_raw['teamId'],
-                timeline=timeline,
-                spell1_id=participant_raw['spell1Id'],
-                spell2_id=participant_raw['spell2Id'],
-                highest_achieved_season_tier=participant_raw.get('highestAchievedSeasonTier'),
-                masteries=masteries,
-            ))
-
-        return match.MatchDto(
-            game_id=match_id,
-            participant_identities=participant_identities,
-            queue_id=res['queueId'],
-            game_type=res['gameType'],
-            game_duration=res['gameDuration'],
-            teams=teams,
-            platform_id=res['platformId'],
-            game_creation=res['gameCreation'],
-            season_id=res['seasonId'],
-            game_version=res['gameVersion'],
-            map_id=res['mapId'],
-            game_mode=res['gameMode'],
-            participants=participants,
         )
+        if self.archive is not None:
+            self.archive.put(archive.MATCH, match_id, res.content)
+        return decode_match(res=jsonlib.loads(res.content), match_id=match_id)
 
     def get_matchlist_by_accountid(
         self,
@@ -434,33 +471,15 @@ class Client:
     ):
         res = self._request(
             method='GET',
+            route='get_matchlist_by_accountid',
             url=self.routes.get_matchlist_by_accountid(account_id=account_id),
             headers={'X-Riot-Token': self.config.token},
             params={
                 'beginIndex': begin_index,
                 'endIndex': end_index,
             },
-        ).json()
-
-        matches = []
-        for match in res['matches']:
-            matches.append(matchlist.MatchReferenceDto(
-                game_id=match['gameId'],
-                role=match['role'],
-                season=match['season'],
-                platform_id=match['platformId'],
-                champion=match['champion'],
-                queue=match['queue'],
-                lane=match['lane'],
-                timestamp=match['timestamp'],
-            ))
-
-        return matchlist.MatchlistDto(
-            start_index=res['startIndex'],
-            total_games=res['totalGames'],
-            end_index=res['endIndex'],
-            matches=matches,
         )
+        return decode_matchlist(res=jsonlib.loads(res.content))
 
     def get_match_timeline_by_matchid(
         self,
@@ -468,74 +487,10 @@ class Client:
     ):
         res = self._request(
             method='GET',
+            route='get_match_timeline_by_matchid',
             url=self.routes.get_match_timeline_by_matchid(match_id=match_id),
             headers={'X-Riot-Token': self.config.token},
-        ).json()
-
-        frames = []
-        for frame in res['frames']:
-            participants_frames = {}
-            for participants_frame_key in frame['participantFrames'].keys():
-                position = None
-                if 'position' in frame['participantFrames'][participants_frame_key]:
-                    position = match_timeline.MatchPositionDto(
-                        x=frame['participantFrames'][participants_frame_key]['position']['x'],
-                        y=frame['participantFrames'][participants_frame_key]['position']['y'],
-                    )
-                participants_frames[participants_frame_key] = match_timeline.MatchParticipantFrameDto(
-                    participant_id=frame['participantFrames'][participants_frame_key].get('participantId'),
-                    minions_killed=frame['participantFrames'][participants_frame_key].get('minionsKilled'),
-                    team_score=frame['participantFrames'][participants_frame_key].get('teamScore'),
-                    dominion_score=frame['participantFrames'][participants_frame_key].get('dominionScore'),
-                    total_gold=frame['participantFrames'][participants_frame_key].get('totalGold'),
-                    level=frame['participantFrames'][participants_frame_key].get('level'),
-                    xp=frame['participantFrames'][participants_frame_key].get('xp'),
-                    current_gold=frame['participantFrames'][participants_frame_key].get('currentGold'),
-                    position=position,
-                    jungle_minions_killed=frame['participantFrames'][participants_frame_key].get('jungleMinionsKilled'),
-                )
-
-            events = []
-            for event in frame['events']:
-                position = None
-                if 'position' in event:
-                    position = match_timeline.MatchPositionDto(
-                        x=event['position']['x'],
-                        y=event['position']['y'],
-                    )
-                events.append(match_timeline.MatchEventDto(
-                    lane_type=event.get('laneType'),
-                    skill_slot=event.get('skillShot'),
-                    ascended_type=event.get('ascendedType'),
-                    creator_id=event.get('creatorId'),
-                    after_id=event.get('afterId'),
-                    event_type=event.get('eventType'),
-                    type=event.get('type'),
-                    level_up_type=event.get('levelUpType'),
-                    ward_type=event.get('wardType'),
-                    participant_id=event.get('participantId'),
-                    tower_type=event.get('towerType'),
-                    item_id=event.get('itemId'),
-                    before_id=event.get('beforeId'),
-                    point_captured=event.get('pointCaptured'),
-                    monster_type=event.get('monsterType'),
-                    monster_sub_type=event.get('monsterSubType'),
-                    team_id=event.get('teamId'),
-                    position=position,
-                    killer_id=event.get('killerId'),
-                    timestamp=event.get('timestamp'),
-                    assisting_participant_ids=event.get('assistingParticipantIds'),
-                    building_type=event.get('buildingType'),
-                    victim_id=event.get('victimId'),
-                ))
-
-            frames.append(match_timeline.MatchFrameDto(
-                participant_frames=participants_frames,
-                events=events,
-                timestamp=frame['timestamp'],
-            ))
-
-        return match_timeline.MatchTimelineDto(
-            frames=frames,
-            frame_interval=res['frameInterval']
         )
+        if self.archive is not None:
+            self.archive.put(archive.TIMELINE, match_id, res.content)
+        return decode_match_timeline(res=jsonlib.loads(res.content))
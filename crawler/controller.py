@@ -1,9 +1,31 @@
+import collections
+import concurrent.futures
+import dataclasses
+import json
+import os
+import socket
+import threading
+import typing
+import uuid
+
 import falcon
 
+import archive
+import batching
+import cache
 import client
+import db
+import dbpool
+import decoding
+import jsonlib
+import metrics
+import pipeline
+import retry
 
 try:
+    import dtos.match
     import dtos.matchlist
+    import dtos.summoner
     import rid_parser
     import database
     import parser
@@ -16,146 +38,953 @@ except ModuleNotFoundError:
 logger = util.Logger(__name__)
 
 
+# ingestion depths, each one includes the ones before it
+DEPTH_MATCH = 'match'  # match and team rows, one api call
+DEPTH_PARTICIPANTS = 'participants'  # + summoners, participants and their stats, up to 10 summoner lookups
+DEPTH_TIMELINE = 'timeline'  # + timeline events and participant frames, one more api call
+DEPTHS = (DEPTH_MATCH, DEPTH_PARTICIPANTS, DEPTH_TIMELINE)
+
+
+def depth_level(
+    depth: str,
+) -> int:
+    if depth not in DEPTHS:
+        raise ValueError(f'unknown depth "{depth}", expected one of {", ".join(DEPTHS)}')
+    return DEPTHS.index(depth)
+
+
+# participant frames are stored one row per participant and minute, or packed into one row per participant
+TIMELINE_FRAMES = 'frames'
+TIMELINE_PACKED = 'packed'
+
+
+def timeline_format() -> str:
+    timeline_format = os.getenv('CRAWLER_TIMELINE_FORMAT', TIMELINE_FRAMES)
+    if timeline_format not in (TIMELINE_FRAMES, TIMELINE_PACKED):
+        raise ValueError(f'unknown timeline format "{timeline_format}", expected {TIMELINE_FRAMES} or {TIMELINE_PACKED}')
+    return timeline_format
+
+
+# fetch threads per stage of a threaded crawl, each crawl starts two stages of them
+DEFAULT_MAX_WORKERS = 8
+
+
+def max_workers() -> int:
+    return int(os.getenv('CRAWLER_MAX_FETCH_WORKERS', DEFAULT_MAX_WORKERS))
+
+
+# stored summoners last fetched from riot longer ago than this are fetched again, riot's revisionDate
+# only moves on name, icon or level changes and says nothing about how current our copy is
+def summoner_max_age() -> float:
+    return float(os.getenv('CRAWLER_SUMMONER_MAX_AGE', 86400))
+
+
+class SummonerNotFound(Exception):
+    pass
+
+
+# riot refusing the key, every other request of the crawl would fail the same way
+AUTH_ERRORS = (401, 403)
+
+
+def skips_match(
+    error: client.RiotAPINotOkayException,
+) -> bool:
+    '''
+    whether a match riot failed to deliver is skipped and the crawl goes on, CircuitOpen is no
+    RiotAPINotOkayException and ends the crawl as well
+    '''
+    return error.status_code not in AUTH_ERRORS
+
+
+def revisit_later(
+    error: client.RiotAPINotOkayException,
+) -> bool:
+    '''
+    whether a skipped match may work on a later crawl (outage, timeouts), unlike e.g. a purged one
+    '''
+    return error.status_code is None or retry.classify(error.status_code) != retry.PERMANENT
+
+
 def crawl_summoner(
     rclient: client.Client,
     summoner_name: str,
+    workers: int = 1,
+    progress=None,
+    full: bool = False,
+    discover=None,
+    checkpoint=None,
+    depth: str = DEPTH_TIMELINE,
 ) -> falcon.http_status:
-    conn = database.get_connection()
+    # discover(match_data) is called for every match written, see spider.Spider
+    with dbpool.connection() as conn:
+        return _crawl_summoner(
+            rclient=rclient,
+            conn=conn,
+            summoner_name=summoner_name,
+            workers=workers,
+            progress=progress,
+            full=full,
+            discover=discover,
+            checkpoint=checkpoint,
+            depth=depth,
+        )
+
+
+def _crawl_summoner(
+    rclient: client.Client,
+    conn,
+    summoner_name: str,
+    workers: int,
+    progress,
+    full: bool,
+    discover,
+    checkpoint,
+    depth: str,
+):
+    # a resumed job continues with the matchlist it paged before, stored matches are skipped below
+    state = checkpoint.load() if checkpoint is not None else None
+    if state is not None:
+        account_id, resumed_refs, begin_index = resume_state(state)
+        logger.info(f'"{summoner_name}" - resuming with {resumed_refs.__len__()} games from the checkpoint')
+    else:
+        # get summoner, fail if not exist
+        summoner = rclient.get_summoner_by_summonername(
+            summoner_name=summoner_name,
+        )
+        if summoner is None:
+            raise SummonerNotFound(f'summoner "{summoner_name}" does not exist')
+        account_id = summoner.account_id
+        resumed_refs, begin_index = [], 0
+
+    # get matchlist, newest first, up to the games seen by the last complete crawl
+    watermark = None if full or begin_index is None else db.select_watermark(
+        conn=conn,
+        account_id=account_id,
+    )
+    # grows page by page while the first matches are already being crawled
+    match_ref_list = list(resumed_refs)
+
+    def pages():
+        if resumed_refs:
+            yield resumed_refs
+        if begin_index is None:
+            return
+        for refs, next_index in stream_matchlist(
+            rclient=rclient,
+            account_id=account_id,
+            watermark=watermark,
+            begin_index=begin_index,
+        ):
+            match_ref_list.extend(refs)
+            if checkpoint is not None:
+                checkpoint.save(checkpoint_state(account_id, match_ref_list, next_index))
+            yield refs
+
+    # for m in matchlist: check if match in db -> insert
+    processed = 0
+    report_lock = threading.Lock()
+
+    def report():
+        nonlocal processed
+        with report_lock:
+            processed += 1
+            if progress is not None:
+                progress(processed, match_ref_list.__len__())
+
+    def todo():
+        # runs on the pipeline's feeder thread, one query per page for the matches already stored
+        g = 0
+        for refs in pages():
+            with dbpool.connection() as page_conn:
+                missing = missing_game_ids(
+                    conn=page_conn,
+                    game_ids=[ref.game_id for ref in refs],
+                )
+            for ref in refs:
+                if ref.game_id in missing:
+                    yield g, ref
+                else:
+                    logger.info(f'"{summoner_name}" - game {g}/{match_ref_list.__len__()}: skip')
+                    metrics.matches_skipped.inc()
+                    report()
+                g += 1
+
+    owner = claim_owner()
+    claimed = set()
+    # games another crawl held the claim of or riot failed to deliver, checked again before the watermark moves
+    unsettled = set()
+
+    def claim(items):
+        # claims are taken as the pipeline pulls matches, so they are fresh while the match is fetched
+        for g, ref in items:
+            with dbpool.connection() as claim_conn:
+                ok = db.claim_match(conn=claim_conn, game_id=ref.game_id, owner=owner)
+            if ok:
+                claimed.add(ref.game_id)
+                yield g, ref
+            else:
+                logger.info(f'"{summoner_name}" - game {g}/{match_ref_list.__len__()}: claimed elsewhere, skip')
+                unsettled.add(ref.game_id)
+                metrics.matches_skipped.inc()
+                report()
+
+    # matches riot failed to deliver, by game id, they pass the remaining stages untouched
+    failed = {}
+
+    def skipping_failed(fetch):
+        def run(item):
+            g, ref, match_data = item
+            if ref.game_id in failed:
+                return item
+            try:
+                return g, ref, fetch(ref, match_data)
+            except client.RiotAPINotOkayException as e:
+                if not skips_match(e):
+                    raise
+                failed[ref.game_id] = e
+                return item
+        return run
+
+    # fetching match n+1 overlaps with writing match n, the queues between the stages keep at most
+    # `workers` matches per stage in memory. writes stay on this thread and connection, the fetch
+    # threads look up summoners on pooled connections of their own.
+    stages = pipeline.Pipeline(capacity=workers)
+    stages.add_stage(
+        name='match',
+        func=skipping_failed(lambda ref, _: fetch_match_data(
+            rclient=rclient,
+            conn=None,
+            game_id=ref.game_id,
+            platform_id=ref.platform_id,
+            depth=depth,
+        )),
+        workers=workers,
+    )
+    stages.add_stage(
+        name='timeline',
+        func=skipping_failed(lambda ref, match_data: fetch_timeline(rclient=rclient, match_data=match_data)),
+        workers=workers,
+    )
+    stages.add_stage(
+        name='parse',
+        func=lambda item: (
+            *item,
+            None if item[1].game_id in failed else prepare_match(conn=conn, match_data=item[2]),
+        ),
+    )
+    # closed right away when the loop raises, e.g. spider.BudgetExhausted, so the fetch threads stop claiming
+    results = stages.run((g, ref, None) for g, ref in claim(todo()))
+    try:
+        for g, ref, match_data, batch in results:
+            error = failed.pop(ref.game_id, None)
+            if error is not None:
+                logger.warn(f'"{summoner_name}" - game {g}/{match_ref_list.__len__()}: {error}, skip')
+                with dbpool.connection() as claim_conn:
+                    db.release_match_claims(conn=claim_conn, game_ids=[ref.game_id], owner=owner)
+                claimed.discard(ref.game_id)
+                if revisit_later(error):
+                    unsettled.add(ref.game_id)
+                report()
+                continue
+            logger.info(f'"{summoner_name}" - game {g}/{match_ref_list.__len__()}')
+            write_match(batch=batch, match_data=match_data, owner=owner)
+            claimed.discard(match_data.match.game_id)
+            if discover is not None:
+                discover(match_data)
+            report()
+    finally:
+        results.close()
+        # hand back what we claimed but did not store, so others need not wait for the claims to time out
+        try:
+            with dbpool.connection() as claim_conn:
+                db.release_match_claims(conn=claim_conn, game_ids=claimed, owner=owner)
+        except Exception as e:
+            logger.warn(f'releasing {len(claimed)} match claims failed, they time out instead: {e}')
+
+    # only a complete crawl may move the watermark, otherwise unprocessed older games would be skipped
+    advance_watermark(
+        conn=conn,
+        account_id=account_id,
+        refs=match_ref_list,
+        unsettled=unsettled,
+    )
+
 
-    # get summoner, fail if not exist
-    summoner = rclient.get_summoner_by_summonername(
-        summoner_name=summoner_name,
+def advance_watermark(
+    conn,
+    account_id: str,
+    refs: list,
+    unsettled: set,
+):
+    '''
+    moves the watermark after a complete crawl of `refs`. games in `unsettled` were left to another
+    crawl, those that are still not stored keep the watermark older than them, so the next crawl
+    of this summoner gets to them again.
+    '''
+    missing = missing_game_ids(conn=conn, game_ids=list(unsettled)) if unsettled else set()
+    ref = watermark_ref(refs, missing)
+    if ref is None:
+        if refs:
+            logger.info(f'watermark of {account_id} kept, its oldest new game is not stored yet')
+        return
+    db.upsert_watermark(
+        conn=conn,
+        account_id=account_id,
+        game_id=ref.game_id,
+        timestamp=ref.timestamp,
     )
 
-    # get matchlist
-    match_ref_list = []
-    i = 0
-    while True:
-        ml_snippet = rclient.get_matchlist_by_accountid(
-            account_id=summoner.account_id,
+
+def watermark_ref(
+    refs: list,
+    missing: set,
+):
+    '''
+    the newest of `refs` (newest first) that is older than every game in `missing`, None if there is none
+    '''
+    oldest_missing = max((i for i, ref in enumerate(refs) if ref.game_id in missing), default=-1)
+    if oldest_missing + 1 >= len(refs):
+        return None
+    return refs[oldest_missing + 1]
+
+
+# the matchlist endpoint returns at most 100 games per request
+MATCHLIST_PAGE = 100
+
+
+def matchlist_page(
+    matches: list,
+    watermark,
+    begin_index: int,
+):
+    '''
+    new references of one matchlist page and where the next page begins, None after the last page
+    '''
+    new_refs = new_match_refs(matches, watermark)
+    if not matches.__len__() == MATCHLIST_PAGE or len(new_refs) < len(matches):
+        return new_refs, None
+    return new_refs, begin_index + MATCHLIST_PAGE
+
+
+def stream_matchlist(
+    rclient: client.Client,
+    account_id: str,
+    watermark,
+    begin_index: int = 0,
+):
+    '''
+    yields (references, next begin index) page by page, newest first. the next page is requested
+    in the background while the caller works through the current one.
+    '''
+    def fetch(i):
+        return rclient.get_matchlist_by_accountid(
+            account_id=account_id,
             begin_index=i,
-            end_index=i+100,
-        )
-        match_ref_list.extend(ml_snippet.matches)
-        i += 100
-        if not ml_snippet.matches.__len__() == 100:
+            end_index=i+MATCHLIST_PAGE,
+        ).matches
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    try:
+        future = executor.submit(fetch, begin_index)
+        while begin_index is not None:
+            refs, next_index = matchlist_page(future.result(), watermark, begin_index)
+            if next_index is not None:
+                future = executor.submit(fetch, next_index)
+            yield refs, next_index
+            begin_index = next_index
+    finally:
+        executor.shutdown(wait=False)
+
+
+# what a checkpoint keeps of a match reference
+MatchRef = collections.namedtuple('MatchRef', ['game_id', 'platform_id', 'timestamp'])
+
+
+def checkpoint_state(
+    account_id: str,
+    refs: list,
+    begin_index: int = None,
+) -> dict:
+    # begin_index is where paging continues, None once the whole matchlist is in refs
+    return {
+        'accountId': account_id,
+        'refs': [[ref.game_id, ref.platform_id, ref.timestamp] for ref in refs],
+        'beginIndex': begin_index,
+    }
+
+
+def resume_state(
+    state: dict,
+):
+    return state['accountId'], [MatchRef(*ref) for ref in state['refs']], state.get('beginIndex')
+
+
+def new_match_refs(
+    refs: list,
+    watermark,
+) -> list:
+    if watermark is None:
+        return refs
+    game_id, timestamp = watermark
+    new_refs = []
+    for ref in refs:
+        if ref.game_id == game_id or ref.timestamp < timestamp:
             break
+        new_refs.append(ref)
+    return new_refs
 
-    # for m in matchlist: check if match in db -> insert
-    g = 0
-    for ref in match_ref_list:
-        if database.select_match_by_gameid(
-            conn=conn,
-            game_id=ref.game_id
-        ):
-            logger.info(f'"{summoner_name}" - game {g}/{match_ref_list.__len__()}: skip')
-            g += 1
-            continue
 
-        logger.info(f'"{summoner_name}" - game {g}/{match_ref_list.__len__()}')
-        match = rclient.get_match_by_matchid(
-            ref.game_id,
-        )
-        database.insert_match(
+def missing_game_ids(
+    conn,
+    game_ids: list,
+) -> set:
+    # one query for the whole matchlist, ids seen by earlier crawls of this worker are not queried again
+    candidates = cache.known_game_ids.unknown(game_ids)
+    existing = db.select_existing_game_ids(
+        conn=conn,
+        game_ids=candidates,
+    )
+    cache.known_game_ids.add(existing)
+    return set(candidates) - existing
+
+
+@dataclasses.dataclass()
+class MatchData:
+    match: dtos.match.MatchDto
+    summoners: typing.List[dtos.summoner.SummonerDto]  # in order of match.participant_identities
+    timeline: typing.Optional[decoding.MatchTimelineDto]
+    depth: str = DEPTH_TIMELINE
+    # account ids of the summoners fetched from riot for this match, their fetch time is stored with it
+    fetched: typing.Set[str] = dataclasses.field(default_factory=set)
+
+
+def known_summoners(
+    conn,
+    account_ids: list,
+    max_age: float = None,
+) -> dict:
+    # memory first, then the summoners we stored within `max_age` seconds, any of them without it.
+    # without `conn` a pooled connection is checked out, connections must not be shared between threads
+    summoners = {}
+    for account_id in account_ids:
+        summoner = cache.summoners.get(account_id)
+        if summoner is not None:
+            summoners[account_id] = summoner
+    missing = [a for a in account_ids if a not in summoners]
+    if not missing:
+        return summoners
+    if conn is None:
+        with dbpool.connection() as lookup_conn:
+            stored = db.select_summoners_by_account_ids(
+                conn=lookup_conn,
+                account_ids=missing,
+                max_age=max_age,
+            )
+    else:
+        stored = db.select_summoners_by_account_ids(
             conn=conn,
-            match=rid_parser.parse_match(match_dto=match)
+            account_ids=missing,
+            max_age=max_age,
         )
-        for team in match.teams:
-            database.insert_team(
-                conn=conn,
-                team=rid_parser.parse_team(
-                    team_dto=team,
-                    game_id=match.game_id
-                )
+    for account_id, summoner in stored.items():
+        cache.summoners.put(summoner)
+        summoners[account_id] = summoner
+    return summoners
+
+
+def archive_summoners(
+    raw_archive: archive.Archive,
+    summoners: list,
+):
+    # participants known from memory or the database were never archived by this key, reingest needs them all
+    if raw_archive is None:
+        return
+    for summoner in summoners:
+        if not raw_archive.has(archive.SUMMONER, summoner.account_id):
+            raw_archive.put(
+                archive.SUMMONER,
+                summoner.account_id,
+                json.dumps(decoding.encode(summoner, decoding.SUMMONER_FIELDS)).encode(),
             )
-        identities = {}  # Key-Value-Store to match participants later on
-        for identity in match.participant_identities:
-            summoner = rclient.get_summoner_by_account_id(
-                identity.player.current_account_id,
+
+
+def fetch_match(
+    rclient: client.Client,
+    conn,
+    game_id: int,
+    platform_id: str = None,
+    depth: str = DEPTH_TIMELINE,
+) -> MatchData:
+    return fetch_timeline(
+        rclient=rclient,
+        match_data=fetch_match_data(
+            rclient=rclient,
+            conn=conn,
+            game_id=game_id,
+            platform_id=platform_id,
+            depth=depth,
+        ),
+    )
+
+
+def fetch_match_data(
+    rclient: client.Client,
+    conn,
+    game_id: int,
+    platform_id: str = None,
+    depth: str = DEPTH_TIMELINE,
+) -> MatchData:
+    # account ids in the match are encrypted for the key that fetched it, look them up with that key
+    mclient = rclient.shard(platform_id=platform_id)
+    match = mclient.get_match_by_matchid(
+        game_id,
+    )
+    if depth_level(depth) < depth_level(DEPTH_PARTICIPANTS):
+        return MatchData(
+            match=match,
+            summoners=[],
+            timeline=None,
+            depth=depth,
+        )
+    account_ids = [identity.player.current_account_id for identity in match.participant_identities]
+    platform_ids = {
+        identity.player.current_account_id: identity.player.current_platform_id
+        for identity in match.participant_identities
+    }
+    summoners = known_summoners(
+        conn=conn,
+        account_ids=account_ids,
+        max_age=summoner_max_age(),
+    )
+    archive_summoners(
+        raw_archive=mclient.archive,
+        summoners=list(summoners.values()),
+    )
+    fetched = {account_id for account_id in account_ids if account_id not in summoners}
+    for account_id in account_ids:
+        if account_id in fetched:
+            summoners[account_id] = rclient.shard(
+                platform_id=platform_ids[account_id],
+                token=mclient.config.token,
+            ).get_summoner_by_account_id(
+                account_id,
             )
-            database.insert_summoner(
-                conn=conn,
-                summoner=rid_parser.parse_summoner(summoner),
+            cache.summoners.put(summoners[account_id])
+    return MatchData(
+        match=match,
+        summoners=[summoners[account_id] for account_id in account_ids],
+        timeline=None,
+        depth=depth,
+        fetched=fetched,
+    )
+
+
+def fetch_timeline(
+    rclient: client.Client,
+    match_data: MatchData,
+) -> MatchData:
+    if depth_level(match_data.depth) < depth_level(DEPTH_TIMELINE):
+        return match_data
+    # timelines carry no encrypted ids, any key will do
+    tclient = rclient.shard(platform_id=match_data.match.platform_id)
+    match_data.timeline = tclient.get_match_timeline_by_matchid(
+        match_id=str(match_data.match.game_id),
+    )
+    return match_data
+
+
+def prepare_match(
+    conn,
+    match_data: MatchData,
+) -> batching.BatchConnection:
+    # rows of the whole match are collected and written with one multi-row insert per table
+    batch = batching.BatchConnection(conn=conn)
+    _insert_match(conn=batch, match_data=match_data)
+    return batch
+
+
+def claim_owner() -> str:
+    # identifies one crawl across processes and nodes
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+def write_match(
+    batch: batching.BatchConnection,
+    match_data: MatchData,
+    owner: str = None,
+):
+    if owner is not None:
+        # dropped in the same transaction that stores the match
+        db.release_match_claims(conn=batch, game_ids=[match_data.match.game_id], owner=owner)
+    batch.flush()
+    cache.known_game_ids.add([match_data.match.game_id])
+    metrics.matches_ingested.inc()
+
+
+def store_match(
+    conn,
+    match_data: MatchData,
+    owner: str = None,
+):
+    write_match(
+        batch=prepare_match(conn=conn, match_data=match_data),
+        match_data=match_data,
+        owner=owner,
+    )
+
+
+def _insert_match(
+    conn,
+    match_data: MatchData,
+):
+    match = match_data.match
+    database.insert_match(
+        conn=conn,
+        match=rid_parser.parse_match(match_dto=match)
+    )
+    for team in match.teams:
+        database.insert_team(
+            conn=conn,
+            team=rid_parser.parse_team(
+                team_dto=team,
+                game_id=match.game_id
             )
+        )
+    level = depth_level(match_data.depth)
+    if level >= depth_level(DEPTH_PARTICIPANTS):
+        participants = _insert_participants(conn=conn, match_data=match_data)
+        if level >= depth_level(DEPTH_TIMELINE):
+            _insert_timeline(conn=conn, match_data=match_data, participants=participants)
+    if level < depth_level(DEPTH_TIMELINE):
+        # matches without a depth row are complete
+        db.upsert_match_depth(conn=conn, game_id=match.game_id, level=level)
 
-            database.insert_summoner_match(
-                conn=conn,
-                summoner_match=model.SummonerMatch(
-                    game_id=match.game_id,
-                    account_id=summoner.account_id,
-                )
+
+def _insert_participants(
+    conn,
+    match_data: MatchData,
+) -> dict:
+    match = match_data.match
+    identities = {}  # Key-Value-Store to match participants later on
+    for identity, summoner in zip(match.participant_identities, match_data.summoners):
+        database.insert_summoner(
+            conn=conn,
+            summoner=rid_parser.parse_summoner(summoner),
+        )
+        if summoner.account_id in match_data.fetched:
+            db.upsert_summoner_fetched(conn=conn, account_id=summoner.account_id)
+
+        database.insert_summoner_match(
+            conn=conn,
+            summoner_match=model.SummonerMatch(
+                game_id=match.game_id,
+                account_id=summoner.account_id,
             )
-            identities[identity.participant_id] = identity.player.current_account_id
+        )
+        identities[identity.participant_id] = identity.player.current_account_id
 
-        participants = {}
-        for participant_dto in match.participants:
+    participants = {}
+    for participant_dto in match.participants:
 
-            part_identity = identities.get(participant_dto.participant_id)
+        part_identity = identities.get(participant_dto.participant_id)
 
-            timeline = rid_parser.parse_timeline(timeline_dto=participant_dto.timeline)
-            database.insert_timeline(
+        timeline = rid_parser.parse_timeline(timeline_dto=participant_dto.timeline)
+        database.insert_timeline(
+            conn=conn,
+            timeline=timeline,
+        )
+
+        stat = rid_parser.parse_stats(
+            stat=participant_dto.stats,
+        )
+        database.insert_stat(
+            conn=conn,
+            stat=stat,
+        )
+
+        participant = rid_parser.parse_participant(
+            participant_dto=participant_dto,
+            game_id=match.game_id,
+            account_id=part_identity,
+            stat_id=stat.stat_id,
+            team_id=participant_dto.team_id,
+            timeline_id=timeline.timeline_id,
+            role=participant_dto.timeline.role,
+            lane=participant_dto.timeline.lane,
+        )
+        database.insert_participant(
+            conn=conn,
+            participant=participant,
+        )
+        participants[participant_dto.participant_id] = participant.participant_id  # map id to uuid
+    return participants
+
+
+def _insert_timeline(
+    conn,
+    match_data: MatchData,
+    participants: dict,
+):
+    # participants maps riot's participant id (1-10) to the participant_id of the stored row
+    packed = timeline_format() == TIMELINE_PACKED
+    for frame_dto in match_data.timeline.frames:
+        for event_dto in frame_dto.events:
+            event = rid_parser.parse_event(
+                event_dto=event_dto,
+                map=participants,
+            )
+            database.insert_event(
                 conn=conn,
-                timeline=timeline,
+                event=event,
             )
 
-            stat = rid_parser.parse_stats(
-                stat=participant_dto.stats,
+        if packed:
+            continue
+        for participant_frame_dto in frame_dto.participant_frames.values():
+            participant_frame = rid_parser.parse_participant_frame(
+                participant_frame_dto=participant_frame_dto,
+                participant_id=participants[participant_frame_dto.participant_id],
+                timestamp=frame_dto.timestamp,
             )
-            database.insert_stat(
+            database.insert_participant_frame(
                 conn=conn,
-                stat=stat,
+                participant_frame=participant_frame,
             )
 
-            participant = rid_parser.parse_participant(
-                participant_dto=participant_dto,
-                game_id=match.game_id,
-                account_id=part_identity,
-                stat_id=stat.stat_id,
-                team_id=participant_dto.team_id,
-                timeline_id=timeline.timeline_id,
-                role=participant_dto.timeline.role,
-                lane=participant_dto.timeline.lane,
-            )
-            database.insert_participant(
+    if packed:
+        for participant_id, series in pack_participant_frames(match_data.timeline, participants).items():
+            db.insert_participant_timeline(
                 conn=conn,
-                participant=participant,
+                game_id=match_data.match.game_id,
+                participant_id=participant_id,
+                series=series,
             )
-            participants[participant_dto.participant_id] = participant.participant_id  # map id to uuid
 
-        timeline = rclient.get_match_timeline_by_matchid(
-            match_id=str(match.game_id),
+
+def pack_participant_frames(
+    timeline,
+    participants: dict,
+) -> dict:
+    '''
+    {participant_id: {column: [value per frame]}} for db.insert_participant_timeline
+    '''
+    packed = {
+        participant_id: {column: [] for column in db.PARTICIPANT_TIMELINE_SERIES}
+        for participant_id in participants.values()
+    }
+    for frame_dto in timeline.frames:
+        for participant_frame_dto in frame_dto.participant_frames.values():
+            series = packed[participants[participant_frame_dto.participant_id]]
+            # frames without a position (e.g. the last one of some matches) store nulls
+            position = participant_frame_dto.position
+            series['timestamp'].append(frame_dto.timestamp)
+            series['total_gold'].append(participant_frame_dto.total_gold)
+            series['current_gold'].append(participant_frame_dto.current_gold)
+            series['xp'].append(participant_frame_dto.xp)
+            series['level'].append(participant_frame_dto.level)
+            series['minions_killed'].append(participant_frame_dto.minions_killed)
+            series['jungle_minions_killed'].append(participant_frame_dto.jungle_minions_killed)
+            series['position_x'].append(position.x if position is not None else None)
+            series['position_y'].append(position.y if position is not None else None)
+    return packed
+
+
+def reingest_archive(
+    raw_archive: archive.Archive,
+    game_ids: list = None,
+):
+    '''
+    rebuilds the rows of archived matches without calling riot, e.g. after rid_parser or schema changes.
+    matches already in the database are skipped, clear them first to rebuild them.
+    '''
+    with dbpool.connection() as conn:
+        return _reingest_archive(
+            conn=conn,
+            raw_archive=raw_archive,
+            game_ids=game_ids,
         )
-        for frame_dto in timeline.frames:
-            for event_dto in frame_dto.events:
-                event = rid_parser.parse_event(
-                    event_dto=event_dto,
-                    map=participants,
-                )
-                database.insert_event(
-                    conn=conn,
-                    event=event,
-                )
 
-            for participant_frame_dto in frame_dto.participant_frames.values():
-                participant_frame = rid_parser.parse_participant_frame(
-                    participant_frame_dto=participant_frame_dto,
-                    participant_id=participants[participant_frame_dto.participant_id],
-                    timestamp=frame_dto.timestamp,
-                )
-                database.insert_participant_frame(
-                    conn=conn,
-                    participant_frame=participant_frame,
-                )
-        g += 1
 
+def _reingest_archive(
+    conn,
+    raw_archive: archive.Archive,
+    game_ids: list,
+):
+    if game_ids is None:
+        game_ids = [int(key) for key in raw_archive.keys(archive.MATCH)]
+    missing = missing_game_ids(
+        conn=conn,
+        game_ids=game_ids,
+    )
+    owner = claim_owner()
+    stored = 0
+    for g, game_id in enumerate(game_ids):
+        if game_id not in missing:
+            continue
+        if not db.claim_match(conn=conn, game_id=game_id, owner=owner):
+            # a crawl is fetching it right now
+            continue
+        # a broken archive file or a row the database refuses only skips that game
+        try:
+            match_data = load_archived_match(
+                conn=conn,
+                raw_archive=raw_archive,
+                game_id=game_id,
+            )
+            if match_data is None:
+                continue
+            logger.info(f'reingest - game {g}/{game_ids.__len__()}')
+            store_match(
+                conn=conn,
+                match_data=match_data,
+                owner=owner,
+            )
+            stored += 1
+        except Exception as e:
+            logger.warn(f'reingest - game {g}/{game_ids.__len__()}: {e}, skip')
+        finally:
+            db.release_match_claims(conn=conn, game_ids=[game_id], owner=owner)
+    logger.info(f'reingested {stored} of {game_ids.__len__()} archived games')
+    return stored
 
-def summoner_exists(
-    summoner_name: str,
+
+def load_archived_match(
+    conn,
+    raw_archive: archive.Archive,
+    game_id: int,
 ):
-    conn = database.get_connection()
+    raw_match = raw_archive.get(archive.MATCH, game_id)
+    raw_timeline = raw_archive.get(archive.TIMELINE, game_id)
+    if raw_match is None or raw_timeline is None:
+        logger.warn(f'game {game_id} is not completely archived, skipping')
+        return None
 
-    summoner = database.select_summoner(
+    match = client.decode_match(res=jsonlib.loads(raw_match), match_id=game_id)
+    account_ids = [identity.player.current_account_id for identity in match.participant_identities]
+    summoners = known_summoners(
         conn=conn,
-        summoner_name=summoner_name,
+        account_ids=account_ids,
+        max_age=None,
     )
+    for account_id in account_ids:
+        if account_id in summoners:
+            continue
+        raw_summoner = raw_archive.get(archive.SUMMONER, account_id)
+        if raw_summoner is None:
+            logger.warn(f'summoner {account_id} of game {game_id} is not archived, skipping')
+            return None
+        summoners[account_id] = client.decode_summoner(res=jsonlib.loads(raw_summoner))
+
+    return MatchData(
+        match=match,
+        summoners=[summoners[account_id] for account_id in account_ids],
+        timeline=client.decode_match_timeline(res=jsonlib.loads(raw_timeline)),
+    )
+
+
+def upgrade_matches(
+    rclient: client.Client,
+    game_ids: list,
+    depth: str = DEPTH_TIMELINE,
+) -> int:
+    '''
+    fills in the data a shallower crawl left out, up to `depth`, e.g. the timelines of some matches
+    crawled with depth "match". games that are not stored yet are crawled at `depth`.
+    '''
+    target = depth_level(depth)
+    with dbpool.connection() as conn:
+        depths = db.select_match_depths(
+            conn=conn,
+            game_ids=game_ids,
+        )
+        owner = claim_owner()
+        upgraded = 0
+        for g, game_id in enumerate(game_ids):
+            # one game failing does not end the pass, only riot being down does
+            try:
+                if game_id not in depths:
+                    if not db.claim_match(conn=conn, game_id=game_id, owner=owner):
+                        continue
+                    try:
+                        logger.info(f'upgrade - game {g}/{game_ids.__len__()}: not stored, crawling')
+                        store_match(
+                            conn=conn,
+                            match_data=fetch_match(rclient=rclient, conn=conn, game_id=game_id, depth=depth),
+                            owner=owner,
+                        )
+                    finally:
+                        db.release_match_claims(conn=conn, game_ids=[game_id], owner=owner)
+                else:
+                    level = depths[game_id]
+                    if level is None or level >= target:
+                        continue
+                    logger.info(f'upgrade - game {g}/{game_ids.__len__()}: {DEPTHS[level]} -> {depth}')
+                    _upgrade_match(
+                        rclient=rclient,
+                        conn=conn,
+                        game_id=game_id,
+                        level=level,
+                        target=target,
+                    )
+            except retry.CircuitOpen:
+                raise
+            except Exception as e:
+                logger.warn(f'upgrade - game {g}/{game_ids.__len__()}: {e}, skip')
+                continue
+            upgraded += 1
+    logger.info(f'upgraded {upgraded} of {game_ids.__len__()} games to {depth}')
+    return upgraded
+
+
+def _upgrade_match(
+    rclient: client.Client,
+    conn,
+    game_id: int,
+    level: int,
+    target: int,
+):
+    has_participants = level >= depth_level(DEPTH_PARTICIPANTS)
+    # summoners are only looked up if the participants are missing
+    match_data = fetch_match_data(
+        rclient=rclient,
+        conn=conn,
+        game_id=game_id,
+        depth=DEPTH_MATCH if has_participants else DEPTHS[target],
+    )
+    match_data.depth = DEPTHS[target]
+    fetch_timeline(
+        rclient=rclient,
+        match_data=match_data,
+    )
+
+    batch = batching.BatchConnection(conn=conn)
+    if has_participants:
+        stored = db.select_participant_ids(
+            conn=conn,
+            game_id=game_id,
+        )
+        participants = {
+            identity.participant_id: stored.get(identity.player.current_account_id)
+            for identity in match_data.match.participant_identities
+        }
+    else:
+        participants = _insert_participants(conn=batch, match_data=match_data)
+    if target >= depth_level(DEPTH_TIMELINE):
+        _insert_timeline(conn=batch, match_data=match_data, participants=participants)
+        # like a match crawled at full depth, a complete match has no depth row
+        db.delete_match_depth(conn=batch, game_id=game_id)
+    else:
+        db.upsert_match_depth(conn=batch, game_id=game_id, level=target)
+    batch.flush()
+
+
+def summoner_exists(
+    summoner_name: str,
+):
+    with dbpool.connection() as conn:
+        summoner = database.select_summoner(
+            conn=conn,
+            summoner_name=summoner_name,
+        )
     return summoner
@@ -0,0 +1,325 @@
+import collections
+
+try:
+    from dtos import summoner
+    import util
+except ModuleNotFoundError:
+    print('common package not in python path')
+
+
+# crawler specific queries, the shared ones live in the common package's database module
+logger = util.Logger(__name__)
+
+CREATE_TABLES = '''
+CREATE TABLE IF NOT EXISTS summoner_watermark (
+    account_id TEXT PRIMARY KEY,
+    game_id BIGINT NOT NULL,
+    timestamp BIGINT NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT now()
+);
+CREATE TABLE IF NOT EXISTS match_depth (
+    game_id BIGINT PRIMARY KEY,
+    level SMALLINT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS participant_timeline (
+    game_id BIGINT NOT NULL,
+    participant_id TEXT NOT NULL,
+    timestamp INTEGER[] NOT NULL,
+    total_gold INTEGER[] NOT NULL,
+    current_gold INTEGER[] NOT NULL,
+    xp INTEGER[] NOT NULL,
+    level SMALLINT[] NOT NULL,
+    minions_killed SMALLINT[] NOT NULL,
+    jungle_minions_killed SMALLINT[] NOT NULL,
+    position_x SMALLINT[] NOT NULL,
+    position_y SMALLINT[] NOT NULL,
+    PRIMARY KEY (game_id, participant_id)
+);
+CREATE TABLE IF NOT EXISTS summoner_fetched (
+    account_id TEXT PRIMARY KEY,
+    fetched_at TIMESTAMP NOT NULL DEFAULT now()
+);
+CREATE TABLE IF NOT EXISTS match_claim (
+    game_id BIGINT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    claimed_at TIMESTAMP NOT NULL DEFAULT now()
+);
+'''
+
+# claims of crawlers that died are taken over after this long
+CLAIM_TIMEOUT = '10 minutes'
+
+# columns of participant_timeline holding one value per frame, in frame order
+PARTICIPANT_TIMELINE_SERIES = (
+    'timestamp',
+    'total_gold',
+    'current_gold',
+    'xp',
+    'level',
+    'minions_killed',
+    'jungle_minions_killed',
+    'position_x',
+    'position_y',
+)
+
+# one frame of a packed participant timeline
+TimelinePoint = collections.namedtuple('TimelinePoint', PARTICIPANT_TIMELINE_SERIES)
+
+
+def create_tables(
+    conn,
+):
+    cur = conn.cursor()
+    cur.execute(CREATE_TABLES)
+    conn.commit()
+    cur.close()
+
+
+def select_existing_game_ids(
+    conn,
+    game_ids: list,
+) -> set:
+    if not game_ids:
+        return set()
+    cur = conn.cursor()
+    cur.execute(
+        'SELECT game_id FROM match WHERE game_id = ANY(%s)',
+        (list(game_ids),),
+    )
+    existing = {row[0] for row in cur.fetchall()}
+    conn.commit()
+    cur.close()
+    return existing
+
+
+def select_summoners_by_account_ids(
+    conn,
+    account_ids: list,
+    max_age: float = None,
+) -> dict:
+    '''
+    stored summoners, with `max_age` only those fetched from riot within as many seconds
+    '''
+    if not account_ids:
+        return {}
+    cur = conn.cursor()
+    if max_age is None:
+        cur.execute(
+            'SELECT account_id, id, puuid, name, profile_icon_id, revision_date, summoner_level '
+            'FROM summoner WHERE account_id = ANY(%s)',
+            (list(account_ids),),
+        )
+    else:
+        cur.execute(
+            'SELECT s.account_id, s.id, s.puuid, s.name, s.profile_icon_id, s.revision_date, s.summoner_level '
+            'FROM summoner s JOIN summoner_fetched f ON f.account_id = s.account_id '
+            'WHERE s.account_id = ANY(%s) AND f.fetched_at > now() - %s * interval \'1 second\'',
+            (list(account_ids), max_age),
+        )
+    summoners = {}
+    for row in cur.fetchall():
+        summoners[row[0]] = summoner.SummonerDto(
+            account_id=row[0],
+            id=row[1],
+            puuid=row[2],
+            name=row[3],
+            profile_icon_id=row[4],
+            revision_date=row[5],
+            summoner_level=row[6],
+        )
+    conn.commit()
+    cur.close()
+    return summoners
+
+
+def upsert_summoner_fetched(
+    conn,
+    account_id: str,
+):
+    cur = conn.cursor()
+    cur.execute(
+        'INSERT INTO summoner_fetched (account_id) VALUES (%s) '
+        'ON CONFLICT (account_id) DO UPDATE SET fetched_at = EXCLUDED.fetched_at',
+        (account_id,),
+    )
+    conn.commit()
+    cur.close()
+
+
+def select_watermark(
+    conn,
+    account_id: str,
+):
+    cur = conn.cursor()
+    cur.execute(
+        'SELECT game_id, timestamp FROM summoner_watermark WHERE account_id = %s',
+        (account_id,),
+    )
+    row = cur.fetchone()
+    conn.commit()
+    cur.close()
+    return row
+
+
+def upsert_watermark(
+    conn,
+    account_id: str,
+    game_id: int,
+    timestamp: int,
+):
+    cur = conn.cursor()
+    cur.execute(
+        'INSERT INTO summoner_watermark (account_id, game_id, timestamp) VALUES (%s, %s, %s) '
+        'ON CONFLICT (account_id) DO UPDATE SET game_id = EXCLUDED.game_id, timestamp = EXCLUDED.timestamp, '
+        'updated_at = now() WHERE summoner_watermark.timestamp <= EXCLUDED.timestamp',
+        (account_id, game_id, timestamp),
+    )
+    conn.commit()
+    cur.close()
+
+
+def claim_match(
+    conn,
+    game_id: int,
+    owner: str,
+) -> bool:
+    '''
+    true if `owner` may fetch the match: it is not stored yet and no other crawler,
+    in this or any other process, is working on it
+    '''
+    cur = conn.cursor()
+    cur.execute(
+        'INSERT INTO match_claim (game_id, owner) '
+        'SELECT %s, %s WHERE NOT EXISTS (SELECT 1 FROM match WHERE game_id = %s) '
+        'ON CONFLICT (game_id) DO UPDATE SET owner = EXCLUDED.owner, claimed_at = now() '
+        f'WHERE match_claim.claimed_at < now() - interval \'{CLAIM_TIMEOUT}\' '
+        'RETURNING game_id',
+        (game_id, owner, game_id),
+    )
+    claimed = cur.fetchone() is not None
+    conn.commit()
+    cur.close()
+    return claimed
+
+
+def release_match_claims(
+    conn,
+    game_ids: list,
+    owner: str,
+):
+    if not game_ids:
+        return
+    cur = conn.cursor()
+    cur.execute(
+        'DELETE FROM match_claim WHERE game_id = ANY(%s) AND owner = %s',
+        (list(game_ids), owner),
+    )
+    conn.commit()
+    cur.close()
+
+
+def delete_match_depth(
+    conn,
+    game_id: int,
+):
+    cur = conn.cursor()
+    cur.execute(
+        'DELETE FROM match_depth WHERE game_id = %s',
+        (game_id,),
+    )
+    conn.commit()
+    cur.close()
+
+
+def upsert_match_depth(
+    conn,
+    game_id: int,
+    level: int,
+):
+    cur = conn.cursor()
+    cur.execute(
+        'INSERT INTO match_depth (game_id, level) VALUES (%s, %s) '
+        'ON CONFLICT (game_id) DO UPDATE SET level = EXCLUDED.level',
+        (game_id, level),
+    )
+    conn.commit()
+    cur.close()
+
+
+def select_match_depths(
+    conn,
+    game_ids: list,
+) -> dict:
+    '''
+    {game_id: level} of the stored matches among `game_ids`, level is None for complete matches
+    '''
+    if not game_ids:
+        return {}
+    cur = conn.cursor()
+    cur.execute(
+        'SELECT m.game_id, d.level FROM match m LEFT JOIN match_depth d ON d.game_id = m.game_id '
+        'WHERE m.game_id = ANY(%s)',
+        (list(game_ids),),
+    )
+    depths = {row[0]: row[1] for row in cur.fetchall()}
+    conn.commit()
+    cur.close()
+    return depths
+
+
+def select_participant_ids(
+    conn,
+    game_id: int,
+) -> dict:
+    '''
+    {account_id: participant_id} of the stored participants of a match
+    '''
+    cur = conn.cursor()
+    cur.execute(
+        'SELECT account_id, participant_id FROM participant WHERE game_id = %s',
+        (game_id,),
+    )
+    participant_ids = {row[0]: row[1] for row in cur.fetchall()}
+    conn.commit()
+    cur.close()
+    return participant_ids
+
+
+def insert_participant_timeline(
+    conn,
+    game_id: int,
+    participant_id: str,
+    series: dict,
+):
+    '''
+    stores the frames of one participant as one row, `series` maps every PARTICIPANT_TIMELINE_SERIES column to a list
+    '''
+    cur = conn.cursor()
+    cur.execute(
+        'INSERT INTO participant_timeline (game_id, participant_id, '
+        + ', '.join(PARTICIPANT_TIMELINE_SERIES)
+        + ') VALUES (%s, %s' + ', %s' * len(PARTICIPANT_TIMELINE_SERIES) + ') '
+        'ON CONFLICT (game_id, participant_id) DO NOTHING',
+        (game_id, str(participant_id), *(series[column] for column in PARTICIPANT_TIMELINE_SERIES)),
+    )
+    conn.commit()
+    cur.close()
+
+
+def select_participant_timelines(
+    conn,
+    game_id: int,
+) -> dict:
+    '''
+    {participant_id: [TimelinePoint, ...]} of a match stored with the packed timeline format
+    '''
+    cur = conn.cursor()
+    cur.execute(
+        'SELECT participant_id, ' + ', '.join(PARTICIPANT_TIMELINE_SERIES)
+        + ' FROM participant_timeline WHERE game_id = %s',
+        (game_id,),
+    )
+    timelines = {row[0]: [TimelinePoint(*point) for point in zip(*row[1:])] for row in cur.fetchall()}
+    conn.commit()
+    cur.close()
+    return timelines
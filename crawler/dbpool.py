@@ -0,0 +1,163 @@
+import contextlib
+import os
+import threading
+import time
+
+import metrics
+
+try:
+    import database
+    import util
+except ModuleNotFoundError:
+    print('common package not in python path')
+
+
+logger = util.Logger(__name__)
+
+# per gunicorn worker, enough for CRAWLER_WORKERS crawls plus the api handlers
+DEFAULT_SIZE = 10
+# seconds a checkout waits for a free connection before giving up
+DEFAULT_TIMEOUT = 30.0
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class Pool:
+    '''
+    bounded, thread-safe set of connections opened through database.get_connection.
+    connections are opened on demand up to `size` and reused most recently returned first,
+    so idle ones beyond what the load needs stay unused instead of being cycled.
+    '''
+
+    def __init__(
+        self,
+        size: int,
+        timeout: float = DEFAULT_TIMEOUT,
+    ):
+        self.size = size
+        self.timeout = timeout
+        self._idle = []
+        self._opened = 0
+        self._cond = threading.Condition()
+
+    @property
+    def in_use(self) -> int:
+        with self._cond:
+            return self._opened - len(self._idle)
+
+    @property
+    def idle(self) -> int:
+        with self._cond:
+            return len(self._idle)
+
+    def getconn(
+        self,
+        timeout: float = None,
+    ):
+        timeout = self.timeout if timeout is None else timeout
+        start = time.perf_counter()
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self._idle and self._opened >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(f'no database connection free after {timeout}s ({self.size} in use)')
+                self._cond.wait(remaining)
+            if self._idle:
+                conn = self._idle.pop()
+            else:
+                # reserve the slot, the connection itself is opened outside the lock
+                self._opened += 1
+                conn = None
+        if conn is None:
+            try:
+                conn = database.get_connection()
+            except Exception:
+                self._release_slot()
+                raise
+        metrics.db_pool_wait_seconds.observe(time.perf_counter() - start)
+        return conn
+
+    def putconn(
+        self,
+        conn,
+        broken: bool = False,
+    ):
+        if not broken and not getattr(conn, 'closed', 0):
+            try:
+                # never hand out a connection in the middle of someone else's transaction
+                conn.rollback()
+            except Exception:
+                broken = True
+        else:
+            broken = True
+        if broken:
+            try:
+                database.kill_connection(conn)
+            except Exception:
+                pass
+            self._release_slot()
+            return
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def _release_slot(self):
+        with self._cond:
+            self._opened -= 1
+            self._cond.notify()
+
+    @contextlib.contextmanager
+    def connection(
+        self,
+        timeout: float = None,
+    ):
+        conn = self.getconn(timeout=timeout)
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def close(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._opened -= len(idle)
+        for conn in idle:
+            database.kill_connection(conn)
+
+
+def pool_size() -> int:
+    return int(os.getenv('CRAWLER_DB_POOL_SIZE', DEFAULT_SIZE))
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> Pool:
+    '''
+    one pool per process, connections must not be shared with forked gunicorn workers
+    '''
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = Pool(size=pool_size())
+            _pool_pid = os.getpid()
+            logger.info(f'database pool of {_pool.size} connections')
+        return _pool
+
+
+def connection(
+    timeout: float = None,
+):
+    return get_pool().connection(timeout=timeout)
+
+
+@metrics.on_refresh
+def refresh_metrics():
+    pool = get_pool()
+    metrics.db_pool_in_use.set(pool.in_use)
+    metrics.db_pool_idle.set(pool.idle)
@@ -0,0 +1,428 @@
+import collections
+
+try:
+    from dtos import match
+    from dtos import matchlist
+    from dtos import summoner
+except ModuleNotFoundError:
+    print('common package not in python path')
+
+
+# one entry per scalar dto attribute: (dto attribute, riot json key, key always present)
+# nested objects and lists are decoded by the callers and passed in as extra keyword arguments
+Field = collections.namedtuple('Field', ['name', 'key', 'required'])
+
+SUMMONER_FIELDS = (
+    Field('account_id', 'accountId', True),
+    Field('id', 'id', True),
+    Field('puuid', 'puuid', True),
+    Field('name', 'name', True),
+    Field('profile_icon_id', 'profileIconId', True),
+    Field('revision_date', 'revisionDate', True),
+    Field('summoner_level', 'summonerLevel', True),
+)
+
+MATCH_REFERENCE_FIELDS = (
+    Field('game_id', 'gameId', True),
+    Field('role', 'role', True),
+    Field('season', 'season', True),
+    Field('platform_id', 'platformId', True),
+    Field('champion', 'champion', True),
+    Field('queue', 'queue', True),
+    Field('lane', 'lane', True),
+    Field('timestamp', 'timestamp', True),
+)
+
+MATCHLIST_FIELDS = (
+    Field('start_index', 'startIndex', True),
+    Field('total_games', 'totalGames', True),
+    Field('end_index', 'endIndex', True),
+)
+
+MATCH_FIELDS = (
+    Field('queue_id', 'queueId', True),
+    Field('game_type', 'gameType', True),
+    Field('game_duration', 'gameDuration', True),
+    Field('platform_id', 'platformId', True),
+    Field('game_creation', 'gameCreation', True),
+    Field('season_id', 'seasonId', True),
+    Field('game_version', 'gameVersion', True),
+    Field('map_id', 'mapId', True),
+    Field('game_mode', 'gameMode', True),
+)
+
+PLAYER_FIELDS = (
+    Field('profile_icon', 'profileIcon', True),
+    Field('account_id', 'accountId', True),
+    Field('match_history_uri', 'matchHistoryUri', True),
+    Field('current_account_id', 'currentAccountId', True),
+    Field('current_platform_id', 'currentPlatformId', True),
+    Field('summoner_name', 'summonerName', True),
+    Field('summoner_id', 'summonerId', True),
+    Field('platform_id', 'platformId', True),
+)
+
+PARTICIPANT_IDENTITY_FIELDS = (
+    Field('participant_id', 'participantId', True),
+)
+
+TEAM_BANS_FIELDS = (
+    Field('champion_id', 'championId', True),
+    Field('pick_turn', 'pickTurn', True),
+)
+
+TEAM_STATS_FIELDS = (
+    Field('tower_kills', 'towerKills', True),
+    Field('rift_herald_kills', 'riftHeraldKills', True),
+    Field('first_blood', 'firstBlood', True),
+    Field('inhibitor_kills', 'inhibitorKills', True),
+    Field('first_baron', 'firstBaron', True),
+    Field('first_dragon', 'firstDragon', True),
+    Field('dominion_victory_score', 'dominionVictoryScore', True),
+    Field('dragon_kills', 'dragonKills', True),
+    Field('baron_kills', 'baronKills', True),
+    Field('first_inhibitor', 'firstInhibitor', True),
+    Field('first_tower', 'firstTower', True),
+    Field('vilemaw_kills', 'vilemawKills', True),
+    Field('first_rift_herald', 'firstRiftHerald', True),
+    Field('team_id', 'teamId', True),
+    Field('win', 'win', True),
+)
+
+RUNE_FIELDS = (
+    Field('rune_id', 'runeId', True),
+    Field('rank', 'rank', True),
+)
+
+MASTERY_FIELDS = (
+    Field('rank', 'rank', True),
+    Field('master_id', 'MasterId', True),
+)
+
+PARTICIPANT_STATS_FIELDS = (
+    Field('item0', 'item0', False),
+    Field('item2', 'item2', False),
+    Field('total_units_healed', 'totalUnitsHealed', False),
+    Field('item1', 'item1', False),
+    Field('largest_multi_kill', 'largestMultiKill', False),
+    Field('gold_earned', 'goldEarned', False),
+    Field('first_inhibitor_kill', 'firstInhibitorKill', False),
+    Field('physical_damage_taken', 'physicalDamageTaken', False),
+    Field('node_neutralize_assist', 'nodeNeutralizeAssist', False),
+    Field('total_player_score', 'totalPlayerScore', False),
+    Field('champ_level', 'champLevel', False),
+    Field('damage_dealt_to_objectives', 'damageDealtToObjectives', False),
+    Field('total_damage_taken', 'totalDamageTaken', False),
+    Field('neutral_minions_killed', 'neutralMinionsKilled', False),
+    Field('deaths', 'deaths', False),
+    Field('triple_kills', 'tripleKills', False),
+    Field('magic_damage_dealt_to_champions', 'magicDamageDealtToChampions', False),
+    Field('wards_killed', 'wardsKilled', False),
+    Field('penta_kills', 'pentaKills', False),
+    Field('damage_self_mitigated', 'damageSelfMitigated', False),
+    Field('largest_critical_strike', 'largestCriticalStrike', False),
+    Field('node_neutralize', 'nodeNeutralize', False),
+    Field('total_time_crowd_control_dealt', 'totalTimeCrowdControlDealt', False),
+    Field('first_tower_kill', 'firstTowerKill', False),
+    Field('magic_damage_dealt', 'magicDamageDealt', False),
+    Field('total_score_rank', 'totalScoreRank', False),
+    Field('node_capture', 'nodeCapture', False),
+    Field('wards_placed', 'wardsPlaced', False),
+    Field('total_damage_dealt', 'totalDamageDealt', False),
+    Field('time_ccing_others', 'timeCCingOthers', False),
+    Field('magical_damage_taken', 'magicalDamageTaken', False),
+    Field('largest_killing_spree', 'largestKillingSpree', False),
+    Field('total_damage_dealt_to_champions', 'totalDamageDealtToChampions', False),
+    Field('physical_damage_dealt_to_champions', 'physicalDamageDealtToChampions', False),
+    Field('neutral_minions_killed_team_jungle', 'neutralMinionsKilledTeamJungle', False),
+    Field('total_minions_killed', 'totalMinionsKilled', False),
+    Field('first_inhibitor_assist', 'firstInhibitorAssist', False),
+    Field('vision_wards_bought_in_game', 'visionWardsBoughtInGame', False),
+    Field('objective_player_score', 'objectivePlayerScore', False),
+    Field('kills', 'kills', False),
+    Field('first_tower_assist', 'firstTowerAssist', False),
+    Field('combat_player_score', 'combatPlayerScore', False),
+    Field('inhibitor_kills', 'inhibitorKills', False),
+    Field('turret_kills', 'turretKills', False),
+    Field('participant_id', 'participantId', False),
+    Field('true_damage_taken', 'trueDamageTaken', False),
+    Field('first_blood_assist', 'firstBloodAssist', False),
+    Field('node_capture_assist', 'nodeCaptureAssist', False),
+    Field('assists', 'assists', False),
+    Field('team_objective', 'teamObjective', False),
+    Field('altars_neutralized', 'altarsNeutralized', False),
+    Field('gold_spent', 'goldSpent', False),
+    Field('damage_dealt_to_turrets', 'damageDealtToTurrets', False),
+    Field('altars_captured', 'altarsCaptured', False),
+    Field('win', 'win', False),
+    Field('total_heal', 'totalHeal', False),
+    Field('unreal_kills', 'unrealKills', False),
+    Field('vision_score', 'visionScore', False),
+    Field('physical_damage_dealt', 'physicalDamageDealt', False),
+    Field('first_blood_kill', 'firstBloodKill', False),
+    Field('longest_time_spent_living', 'longestTimeSpentLiving', False),
+    Field('killing_sprees', 'killingSprees', False),
+    Field('sight_wards_bought_in_game', 'sightWardsBoughtInGame', False),
+    Field('true_damage_dealt_to_champions', 'trueDamageDealtToChampions', False),
+    Field('neutral_minions_killed_enemy_jungle', 'neutralMinionsKilledEnemyJungle', False),
+    Field('double_kills', 'doubleKills', False),
+    Field('true_damage_dealt', 'trueDamageDealt', False),
+    Field('quadra_kills', 'quadraKills', False),
+    Field('item4', 'item4', False),
+    Field('item3', 'item3', False),
+    Field('item6', 'item6', False),
+    Field('item5', 'item5', False),
+    Field('player_score0', 'playerScore0', False),
+    Field('player_score1', 'playerScore1', False),
+    Field('player_score2', 'playerScore2', False),
+    Field('player_score3', 'playerScore3', False),
+    Field('player_score4', 'playerScore4', False),
+    Field('player_score5', 'playerScore5', False),
+    Field('player_score6', 'playerScore6', False),
+    Field('player_score7', 'playerScore7', False),
+    Field('player_score8', 'playerScore8', False),
+    Field('player_score9', 'playerScore9', False),
+    Field('perk0', 'perk0', False),
+    Field('perk0_var1', 'perk0Var1', False),
+    Field('perk0_var2', 'perk0Var2', False),
+    Field('perk0_var3', 'perk0Var3', False),
+    Field('perk1', 'perk1', False),
+    Field('perk1_var1', 'perk1Var1', False),
+    Field('perk1_var2', 'perk1Var2', False),
+    Field('perk1_var3', 'perk1Var3', False),
+    Field('perk2', 'perk2', False),
+    Field('perk2_var1', 'perk2Var1', False),
+    Field('perk2_var2', 'perk2Var2', False),
+    Field('perk2_var3', 'perk2Var3', False),
+    Field('perk3', 'perk3', False),
+    Field('perk3_var1', 'perk3Var1', False),
+    Field('perk3_var2', 'perk3Var2', False),
+    Field('perk3_var3', 'perk3Var3', False),
+    Field('perk4', 'perk4', True),
+    Field('perk4_var1', 'perk4Var1', False),
+    Field('perk4_var2', 'perk4Var2', False),
+    Field('perk4_var3', 'perk4Var3', False),
+    Field('perk5', 'perk5', False),
+    Field('perk5_var1', 'perk5Var1', False),
+    Field('perk5_var2', 'perk5Var2', False),
+    Field('perk5_var3', 'perk5Var3', False),
+    Field('perk_primary_style', 'perkPrimaryStyle', False),
+    Field('perk_sub_style', 'perkSubStyle', False),
+    Field('stat_perk0', 'statPerk0', False),
+    Field('stat_perk1', 'statPerk1', False),
+    Field('stat_perk2', 'statPerk2', False),
+)
+
+# the deltas seem optional
+PARTICIPANT_TIMELINE_FIELDS = (
+    Field('participant_id', 'participantId', True),
+    Field('cs_diff_per_min_deltas', 'csDiffPerMinDeltas', False),
+    Field('damage_taken_per_min_deltas', 'damageTakenPerMinDeltas', False),
+    Field('role', 'role', True),
+    Field('damage_taken_diff_per_min_deltas', 'damageTakenDiffPerMinDeltas', False),
+    Field('xp_per_min_deltas', 'xpPerMinDeltas', False),
+    Field('xp_diff_per_min_deltas', 'xpDiffPerMinDeltas', False),
+    Field('lane', 'lane', True),
+    Field('creeps_per_min_deltas', 'creepsPerMinDeltas', False),
+    Field('gold_per_min_deltas', 'goldPerMinDeltas', False),
+)
+
+PARTICIPANT_FIELDS = (
+    Field('participant_id', 'participantId', True),
+    Field('champion_id', 'championId', True),
+    Field('team_id', 'teamId', True),
+    Field('spell1_id', 'spell1Id', True),
+    Field('spell2_id', 'spell2Id', True),
+    Field('highest_achieved_season_tier', 'highestAchievedSeasonTier', False),
+)
+
+POSITION_FIELDS = (
+    Field('x', 'x', True),
+    Field('y', 'y', True),
+)
+
+PARTICIPANT_FRAME_FIELDS = (
+    Field('participant_id', 'participantId', False),
+    Field('minions_killed', 'minionsKilled', False),
+    Field('team_score', 'teamScore', False),
+    Field('dominion_score', 'dominionScore', False),
+    Field('total_gold', 'totalGold', False),
+    Field('level', 'level', False),
+    Field('xp', 'xp', False),
+    Field('current_gold', 'currentGold', False),
+    Field('jungle_minions_killed', 'jungleMinionsKilled', False),
+)
+
+EVENT_FIELDS = (
+    Field('lane_type', 'laneType', False),
+    Field('skill_slot', 'skillSlot', False),
+    Field('ascended_type', 'ascendedType', False),
+    Field('creator_id', 'creatorId', False),
+    Field('after_id', 'afterId', False),
+    Field('event_type', 'eventType', False),
+    Field('type', 'type', False),
+    Field('level_up_type', 'levelUpType', False),
+    Field('ward_type', 'wardType', False),
+    Field('participant_id', 'participantId', False),
+    Field('tower_type', 'towerType', False),
+    Field('item_id', 'itemId', False),
+    Field('before_id', 'beforeId', False),
+    Field('point_captured', 'pointCaptured', False),
+    Field('monster_type', 'monsterType', False),
+    Field('monster_sub_type', 'monsterSubType', False),
+    Field('team_id', 'teamId', False),
+    Field('killer_id', 'killerId', False),
+    Field('timestamp', 'timestamp', False),
+    Field('assisting_participant_ids', 'assistingParticipantIds', False),
+    Field('building_type', 'buildingType', False),
+    Field('victim_id', 'victimId', False),
+)
+
+FRAME_FIELDS = (
+    Field('timestamp', 'timestamp', True),
+)
+
+MATCH_TIMELINE_FIELDS = (
+    Field('frame_interval', 'frameInterval', True),
+)
+
+
+def compile_decoder(
+    dto,
+    fields: tuple,
+):
+    '''
+    generates `decode(raw, **nested) -> dto` with one plain lookup per field,
+    so decoding does not walk the field table for every object
+    '''
+    args = ''.join(
+        f'        {f.name}=raw[{f.key!r}],\n' if f.required else f'        {f.name}=get({f.key!r}),\n'
+        for f in fields
+    )
+    source = (
+        'def decode(raw, **nested):\n'
+        '    get = raw.get\n'
+        '    return dto(\n'
+        f'{args}'
+        '        **nested,\n'
+        '    )\n'
+    )
+    namespace = {'dto': dto}
+    exec(compile(source, f'<decoder {dto.__name__}>', 'exec'), namespace)
+    return namespace['decode']
+
+
+def encode(
+    obj,
+    fields: tuple,
+) -> dict:
+    '''
+    the riot json of a dto with scalar `fields` only, e.g. of a summoner loaded from the database
+    '''
+    return {f.key: getattr(obj, f.name) for f in fields}
+
+
+decode_summoner = compile_decoder(summoner.SummonerDto, SUMMONER_FIELDS)
+decode_match_reference = compile_decoder(matchlist.MatchReferenceDto, MATCH_REFERENCE_FIELDS)
+decode_matchlist = compile_decoder(matchlist.MatchlistDto, MATCHLIST_FIELDS)
+decode_match = compile_decoder(match.MatchDto, MATCH_FIELDS)
+decode_player = compile_decoder(match.PlayerDto, PLAYER_FIELDS)
+decode_participant_identity = compile_decoder(match.ParticipantIdentityDto, PARTICIPANT_IDENTITY_FIELDS)
+decode_team_bans = compile_decoder(match.TeamBansDto, TEAM_BANS_FIELDS)
+decode_team_stats = compile_decoder(match.TeamStatsDto, TEAM_STATS_FIELDS)
+decode_rune = compile_decoder(match.RuneDto, RUNE_FIELDS)
+decode_mastery = compile_decoder(match.MasteryDto, MASTERY_FIELDS)
+decode_participant_stats = compile_decoder(match.ParticipantStatsDto, PARTICIPANT_STATS_FIELDS)
+decode_participant_timeline = compile_decoder(match.ParticipantTimelineDto, PARTICIPANT_TIMELINE_FIELDS)
+decode_participant = compile_decoder(match.ParticipantDto, PARTICIPANT_FIELDS)
+
+
+def slotted_dto(
+    name: str,
+    fields: tuple,
+    nested: tuple = (),
+):
+    '''
+    generates a class with the attributes of a dto but without a per-instance __dict__,
+    it can be used wherever the dto is only read through its attributes (e.g. rid_parser)
+    '''
+    attributes = tuple(f.name for f in fields) + nested
+    source = (
+        f'def __init__(self, *, {", ".join(a + "=None" for a in attributes)}):\n'
+        + ''.join(f'    self.{a} = {a}\n' for a in attributes)
+        + 'def __repr__(self):\n'
+        + f'    return "{name}(" + ", ".join(f"{{a}}={{getattr(self, a)!r}}" for a in self.__slots__) + ")"\n'
+    )
+    namespace = {}
+    exec(compile(source, f'<slotted {name}>', 'exec'), namespace)
+    return type(name, (), {
+        '__slots__': attributes,
+        '__init__': namespace['__init__'],
+        '__repr__': namespace['__repr__'],
+    })
+
+
+def compile_sparse_decoder(
+    name: str,
+    fields: tuple,
+    nested: tuple = (),
+):
+    '''
+    like compile_decoder, but every combination of keys present in the payload gets its own
+    slotted class holding only those attributes, all others read as None from the shared base class.
+    meant for objects with many optional fields of which only a few are set (timeline events).
+    '''
+    attributes = {f.key: f.name for f in fields}
+    attributes.update({n: n for n in nested})
+    base = type(name, (), {
+        '__slots__': (),
+        **{a: None for a in attributes.values()},
+        '__repr__': lambda self: f'{name}(' + ', '.join(
+            f'{a}={getattr(self, a)!r}' for a in attributes.values()
+        ) + ')',
+    })
+    constructors = {}
+
+    def constructor(
+        keys: tuple,
+    ):
+        present = [k for k in keys if k in attributes]
+        cls = type(name, (base,), {'__slots__': tuple(attributes[k] for k in present)})
+        source = (
+            'def construct(raw, nested):\n'
+            '    obj = new(cls)\n'
+            + ''.join(
+                f'    obj.{attributes[k]} = nested[{k!r}]\n' if k in nested else f'    obj.{attributes[k]} = raw[{k!r}]\n'
+                for k in present
+            )
+            + '    return obj\n'
+        )
+        namespace = {'cls': cls, 'new': object.__new__}
+        exec(compile(source, f'<sparse decoder {name}>', 'exec'), namespace)
+        return namespace['construct']
+
+    def decode(raw, **nested):
+        keys = tuple(raw)
+        construct = constructors.get(keys)
+        if construct is None:
+            construct = constructors[keys] = constructor(keys)
+        return construct(raw, nested)
+
+    decode.base = base
+    return decode
+
+
+# a timeline holds ~10 participant frames and ~30 events per minute, all alive until the match is written.
+# slotted instances need a fraction of the memory of the common dataclasses, events only store the
+# handful of fields their type actually has.
+MatchPositionDto = slotted_dto('MatchPositionDto', POSITION_FIELDS)
+MatchParticipantFrameDto = slotted_dto('MatchParticipantFrameDto', PARTICIPANT_FRAME_FIELDS, ('position',))
+MatchFrameDto = slotted_dto('MatchFrameDto', FRAME_FIELDS, ('participant_frames', 'events'))
+MatchTimelineDto = slotted_dto('MatchTimelineDto', MATCH_TIMELINE_FIELDS, ('frames',))
+
+decode_position = compile_decoder(MatchPositionDto, POSITION_FIELDS)
+decode_participant_frame = compile_decoder(MatchParticipantFrameDto, PARTICIPANT_FRAME_FIELDS)
+decode_event = compile_sparse_decoder('MatchEventDto', EVENT_FIELDS, ('position',))
+MatchEventDto = decode_event.base
+decode_frame = compile_decoder(MatchFrameDto, FRAME_FIELDS)
+decode_match_timeline = compile_decoder(MatchTimelineDto, MATCH_TIMELINE_FIELDS)
@@ -0,0 +1,19 @@
+import os
+import shutil
+import tempfile
+
+from prometheus_client import multiprocess
+
+# set in the master before the workers are forked, they all write their metrics below it
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'crawler-metrics'))
+
+
+def on_starting(server):
+    # files of a previous run would be added to this one's totals
+    directory = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+
+
+def child_exit(server, worker):
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,480 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import controller
+import dbpool
+import shard
+
+try:
+    import util
+except ModuleNotFoundError:
+    print('common package not in python path')
+
+
+logger = util.Logger(__name__)
+
+# a running job belongs to the worker holding its lease, the worker renews it every HEARTBEAT_INTERVAL
+# seconds. jobs whose lease ran out (recycled worker, crashed node) are requeued.
+LEASE = '2 minutes'
+HEARTBEAT_INTERVAL = 30
+# jobs claimed before leases existed
+STALE_AFTER = '15 minutes'
+POLL_INTERVAL = 5
+PROGRESS_EVERY = 10
+# a failed crawl is queued again up to MAX_ATTEMPTS runs in total, waiting RETRY_AFTER, then twice as long each time
+MAX_ATTEMPTS = 3
+RETRY_AFTER = '1 minute'
+
+CREATE_TABLE = '''
+CREATE TABLE IF NOT EXISTS crawl_job (
+    job_id SERIAL PRIMARY KEY,
+    summoner_name TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    token_hash TEXT NOT NULL,
+    options JSONB NOT NULL DEFAULT '{}',
+    status TEXT NOT NULL DEFAULT 'queued',
+    progress INTEGER NOT NULL DEFAULT 0,
+    total INTEGER,
+    error TEXT,
+    checkpoint JSONB,
+    owner TEXT,
+    lease_until TIMESTAMP,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    run_after TIMESTAMP,
+    created_at TIMESTAMP NOT NULL DEFAULT now(),
+    updated_at TIMESTAMP NOT NULL DEFAULT now()
+);
+CREATE UNIQUE INDEX IF NOT EXISTS crawl_job_active_idx
+    ON crawl_job (lower(summoner_name), endpoint)
+    WHERE status IN ('queued', 'running');
+'''
+
+
+def create_table(
+    conn,
+):
+    cur = conn.cursor()
+    cur.execute(CREATE_TABLE)
+    conn.commit()
+    cur.close()
+
+
+def worker_tokens() -> list:
+    # keys every worker is configured with, see shard.ShardedClient
+    return shard.parse_tokens(os.getenv('CRAWLER_RIOT_TOKENS'))
+
+
+def token_hash(
+    token: str,
+) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def resolve_token(
+    hashed: str,
+) -> str:
+    '''
+    the api key of a job, jobs only store the hash of a key configured on the workers
+    '''
+    for configured in worker_tokens():
+        if token_hash(configured) == hashed:
+            return configured
+    return None
+
+
+class TokenNotConfigured(Exception):
+
+    def __init__(self):
+        super().__init__('the api key is not configured on the crawler (CRAWLER_RIOT_TOKENS)')
+
+
+class JobConflict(Exception):
+
+    def __init__(
+        self,
+        job_id: int,
+    ):
+        super().__init__(f'job {job_id} already crawls this summoner with other options')
+        self.job_id = job_id
+
+
+def enqueue(
+    conn,
+    summoner_name: str,
+    endpoint: str,
+    token: str,
+    options: dict,
+) -> int:
+    '''
+    queues a crawl and returns its job id, a queued or running crawl of the same summoner with the same options
+    is reused and one with other options raises JobConflict.
+    jobs only reference their key by its hash, keys not configured on the workers raise TokenNotConfigured.
+    '''
+    if token not in worker_tokens():
+        raise TokenNotConfigured()
+    cur = conn.cursor()
+    cur.execute(
+        'INSERT INTO crawl_job (summoner_name, endpoint, token_hash, options) VALUES (%s, %s, %s, %s) '
+        'ON CONFLICT DO NOTHING RETURNING job_id',
+        (summoner_name, endpoint, token_hash(token), json.dumps(options)),
+    )
+    row = cur.fetchone()
+    if row is not None:
+        conn.commit()
+        cur.close()
+        return row[0]
+    cur.execute(
+        'SELECT job_id, options FROM crawl_job WHERE lower(summoner_name) = lower(%s) AND endpoint = %s '
+        'AND status IN (\'queued\', \'running\')',
+        (summoner_name, endpoint),
+    )
+    row = cur.fetchone()
+    conn.commit()
+    cur.close()
+    if row is None:
+        # the other crawl finished in between
+        return enqueue(conn=conn, summoner_name=summoner_name, endpoint=endpoint, token=token, options=options)
+    if row[1] != options:
+        raise JobConflict(job_id=row[0])
+    return row[0]
+
+
+def select_job(
+    conn,
+    job_id: int,
+):
+    cur = conn.cursor()
+    cur.execute(
+        'SELECT job_id, summoner_name, status, progress, total, error, created_at, updated_at, attempts '
+        'FROM crawl_job WHERE job_id = %s',
+        (job_id,),
+    )
+    row = cur.fetchone()
+    conn.commit()
+    cur.close()
+    if row is None:
+        return None
+    return {
+        'jobId': row[0],
+        'summonerName': row[1],
+        'status': row[2],
+        'progress': row[3],
+        'total': row[4],
+        'error': row[5],
+        'createdAt': row[6].isoformat(),
+        'updatedAt': row[7].isoformat(),
+        'attempts': row[8],
+    }
+
+
+def count_jobs(
+    conn,
+    status: str,
+) -> int:
+    cur = conn.cursor()
+    cur.execute('SELECT count(*) FROM crawl_job WHERE status = %s', (status,))
+    count = cur.fetchone()[0]
+    conn.commit()
+    cur.close()
+    return count
+
+
+def claim(
+    conn,
+    owner: str,
+):
+    # SKIP LOCKED lets every worker thread of every process poll the same table
+    cur = conn.cursor()
+    cur.execute(
+        'UPDATE crawl_job SET status = \'running\', owner = %s, attempts = attempts + 1, '
+        f'lease_until = now() + interval \'{LEASE}\', updated_at = now() WHERE job_id = ('
+        '  SELECT job_id FROM crawl_job'
+        '  WHERE (status = \'queued\' AND (run_after IS NULL OR run_after <= now()))'
+        '    OR (status = \'running\' AND lease_until < now())'
+        f'    OR (status = \'running\' AND lease_until IS NULL AND updated_at < now() - interval \'{STALE_AFTER}\')'
+        '  ORDER BY created_at FOR UPDATE SKIP LOCKED LIMIT 1'
+        ') RETURNING job_id, summoner_name, endpoint, token_hash, options',
+        (owner,),
+    )
+    row = cur.fetchone()
+    conn.commit()
+    cur.close()
+    return row
+
+
+def renew_leases(
+    conn,
+    job_ids: list,
+    owner: str,
+) -> set:
+    '''
+    extends the leases of `job_ids` and returns those `owner` still holds
+    '''
+    if not job_ids:
+        return set()
+    cur = conn.cursor()
+    cur.execute(
+        f'UPDATE crawl_job SET lease_until = now() + interval \'{LEASE}\' '
+        'WHERE job_id = ANY(%s) AND owner = %s AND status = \'running\' RETURNING job_id',
+        (list(job_ids), owner),
+    )
+    held = {row[0] for row in cur.fetchall()}
+    conn.commit()
+    cur.close()
+    return held
+
+
+def update_progress(
+    conn,
+    job_id: int,
+    owner: str,
+    progress: int,
+    total: int,
+) -> bool:
+    # all updates of a running job are conditional on holding it, false once another worker took it over
+    cur = conn.cursor()
+    cur.execute(
+        'UPDATE crawl_job SET progress = %s, total = %s, updated_at = now() '
+        'WHERE job_id = %s AND owner = %s AND status = \'running\'',
+        (progress, total, job_id, owner),
+    )
+    held = cur.rowcount == 1
+    conn.commit()
+    cur.close()
+    return held
+
+
+def finish(
+    conn,
+    job_id: int,
+    owner: str,
+    error: str = None,
+) -> bool:
+    cur = conn.cursor()
+    cur.execute(
+        'UPDATE crawl_job SET status = %s, error = %s, lease_until = NULL, updated_at = now() '
+        'WHERE job_id = %s AND owner = %s AND status = \'running\'',
+        ('failed' if error else 'done', error, job_id, owner),
+    )
+    held = cur.rowcount == 1
+    conn.commit()
+    cur.close()
+    return held
+
+
+def select_checkpoint(
+    conn,
+    job_id: int,
+):
+    cur = conn.cursor()
+    cur.execute('SELECT checkpoint FROM crawl_job WHERE job_id = %s', (job_id,))
+    row = cur.fetchone()
+    conn.commit()
+    cur.close()
+    if row is None or row[0] is None:
+        return None
+    # psycopg2 decodes jsonb, other drivers may hand out the text
+    return row[0] if isinstance(row[0], dict) else json.loads(row[0])
+
+
+def save_checkpoint(
+    conn,
+    job_id: int,
+    owner: str,
+    state: dict,
+) -> bool:
+    cur = conn.cursor()
+    cur.execute(
+        'UPDATE crawl_job SET checkpoint = %s, updated_at = now() '
+        'WHERE job_id = %s AND owner = %s AND status = \'running\'',
+        (json.dumps(state), job_id, owner),
+    )
+    held = cur.rowcount == 1
+    conn.commit()
+    cur.close()
+    return held
+
+
+def retry_later(
+    conn,
+    job_id: int,
+    owner: str,
+    error: str,
+) -> bool:
+    '''
+    queues a failed job again, it resumes from its checkpoint. false once it used up its attempts
+    '''
+    cur = conn.cursor()
+    cur.execute(
+        'UPDATE crawl_job SET status = \'queued\', error = %s, owner = NULL, lease_until = NULL, '
+        f'run_after = now() + interval \'{RETRY_AFTER}\' * power(2, attempts - 1), updated_at = now() '
+        'WHERE job_id = %s AND owner = %s AND status = \'running\' AND attempts < %s',
+        (error, job_id, owner, MAX_ATTEMPTS),
+    )
+    queued = cur.rowcount == 1
+    conn.commit()
+    cur.close()
+    return queued
+
+
+class JobLost(Exception):
+    pass
+
+
+class Checkpoint:
+    '''
+    durable state of one job's crawl, a job picked up again after its worker died resumes from it
+    '''
+
+    def __init__(
+        self,
+        job_id: int,
+        owner: str,
+    ):
+        self.job_id = job_id
+        self.owner = owner
+
+    def load(self):
+        with dbpool.connection() as conn:
+            return select_checkpoint(conn=conn, job_id=self.job_id)
+
+    def save(
+        self,
+        state: dict,
+    ):
+        with dbpool.connection() as conn:
+            held = save_checkpoint(conn=conn, job_id=self.job_id, owner=self.owner, state=state)
+        if not held:
+            raise JobLost(f'job {self.job_id} was taken over by another worker')
+
+
+class WorkerPool:
+    '''
+    fixed number of threads per process working off the crawl_job table
+    '''
+
+    def __init__(
+        self,
+        size: int,
+        run,
+        retryable=lambda error: True,
+    ):
+        # run(summoner_name, endpoint, token, options, progress, checkpoint) executes a single crawl,
+        # crawls failing with an error retryable(error) is false for are not queued again
+        self.size = size
+        self.run = run
+        self.retryable = retryable
+        self.active = 0
+        # identifies this pool's leases across processes and nodes
+        self.owner = controller.claim_owner()
+        self._running = set()
+        self._lost = set()
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        for n in range(self.size):
+            t = threading.Thread(
+                target=self._work,
+                name=f'crawl-worker-{n}',
+                daemon=True,
+            )
+            t.start()
+            self._threads.append(t)
+        t = threading.Thread(
+            target=self._heartbeat,
+            name='crawl-heartbeat',
+            daemon=True,
+        )
+        t.start()
+        self._threads.append(t)
+        logger.info(f'started {self.size} crawl workers')
+
+    def _heartbeat(self):
+        while True:
+            with self._lock:
+                running = set(self._running)
+            try:
+                with dbpool.connection() as conn:
+                    held = renew_leases(conn=conn, job_ids=running, owner=self.owner)
+                lost = running - held
+                if lost:
+                    logger.warn(f'jobs {sorted(lost)} were taken over by another worker, stopping them')
+                    with self._lock:
+                        self._lost |= lost
+            except Exception as e:
+                # the lease lasts a few heartbeats, the next one tries again
+                logger.warn(f'renewing job leases failed: {e}')
+            time.sleep(HEARTBEAT_INTERVAL)
+
+    def notify(self):
+        self._wakeup.set()
+
+    def _work(self):
+        # connections are only checked out for the bookkeeping queries, the crawl takes its own
+        while True:
+            try:
+                with dbpool.connection() as conn:
+                    job = claim(conn=conn, owner=self.owner)
+            except Exception as e:
+                logger.warn(f'claiming crawl job failed: {e}')
+                job = None
+            if job is None:
+                self._wakeup.wait(POLL_INTERVAL)
+                self._wakeup.clear()
+                continue
+
+            job_id, summoner_name, endpoint, hashed, options = job
+            token = resolve_token(hashed)
+            logger.info(f'job {job_id}: crawling "{summoner_name}"')
+
+            def progress(g, total):
+                # a crawl whose job was taken over stops at its next match
+                if job_id in self._lost:
+                    raise JobLost(f'job {job_id} was taken over by another worker')
+                if g % PROGRESS_EVERY == 0 or g == total:
+                    with dbpool.connection() as conn:
+                        held = update_progress(conn=conn, job_id=job_id, owner=self.owner, progress=g, total=total)
+                    if not held:
+                        raise JobLost(f'job {job_id} was taken over by another worker')
+
+            with self._lock:
+                self.active += 1
+                self._running.add(job_id)
+            try:
+                if token is None:
+                    raise ValueError('the api key of this job is not configured on this worker (CRAWLER_RIOT_TOKENS)')
+                self.run(
+                    summoner_name=summoner_name,
+                    endpoint=endpoint,
+                    token=token,
+                    options=options,
+                    progress=progress,
+                    checkpoint=Checkpoint(job_id=job_id, owner=self.owner),
+                )
+                error, retry = None, False
+            except Exception as e:
+                logger.warn(f'job {job_id}: crawl of "{summoner_name}" failed: {e}')
+                error, retry = str(e), token is not None and self.retryable(e)
+            finally:
+                with self._lock:
+                    self.active -= 1
+                    self._running.discard(job_id)
+                    self._lost.discard(job_id)
+            try:
+                with dbpool.connection() as conn:
+                    if retry and retry_later(conn=conn, job_id=job_id, owner=self.owner, error=error):
+                        logger.info(f'job {job_id}: queued again, resuming from its checkpoint')
+                    elif not finish(conn=conn, job_id=job_id, owner=self.owner, error=error):
+                        logger.warn(f'job {job_id}: taken over by another worker, not finished here')
+            except Exception as e:
+                # the job is picked up again once its lease runs out
+                logger.warn(f'job {job_id}: could not be finished: {e}')
+
+
+def pool_size() -> int:
+    return int(os.getenv('CRAWLER_WORKERS', 2))
@@ -0,0 +1,39 @@
+import json
+import os
+
+try:
+    import util
+except ModuleNotFoundError:
+    print('common package not in python path')
+
+
+logger = util.Logger(__name__)
+
+
+def _stdlib_loads(
+    data: bytes,
+):
+    # json.loads detects the encoding of bytes itself, no need to decode to str first
+    return json.loads(data)
+
+
+def _load_backends() -> dict:
+    backends = {'json': _stdlib_loads}
+    try:
+        import orjson
+        backends['orjson'] = orjson.loads
+    except ModuleNotFoundError:
+        pass
+    return backends
+
+
+BACKENDS = _load_backends()
+
+# picked once per process, CRAWLER_JSON_BACKEND forces a specific one
+BACKEND = os.getenv('CRAWLER_JSON_BACKEND') or ('orjson' if 'orjson' in BACKENDS else 'json')
+if BACKEND not in BACKENDS:
+    logger.warn(f'json backend "{BACKEND}" is not available, falling back to json')
+    BACKEND = 'json'
+
+loads = BACKENDS[BACKEND]
+logger.info(f'decoding riot responses with {BACKEND}')
@@ -0,0 +1,193 @@
+import os
+import threading
+import time
+
+import prometheus_client
+from prometheus_client import multiprocess
+
+CONTENT_TYPE = prometheus_client.CONTENT_TYPE_LATEST
+
+# seconds between two updates of the gauges read from callbacks, see on_refresh
+REFRESH_INTERVAL = 10.0
+
+
+def multiprocess_dir() -> str:
+    '''
+    directory every gunicorn worker writes its metrics to, None when only this process is reported
+    '''
+    return os.getenv('PROMETHEUS_MULTIPROC_DIR')
+
+
+def render() -> bytes:
+    '''
+    prometheus text exposition format, summed over all gunicorn workers when they share a multiprocess
+    directory, whichever of them answers the scrape
+    '''
+    if multiprocess_dir():
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return prometheus_client.generate_latest(registry)
+
+
+_refreshers = []
+_refresh_thread = None
+_refresh_lock = threading.Lock()
+
+
+def on_refresh(
+    func,
+):
+    '''
+    registers a callback that sets gauges which are read from somewhere else (pools, the job queue),
+    a worker's gauges only reach the other workers when they are set
+    '''
+    _refreshers.append(func)
+    return func
+
+
+def refresh():
+    for func in list(_refreshers):
+        try:
+            func()
+        except Exception:
+            # a failing callback (e.g. database down) must not keep the other gauges from updating
+            pass
+
+
+def start_refresh(
+    interval: float = REFRESH_INTERVAL,
+):
+    global _refresh_thread
+    with _refresh_lock:
+        if _refresh_thread is not None:
+            return
+        _refresh_thread = threading.Thread(
+            target=_refresh_loop,
+            args=(interval,),
+            name='metrics-refresh',
+            daemon=True,
+        )
+        _refresh_thread.start()
+
+
+def _refresh_loop(
+    interval: float,
+):
+    while True:
+        refresh()
+        time.sleep(interval)
+
+
+def set_labelled(
+    gauge: prometheus_client.Gauge,
+    values: dict,
+    previous: set = frozenset(),
+) -> set:
+    '''
+    sets a labelled gauge from {label values: value}. label values reported by the previous call that
+    are gone now are set to 0, a worker's value stays in the shared files until the worker exits
+    '''
+    for key in previous - set(values):
+        gauge.labels(*key).set(0)
+    for key, value in values.items():
+        gauge.labels(*key).set(value)
+    return set(values)
+
+
+riot_request_seconds = prometheus_client.Histogram(
+    'crawler_riot_request_seconds',
+    'latency of riot api requests, excluding time spent waiting on the rate limiter',
+    labelnames=('route',),
+)
+riot_responses = prometheus_client.Counter(
+    'crawler_riot_responses_total',
+    'riot api responses by status code',
+    labelnames=('route', 'status'),
+)
+riot_rate_limited = prometheus_client.Counter(
+    'crawler_riot_rate_limited_total',
+    '429 responses by X-Rate-Limit-Type',
+    labelnames=('route', 'type'),
+)
+riot_retries = prometheus_client.Counter(
+    'crawler_riot_retries_total',
+    'riot api requests sent again after a non-ok response',
+    labelnames=('route',),
+)
+riot_failures = prometheus_client.Counter(
+    'crawler_riot_failures_total',
+    'riot api requests given up on, by reason (permanent, retries, rate_limited, circuit_open)',
+    labelnames=('route', 'reason'),
+)
+riot_circuit_opened = prometheus_client.Counter(
+    'crawler_riot_circuit_opened_total',
+    'times requests to an endpoint were paused after repeated failures',
+    labelnames=('endpoint',),
+)
+rate_limit_wait_seconds = prometheus_client.Counter(
+    'crawler_rate_limit_wait_seconds_total',
+    'time spent waiting for a free slot in the rate limiter',
+    labelnames=('route',),
+)
+rate_limit_utilisation = prometheus_client.Gauge(
+    'crawler_rate_limit_utilisation',
+    'share of a rate limit window in use, by key, endpoint, limit (app or route) and window seconds',
+    labelnames=('key', 'endpoint', 'limit', 'window'),
+    # windows are synced with riot's counts, so every worker sees about the same share
+    multiprocess_mode='livemax',
+)
+db_insert_seconds = prometheus_client.Histogram(
+    'crawler_db_insert_seconds',
+    'latency of (multi-row) inserts by table',
+    labelnames=('table',),
+)
+db_pool_wait_seconds = prometheus_client.Histogram(
+    'crawler_db_pool_wait_seconds',
+    'time to check a connection out of the pool, including opening new ones',
+)
+db_pool_in_use = prometheus_client.Gauge(
+    'crawler_db_pool_in_use',
+    'database connections checked out of the workers\' pools',
+    multiprocess_mode='livesum',
+)
+db_pool_idle = prometheus_client.Gauge(
+    'crawler_db_pool_idle',
+    'open database connections waiting in the workers\' pools',
+    multiprocess_mode='livesum',
+)
+matches_ingested = prometheus_client.Counter(
+    'crawler_matches_ingested_total',
+    'matches written to the database',
+)
+matches_skipped = prometheus_client.Counter(
+    'crawler_matches_skipped_total',
+    'matchlist entries skipped because the match is already stored',
+)
+active_crawls = prometheus_client.Gauge(
+    'crawler_active_crawls',
+    'crawls running in the workers',
+    multiprocess_mode='livesum',
+)
+queue_depth = prometheus_client.Gauge(
+    'crawler_queue_depth',
+    'crawl jobs waiting for a worker, across all workers',
+    # every worker reads the same number from the database
+    multiprocess_mode='livemax',
+)
+
+
+def observe_riot_response(
+    route: str,
+    status: int,
+    seconds: float,
+    waited: float,
+    rate_limit_type: str = None,
+):
+    riot_request_seconds.labels(route=route).observe(seconds)
+    riot_responses.labels(route=route, status=status).inc()
+    if waited:
+        rate_limit_wait_seconds.labels(route=route).inc(waited)
+    if status == 429:
+        riot_rate_limited.labels(route=route, type=rate_limit_type or 'unknown').inc()
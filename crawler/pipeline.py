@@ -0,0 +1,173 @@
+import queue
+import threading
+
+try:
+    import util
+except ModuleNotFoundError:
+    print('common package not in python path')
+
+
+logger = util.Logger(__name__)
+
+_DONE = object()
+_POLL = 0.5
+
+
+class Stage:
+
+    def __init__(
+        self,
+        name: str,
+        func,
+        workers: int,
+    ):
+        self.name = name
+        self.func = func
+        self.workers = workers
+
+
+class Pipeline:
+    '''
+    runs items through a chain of stages, each with its own threads. stages are connected by
+    queues holding at most `capacity` items, so a slow stage throttles the ones before it and
+    memory stays bounded. results of the last stage are yielded to the caller as they are ready.
+    '''
+
+    def __init__(
+        self,
+        capacity: int,
+    ):
+        if capacity < 1:
+            # queue.Queue treats 0 as unbounded
+            raise ValueError(f'pipeline capacity must be at least 1, got {capacity}')
+        self.capacity = capacity
+        self.stages = []
+        self._stop = threading.Event()
+        self._error = None
+
+    def add_stage(
+        self,
+        name: str,
+        func,
+        workers: int = 1,
+    ) -> 'Pipeline':
+        if workers < 1:
+            # without a worker nothing would ever pass on the end of the input, run() would block forever
+            raise ValueError(f'pipeline stage {name} needs at least 1 worker, got {workers}')
+        self.stages.append(Stage(name=name, func=func, workers=workers))
+        return self
+
+    def _put(
+        self,
+        q: queue.Queue,
+        item,
+    ) -> bool:
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=_POLL)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _get(
+        self,
+        q: queue.Queue,
+    ):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=_POLL)
+            except queue.Empty:
+                pass
+        return _DONE
+
+    def _fail(
+        self,
+        e: Exception,
+    ):
+        if self._error is None:
+            self._error = e
+        self._stop.set()
+
+    def _feed(
+        self,
+        items,
+        out: queue.Queue,
+        consumers: int,
+    ):
+        try:
+            for item in items:
+                if not self._put(out, item):
+                    return
+        except Exception as e:
+            self._fail(e)
+        finally:
+            for _ in range(consumers):
+                self._put(out, _DONE)
+
+    def _work(
+        self,
+        stage: Stage,
+        inbox: queue.Queue,
+        out: queue.Queue,
+        finished: list,
+        lock: threading.Lock,
+        consumers: int,
+    ):
+        try:
+            while True:
+                item = self._get(inbox)
+                if item is _DONE:
+                    break
+                if not self._put(out, stage.func(item)):
+                    break
+        except Exception as e:
+            logger.warn(f'pipeline stage {stage.name} failed: {e}')
+            self._fail(e)
+        finally:
+            # the last worker of a stage tells the next stage that nothing more is coming
+            with lock:
+                finished[0] += 1
+                last = finished[0] == stage.workers
+            if last:
+                for _ in range(consumers):
+                    self._put(out, _DONE)
+
+    def run(
+        self,
+        items,
+    ):
+        queues = [queue.Queue(maxsize=self.capacity) for _ in range(len(self.stages) + 1)]
+        consumers = [stage.workers for stage in self.stages] + [1]
+        threads = [threading.Thread(
+            target=self._feed,
+            args=(items, queues[0], consumers[0]),
+            daemon=True,
+        )]
+        for n, stage in enumerate(self.stages):
+            finished = [0]
+            lock = threading.Lock()
+            for _ in range(stage.workers):
+                threads.append(threading.Thread(
+                    target=self._work,
+                    args=(stage, queues[n], queues[n + 1], finished, lock, consumers[n + 1]),
+                    name=f'pipeline-{stage.name}',
+                    daemon=True,
+                ))
+        for t in threads:
+            t.start()
+
+        try:
+            while True:
+                item = self._get(queues[-1])
+                if item is _DONE:
+                    break
+                yield item
+        finally:
+            # also reached when the caller stops consuming early
+            self._stop.set()
+            for t in threads:
+                t.join()
+
+        if self._error is not None:
+            raise self._error
@@ -0,0 +1,304 @@
+import asyncio
+import collections
+import threading
+import time
+
+import cache
+import metrics
+
+try:
+    import util
+except ModuleNotFoundError:
+    print('common package not in python path')
+
+
+logger = util.Logger(__name__)
+
+# limits riot documents for development keys, used until the first response tells us better
+DEFAULT_APP_LIMITS = '20:1,100:120'
+# backoff for 429s without a Retry-After header (underlying service limits)
+DEFAULT_RETRY_AFTER = 1.0
+# limiters unused for this long are dropped, longer than riot's largest window (10 minutes) so no hits are lost
+IDLE_TTL = 900.0
+
+
+def parse_limits(
+    header: str,
+) -> dict:
+    '''
+    parses riot rate limit headers like "20:1,100:120" into {window_seconds: count}
+    '''
+    limits = {}
+    if not header:
+        return limits
+    for part in header.split(','):
+        try:
+            count, window = part.split(':')
+            limits[int(window)] = int(count)
+        except ValueError:
+            logger.warn(f'malformed rate limit header part "{part}"')
+    return limits
+
+
+class Window:
+
+    def __init__(
+        self,
+        limit: int,
+        seconds: int,
+    ):
+        self.limit = limit
+        self.seconds = seconds
+        self.hits = collections.deque()
+
+    def _expire(
+        self,
+        now: float,
+    ):
+        while self.hits and self.hits[0] <= now - self.seconds:
+            self.hits.popleft()
+
+    def wait_time(
+        self,
+        now: float,
+    ) -> float:
+        self._expire(now)
+        if len(self.hits) < self.limit:
+            return 0.0
+        # the oldest hit that has to leave the window before we fit in again
+        return self.hits[len(self.hits) - self.limit] + self.seconds - now
+
+    def hit(
+        self,
+        now: float,
+    ):
+        self.hits.append(now)
+
+    def sync(
+        self,
+        count: int,
+        now: float,
+    ):
+        # riot counted more requests than we know of (other workers, restarts), catch up
+        self._expire(now)
+        missing = count - len(self.hits)
+        for _ in range(missing):
+            self.hits.append(now)
+
+    def utilisation(
+        self,
+        now: float,
+    ) -> float:
+        self._expire(now)
+        return len(self.hits) / self.limit if self.limit else 0.0
+
+
+class Bucket:
+
+    def __init__(
+        self,
+        limits: dict,
+    ):
+        self.windows = {}
+        # set from Retry-After, nothing goes through before
+        self.blocked_until = 0.0
+        self.configure(limits)
+
+    def configure(
+        self,
+        limits: dict,
+    ):
+        windows = {}
+        for seconds, limit in limits.items():
+            window = self.windows.get(seconds)
+            if window is None:
+                window = Window(limit=limit, seconds=seconds)
+            window.limit = limit
+            windows[seconds] = window
+        self.windows = windows
+
+    def wait_time(
+        self,
+        now: float,
+    ) -> float:
+        return max([self.blocked_until - now] + [w.wait_time(now) for w in self.windows.values()])
+
+    def hit(
+        self,
+        now: float,
+    ):
+        for window in self.windows.values():
+            window.hit(now)
+
+    def sync(
+        self,
+        counts: dict,
+        now: float,
+    ):
+        for seconds, count in counts.items():
+            window = self.windows.get(seconds)
+            if window is not None:
+                window.sync(count=count, now=now)
+
+    def utilisation(
+        self,
+        now: float,
+    ) -> dict:
+        return {seconds: w.utilisation(now) for seconds, w in self.windows.items()}
+
+
+class RateLimiter:
+    '''
+    paces requests against riot's app (per key) and method (per route) limits.
+    limits are learned from the X-*-Rate-Limit headers of every response, so we
+    wait before sending instead of finding out through 429s.
+    '''
+
+    def __init__(
+        self,
+        app_limits: str = DEFAULT_APP_LIMITS,
+    ):
+        self._lock = threading.Lock()
+        self._app = Bucket(parse_limits(app_limits))
+        self._methods = {}
+
+    def _method_bucket(
+        self,
+        method: str,
+    ) -> Bucket:
+        bucket = self._methods.get(method)
+        if bucket is None:
+            bucket = Bucket({})
+            self._methods[method] = bucket
+        return bucket
+
+    def reserve(
+        self,
+        method: str,
+    ) -> float:
+        '''
+        takes a slot for `method` if one is free and returns 0, otherwise returns the time to wait
+        '''
+        with self._lock:
+            now = time.monotonic()
+            bucket = self._method_bucket(method)
+            wait = max(
+                self._app.wait_time(now),
+                bucket.wait_time(now),
+            )
+            if wait > 0:
+                return wait
+            self._app.hit(now)
+            bucket.hit(now)
+            return 0.0
+
+    def acquire(
+        self,
+        method: str,
+    ) -> float:
+        '''
+        blocks until a request for `method` fits into all known windows, returns the time waited
+        '''
+        waited = 0.0
+        wait = self.reserve(method)
+        while wait > 0:
+            time.sleep(wait)
+            waited += wait
+            wait = self.reserve(method)
+        return waited
+
+    async def acquire_async(
+        self,
+        method: str,
+    ) -> float:
+        waited = 0.0
+        wait = self.reserve(method)
+        while wait > 0:
+            await asyncio.sleep(wait)
+            waited += wait
+            wait = self.reserve(method)
+        return waited
+
+    def update(
+        self,
+        method: str,
+        headers,
+        status_code: int = 200,
+    ):
+        '''
+        feeds the rate limit headers of a response back into the limiter
+        '''
+        with self._lock:
+            now = time.monotonic()
+            app_limits = parse_limits(headers.get('X-App-Rate-Limit'))
+            if app_limits:
+                self._app.configure(app_limits)
+            self._app.sync(parse_limits(headers.get('X-App-Rate-Limit-Count')), now)
+
+            bucket = self._method_bucket(method)
+            method_limits = parse_limits(headers.get('X-Method-Rate-Limit'))
+            if method_limits:
+                bucket.configure(method_limits)
+            bucket.sync(parse_limits(headers.get('X-Method-Rate-Limit-Count')), now)
+
+            retry_after = headers.get('Retry-After')
+            if retry_after is None and status_code == 429:
+                retry_after = DEFAULT_RETRY_AFTER
+            if retry_after is not None:
+                # only the app limit holds back every method of the key, method and service limits hit this method
+                limit_type = headers.get('X-Rate-Limit-Type', 'service')
+                blocked = self._app if limit_type == 'application' else bucket
+                try:
+                    blocked.blocked_until = max(blocked.blocked_until, now + float(retry_after))
+                except ValueError:
+                    pass
+                logger.warn(f'rate limited ({limit_type}) on {method}, retry after {retry_after}s')
+
+    def utilisation(self) -> dict:
+        '''
+        share of every window in use, by ("app" or method, window seconds)
+        '''
+        with self._lock:
+            now = time.monotonic()
+            buckets = [('app', self._app)] + list(self._methods.items())
+            return {
+                (name, seconds): value
+                for name, bucket in buckets
+                for seconds, value in bucket.utilisation(now).items()
+            }
+
+
+_limiters = cache.IdleMap(ttl=IDLE_TTL)
+
+
+def get_limiter(
+    token: str,
+    endpoint: str = None,
+) -> RateLimiter:
+    '''
+    riot counts requests per api key and region, so every client using the same token on the same
+    regional endpoint shares one limiter
+    '''
+    return _limiters.get((token, endpoint), RateLimiter)
+
+
+def utilisation() -> dict:
+    # keys are reported by their last characters only
+    return {
+        (f'...{token[-4:]}' if token else '', endpoint or '', name, seconds): value
+        for (token, endpoint), limiter in _limiters.items()
+        for (name, seconds), value in limiter.utilisation().items()
+    }
+
+
+_reported = set()
+
+
+@metrics.on_refresh
+def refresh_metrics():
+    global _reported
+    _reported = metrics.set_labelled(
+        gauge=metrics.rate_limit_utilisation,
+        values=utilisation(),
+        previous=_reported,
+    )
@@ -0,0 +1,25 @@
+import argparse
+import os
+
+import archive
+import controller
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        description='rebuild database rows from the raw payload archive, without calling riot',
+    )
+    arg_parser.add_argument('--archive-dir', default=os.getenv('CRAWLER_ARCHIVE_DIR'))
+    arg_parser.add_argument('game_ids', nargs='*', type=int, help='defaults to every archived game')
+    args = arg_parser.parse_args()
+    if not args.archive_dir:
+        arg_parser.error('no archive, pass --archive-dir or set CRAWLER_ARCHIVE_DIR')
+
+    controller.reingest_archive(
+        raw_archive=archive.Archive(path=args.archive_dir),
+        game_ids=args.game_ids or None,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+import random
+import threading
+import time
+
+import cache
+import metrics
+
+try:
+    import util
+except ModuleNotFoundError:
+    print('common package not in python path')
+
+
+logger = util.Logger(__name__)
+
+# how a non-ok response is handled
+RETRYABLE = 'retryable'  # 5xx and connection errors, retried with backoff, counted by the circuit breaker
+RATE_LIMITED = 'rate_limited'  # 429, retried once the rate limiter lets the next request through
+PERMANENT = 'permanent'  # other 4xx, sending the same request again gives the same answer
+
+# breakers of endpoints no crawl used for this long are dropped
+BREAKER_IDLE_TTL = 900.0
+
+
+def classify(
+    status_code: int,
+) -> str:
+    if status_code == 429:
+        return RATE_LIMITED
+    if 400 <= status_code < 500:
+        return PERMANENT
+    return RETRYABLE
+
+
+def backoff(
+    attempt: int,
+    base: float,
+    cap: float,
+) -> float:
+    '''
+    capped exponential backoff with full jitter, so threads hit by the same outage do not retry in lockstep
+    '''
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+class CircuitBreaker:
+    '''
+    fails requests to an endpoint fast after `threshold` retryable failures in a row. once `cooldown`
+    seconds have passed requests go through again, the next failure opens the circuit right away
+    and the next success closes it.
+    '''
+
+    def __init__(
+        self,
+        endpoint: str,
+        threshold: int,
+        cooldown: float,
+    ):
+        self.endpoint = endpoint
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._open_until = 0.0
+        self._lock = threading.Lock()
+
+    def check(self):
+        with self._lock:
+            remaining = self._open_until - time.monotonic()
+        if remaining > 0:
+            raise CircuitOpen(f'{self.endpoint} is failing, not sending requests for another {remaining:.0f}s')
+
+    def success(self):
+        with self._lock:
+            self._failures = 0
+
+    def failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures < self.threshold or time.monotonic() < self._open_until:
+                return
+            self._open_until = time.monotonic() + self.cooldown
+            failures = self._failures
+        metrics.riot_circuit_opened.labels(endpoint=self.endpoint).inc()
+        logger.warn(f'{self.endpoint} failed {failures} times in a row, pausing requests for {self.cooldown}s')
+
+
+_breakers = cache.IdleMap(ttl=BREAKER_IDLE_TTL)
+
+
+def get_breaker(
+    endpoint: str,
+    threshold: int,
+    cooldown: float,
+) -> CircuitBreaker:
+    # one breaker per endpoint, shared by every key and client in this process
+    return _breakers.get(endpoint, lambda: CircuitBreaker(
+        endpoint=endpoint,
+        threshold=threshold,
+        cooldown=cooldown,
+    ))
@@ -0,0 +1,180 @@
+import dataclasses
+import itertools
+import threading
+
+import async_client
+import cache
+import client
+import retry
+
+try:
+    import util
+except ModuleNotFoundError:
+    print('common package not in python path')
+
+
+logger = util.Logger(__name__)
+
+
+def parse_tokens(
+    spec: str,
+) -> list:
+    '''
+    parses "RGAPI-a,RGAPI-b" into a list of api keys
+    '''
+    return [token.strip() for token in (spec or '').split(',') if token.strip()]
+
+
+def parse_endpoints(
+    spec: str,
+) -> dict:
+    '''
+    parses "EUW1=https://euw1.api.riotgames.com,NA1=https://na1.api.riotgames.com" into {platform_id: endpoint}
+    '''
+    endpoints = {}
+    for part in (spec or '').split(','):
+        if not part.strip():
+            continue
+        try:
+            platform_id, endpoint = part.split('=', 1)
+            endpoints[platform_id.strip().upper()] = endpoint.strip()
+        except ValueError:
+            logger.warn(f'malformed platform endpoint "{part}"')
+    return endpoints
+
+
+# seconds the comparisons of a key are kept after the last crawl with it
+SAME_APPLICATION_IDLE_TTL = 900.0
+
+# home key -> {key: whether both keys belong to the same riot application}
+_same_application = cache.IdleMap(ttl=SAME_APPLICATION_IDLE_TTL)
+_same_application_lock = threading.Lock()
+
+
+def same_application(
+    config: client.ClientConfig,
+    tokens: list,
+    home_token: str,
+    endpoint: str,
+    summoner_name: str,
+) -> list:
+    '''
+    the keys of `tokens` that belong to the application of `home_token`. ids are encrypted per application,
+    keys of another one would store the summoners of their matches under other account ids. two keys belong
+    to the same application if they get the same account id for `summoner_name`.
+    '''
+    def account_id(token):
+        summoner = client.Client(
+            config=dataclasses.replace(config, token=token),
+            routes=client.ClientRoutes(endpoint=endpoint),
+        ).get_summoner_by_summonername(summoner_name=summoner_name)
+        return summoner.account_id if summoner is not None else None
+
+    known = _same_application.get(home_token, dict)
+    with _same_application_lock:
+        unknown = [t for t in tokens if t != home_token and t not in known]
+    if unknown:
+        home_account_id = account_id(home_token)
+        if home_account_id is None:
+            # nothing to compare with, the crawl fails on the missing summoner anyway
+            return [home_token]
+        for token in unknown:
+            try:
+                same = account_id(token) == home_account_id
+            except (client.RiotAPINotOkayException, retry.CircuitOpen) as e:
+                logger.warn(f'key ...{token[-4:]} not usable, leaving it out of this crawl: {e}')
+                continue
+            if not same:
+                logger.warn(f'key ...{token[-4:]} belongs to another application than the request\'s key, not using it')
+            with _same_application_lock:
+                known[token] = same
+    with _same_application_lock:
+        return [t for t in tokens if t == home_token or known.get(t)]
+
+
+class ShardedClient:
+    '''
+    spreads a crawl over several api keys and regional endpoints. every (key, endpoint) pair is a
+    client of its own with its own rate limiter, matches are fetched from the endpoint of their
+    platform and keys are taken round-robin.
+
+    summoner and account ids are encrypted per application, so the summoners of a match are looked up
+    with the key that fetched the match. the crawl-level calls (summoner by name, matchlist) go
+    through `home`, which keeps one key for the whole crawl.
+    '''
+
+    client_class = client.Client
+
+    def __init__(
+        self,
+        config: client.ClientConfig,
+        tokens: list,
+        home_endpoint: str,
+        platform_endpoints: dict,
+    ):
+        if not tokens:
+            raise ValueError('sharded client needs at least one api key')
+        self.config = config
+        self.tokens = list(tokens)
+        self.home_endpoint = home_endpoint
+        self.platform_endpoints = {p.upper(): e for p, e in platform_endpoints.items()}
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._next_token = itertools.cycle(self.tokens)
+        self.home = self.shard()
+
+    def _endpoint(
+        self,
+        platform_id: str,
+    ) -> str:
+        if not platform_id:
+            return self.home_endpoint
+        endpoint = self.platform_endpoints.get(platform_id.upper())
+        if endpoint is None:
+            return self.home_endpoint
+        return endpoint
+
+    def shard(
+        self,
+        platform_id: str = None,
+        token: str = None,
+    ):
+        '''
+        client for `platform_id` using `token`, or the next key in turn
+        '''
+        endpoint = self._endpoint(platform_id)
+        with self._lock:
+            if token is None:
+                token = next(self._next_token)
+            shard = self._clients.get((token, endpoint))
+            if shard is None:
+                shard = self.client_class(
+                    config=dataclasses.replace(self.config, token=token),
+                    routes=client.ClientRoutes(endpoint=endpoint),
+                )
+                self._clients[(token, endpoint)] = shard
+            return shard
+
+    def __getattr__(
+        self,
+        name: str,
+    ):
+        # get_summoner_by_summonername, get_matchlist_by_accountid, ... of the home shard
+        if name == 'home':
+            raise AttributeError(name)
+        return getattr(self.home, name)
+
+
+class AsyncShardedClient(ShardedClient):
+
+    client_class = async_client.AsyncClient
+
+    async def close(self):
+        for shard in list(self._clients.values()):
+            await shard.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
@@ -0,0 +1,260 @@
+import dataclasses
+import hashlib
+import heapq
+import itertools
+import math
+import threading
+import time
+
+import retry
+
+try:
+    import util
+except ModuleNotFoundError:
+    print('common package not in python path')
+
+
+logger = util.Logger(__name__)
+
+_DAY_MS = 86400000
+
+
+class BloomFilter:
+    '''
+    set membership in about 1.8 MB per million keys at a 0.1% false positive rate.
+    a false positive means a summoner is not crawled, never that one is crawled twice.
+    '''
+
+    def __init__(
+        self,
+        capacity: int,
+        error_rate: float = 0.001,
+    ):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(
+        self,
+        key: str,
+    ):
+        # double hashing, k positions out of one 128 bit digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(
+        self,
+        key: str,
+    ) -> bool:
+        '''
+        adds `key` and returns whether it was new
+        '''
+        new = False
+        for pos in self._positions(key):
+            byte, bit = divmod(pos, 8)
+            if not self.bits[byte] & (1 << bit):
+                self.bits[byte] |= 1 << bit
+                new = True
+        return new
+
+    def __contains__(
+        self,
+        key: str,
+    ) -> bool:
+        return all(self.bits[pos // 8] & (1 << (pos % 8)) for pos in self._positions(key))
+
+
+class BudgetExhausted(Exception):
+    pass
+
+
+@dataclasses.dataclass()
+class SpiderConfig:
+    # budgets, the spider stops when any of them is used up
+    max_depth: int = 2
+    max_summoners: int = 100
+    max_matches: int = 10000
+    max_seconds: float = 6 * 3600
+    # frontier entries beyond this are dropped, lowest priority first
+    max_frontier: int = 100000
+    seen_capacity: int = 1000000
+    # priority = level_weight * summoner_level - depth_weight * depth - recency_weight * days since last seen playing
+    depth_weight: float = 10.0
+    recency_weight: float = 1.0
+    level_weight: float = 0.0
+
+    @classmethod
+    def from_options(
+        cls,
+        options: dict,
+    ) -> 'SpiderConfig':
+        fields = {f.name for f in dataclasses.fields(cls)}
+        unknown = set(options) - fields
+        if unknown:
+            raise ValueError(f'unknown spider options {sorted(unknown)}')
+        return cls(**options)
+
+
+@dataclasses.dataclass(order=True)
+class FrontierEntry:
+    sort_key: float
+    seq: int
+    summoner_name: str = dataclasses.field(compare=False)
+    depth: int = dataclasses.field(compare=False)
+
+
+class Frontier:
+    '''
+    summoners waiting to be crawled, highest priority first, each summoner offered at most once
+    '''
+
+    def __init__(
+        self,
+        config: SpiderConfig,
+    ):
+        self.config = config
+        self.seen = BloomFilter(capacity=config.seen_capacity)
+        self._heap = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def priority(
+        self,
+        depth: int,
+        last_played: int,
+        summoner_level: int,
+    ) -> float:
+        days = max(0.0, (time.time() * 1000 - last_played) / _DAY_MS) if last_played else 0.0
+        return (
+            self.config.level_weight * (summoner_level or 0)
+            - self.config.depth_weight * depth
+            - self.config.recency_weight * days
+        )
+
+    def offer(
+        self,
+        summoner_name: str,
+        depth: int,
+        last_played: int = 0,
+        summoner_level: int = 0,
+    ) -> bool:
+        if depth > self.config.max_depth:
+            return False
+        with self._lock:
+            # names are unique per region up to case and spaces, account ids differ between api keys
+            if not self.seen.add(summoner_name.replace(' ', '').lower()):
+                return False
+            entry = FrontierEntry(
+                sort_key=-self.priority(depth, last_played, summoner_level),
+                seq=next(self._seq),
+                summoner_name=summoner_name,
+                depth=depth,
+            )
+            heapq.heappush(self._heap, entry)
+            if len(self._heap) > 2 * self.config.max_frontier:
+                # trimming in bulk keeps offer() cheap
+                self._heap = heapq.nsmallest(self.config.max_frontier, self._heap)
+                heapq.heapify(self._heap)
+            return True
+
+    def pop(self):
+        with self._lock:
+            return heapq.heappop(self._heap) if self._heap else None
+
+    def __len__(self):
+        return len(self._heap)
+
+
+class Spider:
+    '''
+    breadth-first crawl starting at one summoner. the participants of every match written are
+    offered to the frontier one level deeper, the best ranked summoner is crawled next.
+    '''
+
+    def __init__(
+        self,
+        config: SpiderConfig,
+        crawl,
+    ):
+        # crawl(summoner_name, discover) runs a single summoner crawl, e.g. controller.crawl_summoner
+        self.config = config
+        self.crawl = crawl
+        self.frontier = Frontier(config=config)
+        self.summoners = 0
+        self.matches = 0
+        self.started = None
+        # an error of the job's progress callback, e.g. the job was taken over, ends the spider
+        self._stopped = None
+
+    def _discover(
+        self,
+        depth: int,
+        progress,
+    ):
+        def discover(match_data):
+            self.matches += 1
+            if progress is not None:
+                try:
+                    progress(self.matches, self.config.max_matches)
+                except Exception as e:
+                    self._stopped = e
+                    raise
+            # summoners are only looked up from depth "participants" on, the names are always in the match
+            levels = {summoner.account_id: summoner.summoner_level for summoner in match_data.summoners}
+            for identity in match_data.match.participant_identities:
+                self.frontier.offer(
+                    summoner_name=identity.player.summoner_name,
+                    depth=depth,
+                    last_played=match_data.match.game_creation,
+                    summoner_level=levels.get(identity.player.current_account_id, 0),
+                )
+            # a single summoner may have thousands of matches, the crawl is stopped within its matchlist
+            if self.out_of_matches_or_time():
+                raise BudgetExhausted(f'{self.matches} matches crawled in {time.monotonic() - self.started:.0f}s')
+        return discover
+
+    def out_of_matches_or_time(self) -> bool:
+        return (
+            self.matches >= self.config.max_matches
+            or time.monotonic() - self.started >= self.config.max_seconds
+        )
+
+    def exhausted(self) -> bool:
+        return self.summoners >= self.config.max_summoners or self.out_of_matches_or_time()
+
+    def run(
+        self,
+        seed_name: str,
+        progress=None,
+    ):
+        self.started = time.monotonic()
+        self.frontier.offer(summoner_name=seed_name, depth=0)
+        while not self.exhausted():
+            entry = self.frontier.pop()
+            if entry is None:
+                break
+            logger.info(
+                f'spider: crawling "{entry.summoner_name}" at depth {entry.depth}, '
+                f'{len(self.frontier)} waiting, {self.summoners} crawled, {self.matches} matches'
+            )
+            try:
+                self.crawl(
+                    summoner_name=entry.summoner_name,
+                    discover=self._discover(entry.depth + 1, progress),
+                )
+            except BudgetExhausted as e:
+                logger.info(f'spider: budget used up while crawling "{entry.summoner_name}": {e}')
+                self.summoners += 1
+                break
+            except retry.CircuitOpen:
+                # riot is down, the remaining summoners would fail just the same
+                raise
+            except Exception as e:
+                if e is self._stopped:
+                    raise
+                # renamed or transferred summoners are expected, keep going with the next one
+                logger.warn(f'spider: crawl of "{entry.summoner_name}" failed: {e}')
+            self.summoners += 1
+        logger.info(f'spider: done, {self.summoners} summoners and {self.matches} matches crawled')
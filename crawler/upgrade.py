@@ -0,0 +1,38 @@
+import argparse
+import os
+
+import urllib3
+
+import client
+import controller
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        description='fetch what shallower crawls left out of stored matches, e.g. their timelines',
+    )
+    arg_parser.add_argument('--endpoint', required=True, help='e.g. https://euw1.api.riotgames.com/')
+    arg_parser.add_argument('--token', default=os.getenv('CRAWLER_RIOT_TOKEN'))
+    arg_parser.add_argument('--depth', default=controller.DEPTH_TIMELINE, choices=controller.DEPTHS)
+    arg_parser.add_argument('game_ids', nargs='+', type=int)
+    args = arg_parser.parse_args()
+    if not args.token:
+        arg_parser.error('no api key, pass --token or set CRAWLER_RIOT_TOKEN')
+
+    # we dont check tls certificates so surpress the warning
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    controller.upgrade_matches(
+        rclient=client.Client(
+            config=client.ClientConfig(
+                token=args.token,
+                archive_dir=os.getenv('CRAWLER_ARCHIVE_DIR'),
+            ),
+            routes=client.ClientRoutes(endpoint=args.endpoint),
+        ),
+        game_ids=args.game_ids,
+        depth=args.depth,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+import unittest
+
+import batching
+
+
+class SplitInsertTest(unittest.TestCase):
+
+    def test_single_row_insert(self):
+        self.assertEqual(
+            batching.split_insert('INSERT INTO match (game_id, queue_id) VALUES (%s, %s)'),
+            ('match', 'INSERT INTO match (game_id, queue_id) VALUES ', '(%s, %s)', ''),
+        )
+
+    def test_quoted_table(self):
+        self.assertEqual(batching.split_insert('insert into "team" (a) values (%s)')[0], 'team')
+
+    def test_parenthesis_in_quoted_literal(self):
+        parts = batching.split_insert('INSERT INTO t (a, b) VALUES (%s, \'a)b(\') ON CONFLICT DO NOTHING')
+        self.assertEqual(parts[2], '(%s, \'a)b(\')')
+        self.assertEqual(parts[3], ' ON CONFLICT DO NOTHING')
+
+    def test_escaped_quote_in_literal(self):
+        parts = batching.split_insert('INSERT INTO t (a, b) VALUES (%s, \'it\'\'s)\')')
+        self.assertEqual(parts[2], '(%s, \'it\'\'s)\')')
+        self.assertEqual(parts[3], '')
+
+    def test_nested_parenthesis(self):
+        parts = batching.split_insert('INSERT INTO t (a, b) VALUES (%s, lower(%s))')
+        self.assertEqual(parts[2], '(%s, lower(%s))')
+
+    def test_on_conflict_suffix(self):
+        parts = batching.split_insert(
+            'INSERT INTO match_depth (game_id, level) VALUES (%s, %s) '
+            'ON CONFLICT (game_id) DO UPDATE SET level = GREATEST(match_depth.level, EXCLUDED.level);\n'
+        )
+        self.assertEqual(
+            parts[3],
+            ' ON CONFLICT (game_id) DO UPDATE SET level = GREATEST(match_depth.level, EXCLUDED.level)',
+        )
+
+    def test_returning_is_not_batched(self):
+        self.assertIsNone(batching.split_insert('INSERT INTO t (a) VALUES (%s) RETURNING id'))
+        self.assertIsNone(batching.split_insert('INSERT INTO t (a) VALUES (%s) returning id'))
+
+    def test_parameters_outside_values_are_not_batched(self):
+        self.assertIsNone(batching.split_insert(
+            'INSERT INTO t (a, b) VALUES (%s, %s) ON CONFLICT (a) DO UPDATE SET b = %s'
+        ))
+
+    def test_other_statements(self):
+        self.assertIsNone(batching.split_insert('UPDATE t SET a = %s'))
+        self.assertIsNone(batching.split_insert('INSERT INTO t SELECT * FROM u'))
+        self.assertIsNone(batching.split_insert('INSERT INTO t (a) VALUES (%s'))
+
+
+class FakeCursor:
+
+    def __init__(
+        self,
+        conn: 'FakeConnection',
+    ):
+        self.conn = conn
+
+    def mogrify(self, sql, params):
+        return (sql % tuple(repr(p) for p in params)).encode()
+
+    def execute(self, sql, params=None):
+        self.conn.statements.append(sql.decode() if isinstance(sql, bytes) else sql)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+
+    def __init__(self):
+        self.statements = []
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class BatchConnectionTest(unittest.TestCase):
+
+    def test_one_statement_per_shape_in_first_seen_order(self):
+        conn = FakeConnection()
+        batch = batching.BatchConnection(conn=conn)
+        cur = batch.cursor()
+        cur.execute('INSERT INTO match (game_id) VALUES (%s) ON CONFLICT DO NOTHING', (1,))
+        cur.execute('INSERT INTO team (game_id, team_id) VALUES (%s, %s)', (1, 100))
+        cur.execute('INSERT INTO team (game_id, team_id) VALUES (%s, %s)', (1, 200))
+        cur.execute('UPDATE match SET queue_id = %s', (420,))
+        self.assertEqual(batch.rows(), {'match': 1, 'team': 2, None: 1})
+
+        batch.flush()
+        self.assertEqual(conn.statements, [
+            'INSERT INTO match (game_id) VALUES (1) ON CONFLICT DO NOTHING',
+            'INSERT INTO team (game_id, team_id) VALUES (1, 100),(1, 200)',
+            'UPDATE match SET queue_id = %s',
+        ])
+        self.assertEqual(conn.commits, 1)
+        self.assertEqual(batch.round_trips, 3)
+        self.assertEqual(batch.rows(), {})
+
+    def test_standalone_statements_keep_their_place(self):
+        conn = FakeConnection()
+        batch = batching.BatchConnection(conn=conn)
+        cur = batch.cursor()
+        cur.execute('INSERT INTO team (game_id, team_id) VALUES (%s, %s)', (1, 100))
+        cur.execute('DELETE FROM match_depth WHERE game_id = %s', (1,))
+        cur.execute('INSERT INTO team (game_id, team_id) VALUES (%s, %s)', (1, 200))
+        cur.execute('DELETE FROM match_depth WHERE game_id = %s', (2,))
+        cur.execute('INSERT INTO team (game_id, team_id) VALUES (%s, %s)', (1, 300))
+        cur.execute('INSERT INTO team (game_id, team_id) VALUES (%s, %s)', (1, 400))
+        self.assertEqual(batch.rows(), {'team': 4, None: 2})
+
+        batch.flush()
+        self.assertEqual(conn.statements, [
+            'INSERT INTO team (game_id, team_id) VALUES (1, 100)',
+            'DELETE FROM match_depth WHERE game_id = %s',
+            'INSERT INTO team (game_id, team_id) VALUES (1, 200)',
+            'DELETE FROM match_depth WHERE game_id = %s',
+            'INSERT INTO team (game_id, team_id) VALUES (1, 300),(1, 400)',
+        ])
+        self.assertEqual(batch.round_trips, 5)
+
+    def test_rollback_drops_pending_statements(self):
+        conn = FakeConnection()
+        batch = batching.BatchConnection(conn=conn)
+        cur = batch.cursor()
+        cur.execute('INSERT INTO team (game_id, team_id) VALUES (%s, %s)', (1, 100))
+        cur.execute('UPDATE match SET queue_id = %s', (420,))
+        batch.rollback()
+        cur.execute('INSERT INTO team (game_id, team_id) VALUES (%s, %s)', (2, 100))
+
+        batch.flush()
+        self.assertEqual(conn.statements, ['INSERT INTO team (game_id, team_id) VALUES (2, 100)'])
+
+
+if __name__ == '__main__':
+    unittest.main()
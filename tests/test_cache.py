@@ -0,0 +1,28 @@
+import unittest
+
+import cache
+
+
+class KnownGameIdsTest(unittest.TestCase):
+
+    def test_unknown(self):
+        known = cache.KnownGameIds(max_size=10)
+        known.add([1, 2])
+        self.assertEqual(known.unknown([1, 2, 3]), [3])
+
+    def test_evicts_oldest(self):
+        known = cache.KnownGameIds(max_size=3)
+        known.add([1, 2, 3])
+        known.add([1])
+        known.add([4, 5])
+        # 1 was added again after 2 and 3, so those go first
+        self.assertEqual(known.unknown([1, 2, 3, 4, 5]), [2, 3])
+
+    def test_disabled(self):
+        known = cache.KnownGameIds(max_size=0)
+        known.add([1])
+        self.assertEqual(known.unknown([1]), [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import collections
+import unittest
+
+import controller
+
+Ref = collections.namedtuple('Ref', ['game_id', 'timestamp'])
+
+
+def refs(*game_ids):
+    # newest first, like the matchlist
+    return [Ref(game_id=g, timestamp=g * 1000) for g in game_ids]
+
+
+class NewMatchRefsTest(unittest.TestCase):
+
+    def test_without_watermark(self):
+        self.assertEqual(controller.new_match_refs(refs(5, 4, 3), None), refs(5, 4, 3))
+
+    def test_stops_at_the_watermark_game(self):
+        self.assertEqual(controller.new_match_refs(refs(5, 4, 3, 2), (3, 3000)), refs(5, 4))
+
+    def test_stops_at_older_games(self):
+        # the watermark game itself is gone from the matchlist, e.g. a remade game
+        self.assertEqual(controller.new_match_refs(refs(5, 4, 2, 1), (3, 3000)), refs(5, 4))
+
+    def test_nothing_new(self):
+        self.assertEqual(controller.new_match_refs(refs(3, 2), (3, 3000)), [])
+
+
+class MatchlistPageTest(unittest.TestCase):
+
+    def full_page(self, newest):
+        return refs(*range(newest, newest - controller.MATCHLIST_PAGE, -1))
+
+    def test_full_page_continues(self):
+        page = self.full_page(1000)
+        self.assertEqual(controller.matchlist_page(page, None, 0), (page, controller.MATCHLIST_PAGE))
+        self.assertEqual(controller.matchlist_page(page, None, 200)[1], 200 + controller.MATCHLIST_PAGE)
+
+    def test_short_page_is_the_last(self):
+        page = refs(3, 2, 1)
+        self.assertEqual(controller.matchlist_page(page, None, 100), (page, None))
+
+    def test_watermark_ends_paging(self):
+        page = self.full_page(1000)
+        new_refs, next_index = controller.matchlist_page(page, (990, 990000), 0)
+        self.assertEqual(new_refs, page[:10])
+        self.assertIsNone(next_index)
+
+
+class WatermarkRefTest(unittest.TestCase):
+
+    def test_everything_stored(self):
+        self.assertEqual(controller.watermark_ref(refs(5, 4, 3), set()), Ref(5, 5000))
+
+    def test_behind_the_oldest_missing_game(self):
+        self.assertEqual(controller.watermark_ref(refs(5, 4, 3, 2), {4, 5}), Ref(3, 3000))
+        self.assertEqual(controller.watermark_ref(refs(5, 4, 3, 2), {3}), Ref(2, 2000))
+
+    def test_oldest_game_missing(self):
+        self.assertIsNone(controller.watermark_ref(refs(5, 4, 3), {3}))
+
+    def test_empty(self):
+        self.assertIsNone(controller.watermark_ref([], set()))
+
+
+if __name__ == '__main__':
+    unittest.main()
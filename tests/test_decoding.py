@@ -0,0 +1,100 @@
+import collections
+import unittest
+
+import decoding
+
+Point = collections.namedtuple('Point', ['x', 'y', 'label', 'tags'])
+
+POINT_FIELDS = (
+    decoding.Field('x', 'x', True),
+    decoding.Field('y', 'y', True),
+    decoding.Field('label', 'pointLabel', False),
+)
+
+
+class CompileDecoderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.decode = decoding.compile_decoder(Point, POINT_FIELDS)
+
+    def test_fields_and_nested(self):
+        self.assertEqual(
+            self.decode({'x': 1, 'y': 2, 'pointLabel': 'a', 'ignored': 3}, tags=['t']),
+            Point(x=1, y=2, label='a', tags=['t']),
+        )
+
+    def test_optional_field_missing(self):
+        self.assertIsNone(self.decode({'x': 1, 'y': 2}, tags=None).label)
+
+    def test_required_field_missing(self):
+        with self.assertRaises(KeyError):
+            self.decode({'x': 1}, tags=None)
+
+    def test_encode(self):
+        point = Point(x=1, y=2, label=None, tags=None)
+        self.assertEqual(decoding.encode(point, POINT_FIELDS), {'x': 1, 'y': 2, 'pointLabel': None})
+
+    def test_summoner_roundtrip(self):
+        raw = {
+            'accountId': 'acc',
+            'id': 'sid',
+            'puuid': 'puuid',
+            'name': 'name',
+            'profileIconId': 1,
+            'revisionDate': 2,
+            'summonerLevel': 30,
+        }
+        summoner = decoding.decode_summoner(raw)
+        self.assertEqual(summoner.account_id, 'acc')
+        self.assertEqual(decoding.encode(summoner, decoding.SUMMONER_FIELDS), raw)
+
+
+class SlottedDtoTest(unittest.TestCase):
+
+    def test_attributes_without_dict(self):
+        position = decoding.decode_position({'x': 10, 'y': 20})
+        self.assertEqual((position.x, position.y), (10, 20))
+        self.assertFalse(hasattr(position, '__dict__'))
+        self.assertEqual(repr(position), 'MatchPositionDto(x=10, y=20)')
+
+    def test_participant_frame_optional_fields(self):
+        frame = decoding.decode_participant_frame({'participantId': 3, 'level': 7}, position=None)
+        self.assertEqual((frame.participant_id, frame.level, frame.xp, frame.position), (3, 7, None, None))
+
+
+class SparseDecoderTest(unittest.TestCase):
+
+    def test_skill_slot(self):
+        # riot sends skillSlot, the field was read as skillShot once and always decoded to None
+        event = decoding.decode_event({'type': 'SKILL_LEVEL_UP', 'skillSlot': 2, 'participantId': 4})
+        self.assertEqual(event.skill_slot, 2)
+
+    def test_missing_fields_read_as_none(self):
+        event = decoding.decode_event({'type': 'WARD_PLACED', 'wardType': 'YELLOW_TRINKET'})
+        self.assertEqual(event.ward_type, 'YELLOW_TRINKET')
+        self.assertIsNone(event.killer_id)
+        self.assertIsNone(event.position)
+        self.assertIsInstance(event, decoding.MatchEventDto)
+        self.assertFalse(hasattr(event, '__dict__'))
+
+    def test_only_present_fields_are_stored(self):
+        event = decoding.decode_event({'type': 'CHAMPION_KILL', 'killerId': 1, 'victimId': 2})
+        self.assertEqual(set(type(event).__slots__), {'type', 'killer_id', 'victim_id'})
+
+    def test_nested_and_unknown_keys(self):
+        position = decoding.decode_position({'x': 1, 'y': 2})
+        event = decoding.decode_event(
+            {'type': 'CHAMPION_KILL', 'position': {'x': 1, 'y': 2}, 'newRiotField': 1},
+            position=position,
+        )
+        self.assertIs(event.position, position)
+        self.assertFalse(hasattr(event, 'newRiotField'))
+
+    def test_same_keys_share_a_class(self):
+        first = decoding.decode_event({'type': 'ITEM_PURCHASED', 'itemId': 1})
+        second = decoding.decode_event({'type': 'ITEM_PURCHASED', 'itemId': 2})
+        self.assertIs(type(first), type(second))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+import unittest.mock
+
+from prometheus_client import multiprocess
+
+import metrics
+
+
+def samples(text: bytes) -> dict:
+    return dict(
+        line.rsplit(' ', 1)
+        for line in text.decode().splitlines()
+        if line and not line.startswith('#')
+    )
+
+
+def run_worker(directory: str, code: str) -> int:
+    # prometheus_client picks the multiprocess mode on import, so every worker is a process of its own
+    worker = subprocess.Popen(
+        [sys.executable, '-c', 'import metrics\n' + code],
+        env=dict(os.environ, PROMETHEUS_MULTIPROC_DIR=directory, PYTHONPATH=os.pathsep.join(sys.path)),
+    )
+    worker.wait()
+    return worker.pid
+
+
+class RenderTest(unittest.TestCase):
+
+    def test_this_process(self):
+        before = float(samples(metrics.render()).get('crawler_matches_ingested_total', 0))
+        metrics.matches_ingested.inc()
+        metrics.riot_failures.labels(route='match', reason='retries').inc()
+        rendered = samples(metrics.render())
+        self.assertEqual(float(rendered['crawler_matches_ingested_total']), before + 1)
+        self.assertIn('crawler_riot_failures_total{reason="retries",route="match"}', rendered)
+
+    def test_workers_are_merged(self):
+        with tempfile.TemporaryDirectory() as directory:
+            first = run_worker(directory, (
+                'metrics.matches_ingested.inc(2)\n'
+                'metrics.active_crawls.set(1)\n'
+                'metrics.queue_depth.set(4)\n'
+            ))
+            run_worker(directory, (
+                'metrics.matches_ingested.inc(3)\n'
+                'metrics.active_crawls.set(2)\n'
+                'metrics.queue_depth.set(7)\n'
+            ))
+            with unittest.mock.patch.dict(os.environ, {'PROMETHEUS_MULTIPROC_DIR': directory}):
+                rendered = samples(metrics.render())
+                self.assertEqual(float(rendered['crawler_matches_ingested_total']), 5)
+                self.assertEqual(float(rendered['crawler_active_crawls']), 3)
+                self.assertEqual(float(rendered['crawler_queue_depth']), 7)
+
+                # an exited worker's gauges are gone, its counters stay in the totals
+                multiprocess.mark_process_dead(first, directory)
+                rendered = samples(metrics.render())
+                self.assertEqual(float(rendered['crawler_matches_ingested_total']), 5)
+                self.assertEqual(float(rendered['crawler_active_crawls']), 2)
+
+
+class RefreshTest(unittest.TestCase):
+
+    def test_failing_callback_does_not_stop_the_others(self):
+        calls = []
+        with unittest.mock.patch.object(metrics, '_refreshers', []):
+            metrics.on_refresh(lambda: 1 / 0)
+            metrics.on_refresh(lambda: calls.append(1))
+            metrics.refresh()
+        self.assertEqual(calls, [1])
+
+    def test_set_labelled_zeroes_gone_labels(self):
+        reported = metrics.set_labelled(metrics.rate_limit_utilisation, {('k', 'e', 'app', 1): 0.5})
+        metrics.set_labelled(metrics.rate_limit_utilisation, {('k', 'e', 'app', 10): 0.25}, reported)
+        rendered = samples(metrics.render())
+        name = 'crawler_rate_limit_utilisation{endpoint="e",key="k",limit="app",window="%s"}'
+        self.assertEqual(float(rendered[name % 1]), 0)
+        self.assertEqual(float(rendered[name % 10]), 0.25)
+
+
+if __name__ == '__main__':
+    unittest.main()
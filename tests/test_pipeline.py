@@ -0,0 +1,72 @@
+import threading
+import unittest
+
+import pipeline
+
+
+class PipelineTest(unittest.TestCase):
+
+    def test_items_pass_every_stage(self):
+        p = pipeline.Pipeline(capacity=2)
+        p.add_stage('double', lambda x: x * 2, workers=3)
+        p.add_stage('inc', lambda x: x + 1)
+        self.assertEqual(sorted(p.run(range(10))), [x * 2 + 1 for x in range(10)])
+
+    def test_single_worker_keeps_order(self):
+        p = pipeline.Pipeline(capacity=1)
+        p.add_stage('str', str)
+        self.assertEqual(list(p.run(range(5))), ['0', '1', '2', '3', '4'])
+
+    def test_stage_error_is_raised_to_the_caller(self):
+        def fail(x):
+            if x == 3:
+                raise ValueError('bad item')
+            return x
+
+        p = pipeline.Pipeline(capacity=1)
+        p.add_stage('fail', fail)
+        with self.assertRaisesRegex(ValueError, 'bad item'):
+            list(p.run(range(100)))
+
+    def test_input_error_is_raised_to_the_caller(self):
+        def items():
+            yield 1
+            raise KeyError('page')
+
+        p = pipeline.Pipeline(capacity=1)
+        p.add_stage('same', lambda x: x)
+        with self.assertRaises(KeyError):
+            list(p.run(items()))
+
+    def test_closing_stops_the_stages(self):
+        # a consumer failing while it writes a result closes the generator, the stages must not keep going
+        fed = []
+
+        def items():
+            for n in range(1000):
+                fed.append(n)
+                yield n
+
+        p = pipeline.Pipeline(capacity=1)
+        p.add_stage('same', lambda x: x, workers=2)
+        results = p.run(items())
+        try:
+            for item in results:
+                if item == 2:
+                    raise RuntimeError('write failed')
+        except RuntimeError:
+            pass
+        finally:
+            results.close()
+        self.assertLess(len(fed), 1000)
+        self.assertFalse([t for t in threading.enumerate() if t.name == 'pipeline-same'])
+
+    def test_invalid_sizes(self):
+        with self.assertRaises(ValueError):
+            pipeline.Pipeline(capacity=0)
+        with self.assertRaises(ValueError):
+            pipeline.Pipeline(capacity=1).add_stage('none', str, workers=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
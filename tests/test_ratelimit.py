@@ -0,0 +1,119 @@
+import unittest
+
+import ratelimit
+
+
+class ParseLimitsTest(unittest.TestCase):
+
+    def test_parse(self):
+        self.assertEqual(ratelimit.parse_limits('20:1,100:120'), {1: 20, 120: 100})
+
+    def test_empty_and_malformed(self):
+        self.assertEqual(ratelimit.parse_limits(None), {})
+        self.assertEqual(ratelimit.parse_limits('20:1,oops,100:120'), {1: 20, 120: 100})
+
+
+class WindowTest(unittest.TestCase):
+
+    def test_free_below_the_limit(self):
+        window = ratelimit.Window(limit=2, seconds=10)
+        window.hit(100.0)
+        self.assertEqual(window.wait_time(100.0), 0.0)
+
+    def test_wait_until_the_oldest_hit_leaves(self):
+        window = ratelimit.Window(limit=2, seconds=10)
+        window.hit(100.0)
+        window.hit(103.0)
+        self.assertEqual(window.wait_time(105.0), 5.0)
+        # the hit at 100 is out of the window from 110 on
+        self.assertEqual(window.wait_time(110.0), 0.0)
+        self.assertEqual(len(window.hits), 1)
+
+    def test_overfull_window_waits_for_enough_hits(self):
+        # riot counted more than the limit, e.g. other workers, so more than one hit has to leave
+        window = ratelimit.Window(limit=2, seconds=10)
+        for now in (100.0, 101.0, 102.0, 103.0):
+            window.hit(now)
+        self.assertEqual(window.wait_time(104.0), 8.0)
+
+    def test_sync_adds_the_hits_riot_counted(self):
+        window = ratelimit.Window(limit=5, seconds=10)
+        window.hit(100.0)
+        window.sync(count=5, now=101.0)
+        self.assertEqual(len(window.hits), 5)
+        self.assertEqual(window.wait_time(101.0), 9.0)
+        # fewer than we know of changes nothing
+        window.sync(count=1, now=101.0)
+        self.assertEqual(len(window.hits), 5)
+
+    def test_utilisation(self):
+        window = ratelimit.Window(limit=4, seconds=10)
+        window.hit(100.0)
+        self.assertEqual(window.utilisation(100.0), 0.25)
+        self.assertEqual(window.utilisation(110.0), 0.0)
+
+
+class BucketTest(unittest.TestCase):
+
+    def test_longest_wait_of_all_windows(self):
+        bucket = ratelimit.Bucket({1: 1, 120: 2})
+        bucket.hit(100.0)
+        self.assertEqual(bucket.wait_time(100.5), 0.5)
+        bucket.hit(101.0)
+        self.assertEqual(bucket.wait_time(101.0), 119.0)
+
+    def test_configure_keeps_hits_of_known_windows(self):
+        bucket = ratelimit.Bucket({10: 1})
+        bucket.hit(100.0)
+        bucket.configure({10: 2, 600: 100})
+        self.assertEqual(len(bucket.windows[10].hits), 1)
+        self.assertEqual(bucket.windows[10].limit, 2)
+        self.assertEqual(bucket.wait_time(100.0), 0.0)
+
+
+class RateLimiterTest(unittest.TestCase):
+
+    def test_limits_are_learned_from_headers(self):
+        limiter = ratelimit.RateLimiter(app_limits='100:1')
+        limiter.update('get_match', {
+            'X-App-Rate-Limit': '100:1',
+            'X-Method-Rate-Limit': '1:10',
+            'X-Method-Rate-Limit-Count': '1:10',
+        })
+        self.assertGreater(limiter.reserve('get_match'), 9.0)
+        # other methods have buckets of their own
+        self.assertEqual(limiter.reserve('get_summoner'), 0.0)
+
+    def test_application_retry_after_blocks_every_method(self):
+        limiter = ratelimit.RateLimiter(app_limits='100:1')
+        limiter.update('get_match', {'Retry-After': '30', 'X-Rate-Limit-Type': 'application'}, status_code=429)
+        self.assertGreater(limiter.reserve('get_match'), 29.0)
+        self.assertGreater(limiter.reserve('get_summoner'), 29.0)
+
+    def test_method_retry_after_blocks_only_that_method(self):
+        limiter = ratelimit.RateLimiter(app_limits='100:1')
+        limiter.update('get_match', {'Retry-After': '30', 'X-Rate-Limit-Type': 'method'}, status_code=429)
+        self.assertGreater(limiter.reserve('get_match'), 29.0)
+        self.assertEqual(limiter.reserve('get_summoner'), 0.0)
+
+    def test_service_retry_after_blocks_only_that_method(self):
+        limiter = ratelimit.RateLimiter(app_limits='100:1')
+        limiter.update('get_match', {'Retry-After': '30'}, status_code=429)
+        self.assertGreater(limiter.reserve('get_match'), 29.0)
+        self.assertEqual(limiter.reserve('get_summoner'), 0.0)
+
+    def test_429_without_retry_after(self):
+        limiter = ratelimit.RateLimiter(app_limits='100:1')
+        limiter.update('get_match', {}, status_code=429)
+        wait = limiter.reserve('get_match')
+        self.assertGreater(wait, 0.0)
+        self.assertLessEqual(wait, ratelimit.DEFAULT_RETRY_AFTER)
+
+    def test_utilisation(self):
+        limiter = ratelimit.RateLimiter(app_limits='4:10')
+        limiter.reserve('get_match')
+        self.assertEqual(limiter.utilisation()[('app', 10)], 0.25)
+
+
+if __name__ == '__main__':
+    unittest.main()
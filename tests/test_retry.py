@@ -0,0 +1,80 @@
+import random
+import unittest
+import unittest.mock
+
+import retry
+
+
+class ClassifyTest(unittest.TestCase):
+
+    def test_classify(self):
+        self.assertEqual(retry.classify(429), retry.RATE_LIMITED)
+        self.assertEqual(retry.classify(400), retry.PERMANENT)
+        self.assertEqual(retry.classify(404), retry.PERMANENT)
+        self.assertEqual(retry.classify(500), retry.RETRYABLE)
+        self.assertEqual(retry.classify(503), retry.RETRYABLE)
+
+
+class BackoffTest(unittest.TestCase):
+
+    def test_exponential_with_full_jitter(self):
+        with unittest.mock.patch.object(random, 'uniform', lambda low, high: high):
+            self.assertEqual([retry.backoff(n, base=1.0, cap=60.0) for n in (1, 2, 3, 4)], [1.0, 2.0, 4.0, 8.0])
+        with unittest.mock.patch.object(random, 'uniform', lambda low, high: low):
+            self.assertEqual(retry.backoff(3, base=1.0, cap=60.0), 0)
+
+    def test_capped(self):
+        for _ in range(100):
+            self.assertLessEqual(retry.backoff(20, base=1.0, cap=60.0), 60.0)
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 100.0
+        patcher = unittest.mock.patch.object(retry.time, 'monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = retry.CircuitBreaker(endpoint='euw1', threshold=3, cooldown=30.0)
+
+    def test_opens_after_threshold_failures_in_a_row(self):
+        self.breaker.failure()
+        self.breaker.failure()
+        self.breaker.check()
+        self.breaker.failure()
+        with self.assertRaises(retry.CircuitOpen):
+            self.breaker.check()
+
+    def test_success_resets_the_count(self):
+        self.breaker.failure()
+        self.breaker.failure()
+        self.breaker.success()
+        self.breaker.failure()
+        self.breaker.check()
+
+    def test_after_cooldown_one_failure_opens_it_again(self):
+        for _ in range(3):
+            self.breaker.failure()
+        self.now += 30.0
+        self.breaker.check()
+        self.breaker.failure()
+        with self.assertRaises(retry.CircuitOpen):
+            self.breaker.check()
+
+    def test_after_cooldown_one_success_closes_it(self):
+        for _ in range(3):
+            self.breaker.failure()
+        self.now += 30.0
+        self.breaker.success()
+        self.breaker.failure()
+        self.breaker.check()
+
+    def test_get_breaker_is_shared_per_endpoint(self):
+        self.assertIs(
+            retry.get_breaker('na1-test', threshold=3, cooldown=1.0),
+            retry.get_breaker('na1-test', threshold=3, cooldown=1.0),
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
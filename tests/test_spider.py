@@ -0,0 +1,114 @@
+import types
+import unittest
+
+import spider
+
+
+class BloomFilterTest(unittest.TestCase):
+
+    def test_add_and_contains(self):
+        seen = spider.BloomFilter(capacity=1000)
+        self.assertTrue(seen.add('a'))
+        self.assertFalse(seen.add('a'))
+        self.assertIn('a', seen)
+        self.assertNotIn('b', seen)
+
+    def test_false_positive_rate(self):
+        seen = spider.BloomFilter(capacity=10000, error_rate=0.01)
+        for n in range(10000):
+            seen.add(f'summoner{n}')
+        false_positives = sum(f'other{n}' in seen for n in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+class FrontierTest(unittest.TestCase):
+
+    def test_each_name_once_up_to_case_and_spaces(self):
+        frontier = spider.Frontier(config=spider.SpiderConfig())
+        self.assertTrue(frontier.offer('Some One', depth=1))
+        self.assertFalse(frontier.offer('someone', depth=1))
+        self.assertEqual(len(frontier), 1)
+
+    def test_too_deep(self):
+        frontier = spider.Frontier(config=spider.SpiderConfig(max_depth=1))
+        self.assertFalse(frontier.offer('a', depth=2))
+
+    def test_shallow_first(self):
+        frontier = spider.Frontier(config=spider.SpiderConfig())
+        frontier.offer('deep', depth=2)
+        frontier.offer('shallow', depth=1)
+        self.assertEqual(frontier.pop().summoner_name, 'shallow')
+        self.assertEqual(frontier.pop().summoner_name, 'deep')
+        self.assertIsNone(frontier.pop())
+
+
+def match_data(*names):
+    identities = [types.SimpleNamespace(player=types.SimpleNamespace(
+        summoner_name=name,
+        current_account_id=name,
+    )) for name in names]
+    return types.SimpleNamespace(
+        match=types.SimpleNamespace(participant_identities=identities, game_creation=0),
+        summoners=[],
+    )
+
+
+class SpiderTest(unittest.TestCase):
+
+    def test_breadth_first_up_to_max_depth(self):
+        crawled = []
+
+        def crawl(summoner_name, discover):
+            crawled.append(summoner_name)
+            discover(match_data(summoner_name, f'{summoner_name}-friend'))
+
+        spider.Spider(config=spider.SpiderConfig(max_depth=2), crawl=crawl).run(seed_name='seed')
+        self.assertEqual(crawled, ['seed', 'seed-friend', 'seed-friend-friend'])
+
+    def test_max_matches_stops_the_running_crawl(self):
+        stored = []
+
+        def crawl(summoner_name, discover):
+            for n in range(100):
+                stored.append(n)
+                discover(match_data(f'{summoner_name}{n}'))
+
+        s = spider.Spider(config=spider.SpiderConfig(max_matches=5), crawl=crawl)
+        s.run(seed_name='seed')
+        self.assertEqual(len(stored), 5)
+        self.assertEqual((s.summoners, s.matches), (1, 5))
+
+    def test_max_summoners(self):
+        crawled = []
+
+        def crawl(summoner_name, discover):
+            crawled.append(summoner_name)
+            discover(match_data(*(f'{summoner_name}-{n}' for n in range(3))))
+
+        spider.Spider(config=spider.SpiderConfig(max_summoners=2), crawl=crawl).run(seed_name='seed')
+        self.assertEqual(len(crawled), 2)
+
+    def test_failed_crawls_are_skipped(self):
+        def crawl(summoner_name, discover):
+            if summoner_name == 'seed':
+                discover(match_data('gone', 'there'))
+            elif summoner_name == 'gone':
+                raise ValueError('summoner does not exist')
+
+        s = spider.Spider(config=spider.SpiderConfig(), crawl=crawl)
+        s.run(seed_name='seed')
+        self.assertEqual(s.summoners, 3)
+
+    def test_progress_errors_end_the_spider(self):
+        def crawl(summoner_name, discover):
+            discover(match_data('other'))
+
+        def progress(matches, total):
+            raise RuntimeError('job taken over')
+
+        with self.assertRaisesRegex(RuntimeError, 'job taken over'):
+            spider.Spider(config=spider.SpiderConfig(), crawl=crawl).run(seed_name='seed', progress=progress)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+
+import controller
+import db
+import decoding
+
+
+def frame(timestamp, *participant_frames):
+    return decoding.MatchFrameDto(
+        timestamp=timestamp,
+        participant_frames={str(f.participant_id): f for f in participant_frames},
+        events=[],
+    )
+
+
+def participant_frame(participant_id, gold, position=None):
+    return decoding.MatchParticipantFrameDto(
+        participant_id=participant_id,
+        total_gold=gold,
+        current_gold=gold // 2,
+        xp=gold * 2,
+        level=1,
+        minions_killed=0,
+        jungle_minions_killed=0,
+        position=position,
+    )
+
+
+class FakeConnection:
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params=None):
+        pass
+
+    def fetchall(self):
+        return self.rows
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class PackParticipantFramesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.timeline = decoding.MatchTimelineDto(frame_interval=60000, frames=[
+            frame(0, participant_frame(1, 500, decoding.MatchPositionDto(x=1, y=2)), participant_frame(2, 500)),
+            frame(60000, participant_frame(1, 700, decoding.MatchPositionDto(x=3, y=4)), participant_frame(2, 650)),
+        ])
+        # riot participant id -> participant id in the database
+        self.participants = {1: 101, 2: 102}
+
+    def test_one_series_per_column(self):
+        packed = controller.pack_participant_frames(self.timeline, self.participants)
+        self.assertEqual(set(packed), {101, 102})
+        self.assertEqual(set(packed[101]), set(db.PARTICIPANT_TIMELINE_SERIES))
+        self.assertEqual(packed[101]['timestamp'], [0, 60000])
+        self.assertEqual(packed[101]['total_gold'], [500, 700])
+        self.assertEqual(packed[101]['current_gold'], [250, 350])
+        self.assertEqual(packed[101]['position_x'], [1, 3])
+        self.assertEqual(packed[101]['position_y'], [2, 4])
+
+    def test_missing_position_is_null(self):
+        packed = controller.pack_participant_frames(self.timeline, self.participants)
+        self.assertEqual(packed[102]['position_x'], [None, None])
+        self.assertEqual(packed[102]['total_gold'], [500, 650])
+
+    def test_read_back_as_points(self):
+        packed = controller.pack_participant_frames(self.timeline, self.participants)
+        row = (101,) + tuple(packed[101][column] for column in db.PARTICIPANT_TIMELINE_SERIES)
+        points = db.select_participant_timelines(conn=FakeConnection([row]), game_id=1)[101]
+        self.assertEqual(len(points), 2)
+        self.assertEqual((points[1].timestamp, points[1].total_gold, points[1].position_x), (60000, 700, 3))
+
+    def test_participant_without_frames(self):
+        packed = controller.pack_participant_frames(
+            decoding.MatchTimelineDto(frame_interval=60000, frames=[]),
+            self.participants,
+        )
+        self.assertEqual(packed[101]['timestamp'], [])
+
+
+if __name__ == '__main__':
+    unittest.main()